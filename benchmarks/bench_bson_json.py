@@ -0,0 +1,168 @@
+"""
+BSON → JSON conversion benchmark for Mongo panel output.
+
+Builds Crunchbase-shaped organization documents (funding rounds,
+financial tables, news lists, nested ObjectIds/datetimes/Decimal128s),
+encodes them to raw BSON the way the server sends them, and times the
+full raw-bytes → JSON-text path for:
+
+  legacy      bson.decode + the old isinstance/__name__ walk (views._mongo_safe)
+  dispatch    bson.decode + mongo_safe (type-dispatch table)
+  raw         decode_json_safe: the C decoder applies the table while decoding
+  relaxed     bson.decode + json_util.dumps(RELAXED_JSON_OPTIONS), for reference
+
+Run with:
+    python benchmarks/bench_bson_json.py
+    python benchmarks/bench_bson_json.py --docs 500 --news 200 --repeat 15
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_manager.settings')
+
+import bson  # noqa: E402
+from bson import Decimal128, Int64, ObjectId, json_util  # noqa: E402
+
+from dashboard.mongo import decode_json_safe, mongo_safe  # noqa: E402
+
+
+def legacy_mongo_safe(obj):
+    """The conversion the panel used before the dispatch table, kept as the baseline."""
+    if isinstance(obj, dict):
+        return {k: legacy_mongo_safe(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [legacy_mongo_safe(i) for i in obj]
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return obj.hex()
+    cls_name = type(obj).__name__
+    if cls_name == 'ObjectId':
+        return str(obj)
+    if cls_name == 'Decimal128':
+        return float(str(obj))
+    if cls_name == 'Regex':
+        return str(obj)
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    return str(obj)
+
+
+def make_org(rnd, news_items):
+    now = datetime.datetime(2025, 1, 1)
+
+    def when():
+        return now - datetime.timedelta(days=rnd.randint(0, 3650), seconds=rnd.randint(0, 86400))
+
+    def money():
+        return Decimal128(Decimal(rnd.randint(10_000, 500_000_000)) / 100)
+
+    return {
+        '_id': ObjectId(),
+        'category': 'Organization',
+        'url_id': ObjectId(),
+        'organization_url': f'https://www.crunchbase.com/organization/org-{rnd.randint(0, 10**6)}',
+        'organization_name': f'Org {rnd.randint(0, 10**6)}',
+        'overview': {
+            'description': 'lorem ipsum ' * 40,
+            'founded_on': when(),
+            'employee_count': Int64(rnd.randint(1, 100_000)),
+            'headquarters': {'city': 'Paris', 'country': 'FR', 'geo': [2.35, 48.85]},
+            'industries': [f'industry-{i}' for i in range(8)],
+        },
+        'financials': {
+            'funding_rounds': [
+                {
+                    'id': ObjectId(), 'announced_on': when(), 'series': f'Series {c}',
+                    'money_raised': money(), 'currency': 'USD',
+                    'investors': [
+                        {'id': ObjectId(), 'name': f'Investor {j}', 'lead': j == 0}
+                        for j in range(rnd.randint(1, 6))
+                    ],
+                }
+                for c in 'ABCDEFG'[:rnd.randint(1, 7)]
+            ],
+            'income_statement': [
+                {'year': y, 'revenue': money(), 'ebitda': money(), 'net_income': money(), 'margin': rnd.random()}
+                for y in range(2015, 2025)
+            ],
+            'ipo': {'went_public_on': when(), 'share_price': money(), 'valuation': money()},
+        },
+        'news': [
+            {
+                'id': ObjectId(), 'title': 'Headline ' * 6, 'url': 'https://news.example.com/a/' + 'x' * 40,
+                'publisher': 'Example News', 'posted_on': when(), 'thumbnail': bson.Binary(os.urandom(32)),
+            }
+            for _ in range(news_items)
+        ],
+        'runner_info': {'summary_script': when()},
+        'updated_at': when(),
+        'created_at': when(),
+    }
+
+
+def legacy(raw):
+    return json.dumps(legacy_mongo_safe(bson.decode(raw)))
+
+
+def dispatch(raw):
+    return json.dumps(mongo_safe(bson.decode(raw)))
+
+
+def raw_direct(raw):
+    return json.dumps(decode_json_safe(raw))
+
+
+def relaxed(raw):
+    return json_util.dumps(bson.decode(raw), json_options=json_util.RELAXED_JSON_OPTIONS)
+
+
+def bench(methods, raws, repeat):
+    """Best-of-``repeat`` seconds per method; rounds are interleaved to even out noise."""
+    best = {name: float('inf') for name, _ in methods}
+    for _ in range(repeat):
+        for name, fn in methods:
+            start = time.perf_counter()
+            for raw in raws:
+                fn(raw)
+            best[name] = min(best[name], time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=200, help='Documents per pass')
+    parser.add_argument('--news', type=int, default=50, help='News items per document')
+    parser.add_argument('--repeat', type=int, default=7, help='Passes per method (best is reported)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    raws = [bson.encode(make_org(rnd, args.news)) for _ in range(args.docs)]
+    total_mb = sum(map(len, raws)) / 1024 / 1024
+
+    # Same bytes in, same JSON out (json_util's extended JSON aside)
+    assert all(legacy(raw) == dispatch(raw) == raw_direct(raw) for raw in raws[:20])
+
+    methods = [('legacy', legacy), ('dispatch', dispatch), ('raw', raw_direct), ('relaxed', relaxed)]
+    print(f"{args.docs} docs, {total_mb:.1f} MB BSON, avg {total_mb * 1024 / args.docs:.1f} KB/doc")
+    print(f"{'method':<10} {'ms/doc':>8} {'docs/s':>9} {'MB/s':>8} {'vs legacy':>10}")
+    timings = bench(methods, raws, args.repeat)
+    for name, _ in methods:
+        elapsed = timings[name]
+        print(f"{name:<10} {elapsed / args.docs * 1000:>8.3f} {args.docs / elapsed:>9.0f} "
+              f"{total_mb / elapsed:>8.1f} {timings['legacy'] / elapsed:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
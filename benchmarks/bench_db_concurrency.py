@@ -0,0 +1,192 @@
+"""
+Concurrency benchmark for the dashboard database under the worker/web mix.
+
+N worker processes replay what run_scraper_task writes for every run
+(a running ScraperRunHistory row, a ScraperProcess row, then both
+finalised), while M poller processes hit api_status the way the live
+terminal does once a second, only without the sleep.
+
+Each configuration reports writer and poller throughput, p50/p99 latency
+and the number of operations that failed with "database is locked".
+
+Run with:
+    python benchmarks/bench_db_concurrency.py
+    python benchmarks/bench_db_concurrency.py --workers 8 --pollers 16 --duration 20
+    python benchmarks/bench_db_concurrency.py --database-url postgres://u:p@localhost/bench
+
+Without --database-url, two throwaway SQLite databases are compared:
+"legacy" (Django defaults: rollback journal, 5 s timeout, deferred
+transactions) and "tuned" (what settings.database_from_url produces).
+A PostgreSQL URL is benchmarked on its own and must point at an empty
+database the benchmark may migrate.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_manager.settings')
+
+from scraper_manager import settings as project_settings  # noqa: E402
+
+# Simulated scraper work between the start and end of a run
+RUN_WORK_S = 0.002
+
+
+def legacy_sqlite(path):
+    return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+
+
+def is_locked(exc):
+    return 'locked' in str(exc).lower() or 'busy' in str(exc).lower()
+
+
+def timed_loop(role, operation, deadline, results):
+    """Call ``operation`` until ``deadline``, timing it and counting lock failures.
+
+    Results are always reported, so a crashing child cannot hang the parent.
+    """
+    from django.db import OperationalError, connection
+
+    latencies, errors = [], 0
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                operation()
+            except OperationalError as exc:
+                if not is_locked(exc):
+                    raise
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+        results.put((role, latencies, errors))
+
+
+def worker(sub_ids, deadline, results):
+    from django.utils import timezone
+    from dashboard.models import ScraperProcess, ScraperRunHistory
+
+    rnd = random.Random(os.getpid())
+
+    def one_run():
+        # A scraper runs at most once at a time, so each worker owns its sub_ids
+        sub_id = rnd.choice(sub_ids)
+        run = ScraperRunHistory.objects.create(
+            sub_scraper_id=sub_id, status='running', started_at=timezone.now()
+        )
+        ScraperProcess.objects.filter(sub_scraper_id=sub_id).delete()
+        proc = ScraperProcess.objects.create(sub_scraper_id=sub_id, pid=os.getpid())
+        time.sleep(RUN_WORK_S)
+        proc.is_running = False
+        proc.save()
+        run.status = 'success'
+        run.ended_at = timezone.now()
+        run.save()
+
+    timed_loop('worker', one_run, deadline, results)
+
+
+def poller(sub_ids, deadline, results):
+    from django.test import RequestFactory
+    from dashboard.api_views import api_status
+
+    rnd = random.Random(os.getpid())
+    factory = RequestFactory()
+
+    def one_poll():
+        sub_id = rnd.choice(sub_ids)
+        api_status(factory.get(f'/api/status/{sub_id}/'), sub_id)
+
+    timed_loop('poller', one_poll, deadline, results)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    return statistics.quantiles(values, n=100)[pct - 1] if len(values) > 1 else values[0]
+
+
+def run_config(name, database, args):
+    """Benchmark one DATABASES entry in a fresh interpreter state."""
+    project_settings.DATABASES['default'] = database
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+    from dashboard.models import MainScraper, SubScraper
+
+    call_command('migrate', verbosity=0)
+    main = MainScraper.objects.create(name='bench')
+    sub_ids = [
+        SubScraper.objects.create(main_scraper=main, name=f'bench-{i}').pk
+        for i in range(args.scrapers)
+    ]
+    connections.close_all()
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    deadline = time.monotonic() + args.duration
+    procs = [
+        ctx.Process(target=worker, args=(sub_ids[i::args.workers], deadline, results))
+        for i in range(args.workers)
+    ]
+    procs += [ctx.Process(target=poller, args=(sub_ids, deadline, results)) for _ in range(args.pollers)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    for role in ('worker', 'poller'):
+        latencies = [lat for r, lats, _ in collected if r == role for lat in lats]
+        if role == 'worker':
+            latencies = [lat - RUN_WORK_S for lat in latencies]
+        errors = sum(err for r, _, err in collected if r == role)
+        print(f"{name:<8} {role + 's':<8} {len(latencies) / args.duration:>9.1f} "
+              f"{percentile(latencies, 50) * 1000:>9.2f}ms {percentile(latencies, 99) * 1000:>9.2f}ms "
+              f"{errors:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent writer processes')
+    parser.add_argument('--pollers', type=int, default=8, help='Concurrent api_status pollers')
+    parser.add_argument('--scrapers', type=int, default=20,
+                        help='Sub-scrapers to spread load over (at least --workers)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per configuration')
+    parser.add_argument('--database-url', help='Benchmark this database instead of temporary SQLite files')
+    args = parser.parse_args()
+    args.scrapers = max(args.scrapers, args.workers)
+
+    print(f"{'config':<8} {'role':<8} {'ops/s':>9} {'p50':>11} {'p99':>11} {'locked':>8}")
+    if args.database_url:
+        configs = [('custom', lambda tmp: project_settings.database_from_url(args.database_url))]
+    else:
+        configs = [
+            ('legacy', lambda tmp: legacy_sqlite(os.path.join(tmp, 'bench.sqlite3'))),
+            ('tuned', lambda tmp: project_settings.database_from_url(
+                f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}")),
+        ]
+
+    # Each configuration runs in its own process so Django is set up from scratch
+    for name, make_database in configs:
+        with tempfile.TemporaryDirectory() as tmp:
+            proc = multiprocessing.get_context('fork').Process(
+                target=run_config, args=(name, make_database(tmp), args)
+            )
+            proc.start()
+            proc.join()
+
+
+if __name__ == '__main__':
+    main()
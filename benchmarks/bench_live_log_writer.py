@@ -0,0 +1,149 @@
+"""
+Micro-benchmark for the live-log writer stage in run_scraper_task.
+
+Replays a PTY stream through a real pipe into two reader loops:
+
+  * per-chunk — the previous output_reader: 4 KB reads, regex each chunk,
+    write + flush after every read
+  * buffered  — BufferedLogWriter as used by output_reader today
+
+and reports throughput, write/flush calls, and worst-case flush latency
+(time from a byte being read to it being visible in the log file).
+
+Run with:
+    python benchmarks/bench_live_log_writer.py
+    python benchmarks/bench_live_log_writer.py --capture session.raw
+
+A capture can be recorded with e.g. ``script -q -c 'python run.py' session.raw``.
+Without one, a chatty synthetic stream (coloured log lines, progress bars
+with carriage returns) is generated.
+"""
+import argparse
+import os
+import random
+import re
+import select
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dashboard.live_log import BufferedLogWriter, LiveLogWriter  # noqa: E402
+
+# The regex run_scraper_task used before the buffered writer stage
+_OLD_ANSI_ESCAPE = re.compile(
+    rb'(\x9B|\x1B\[)[0-?]*[ -/]*[@-~]'
+    rb'|\x1B[^[\]]*'
+    rb'|\x0D'
+)
+
+
+def synthetic_stream(size):
+    rnd = random.Random(42)
+    levels = [b'\x1b[32mINFO\x1b[0m', b'\x1b[33mWARNING\x1b[0m', b'\x1b[31mERROR\x1b[0m']
+    parts, total, n = [], 0, 0
+    while total < size:
+        n += 1
+        if n % 50 == 0:
+            line = b''.join(b'\rProgress: %3d%% [%s]' % (p, b'#' * (p // 5)) for p in range(0, 101, 10)) + b'\r\n'
+        else:
+            line = b'2026-01-01 12:00:00 %s Thread-%d: Fetching organization %d from crunchbase\r\n' % (
+                rnd.choice(levels), rnd.randint(1, 25), n)
+        parts.append(line)
+        total += len(line)
+    return b''.join(parts)
+
+
+def chunked(data, rnd):
+    pos = 0
+    while pos < len(data):
+        step = rnd.randint(1, 4096)
+        yield data[pos:pos + step]
+        pos += step
+
+
+def replay(data, write_fd, pace):
+    """Write data into the pipe in PTY-sized chunks, optionally paced."""
+    rnd = random.Random(7)
+    for chunk in chunked(data, rnd):
+        os.write(write_fd, chunk)
+        if pace:
+            time.sleep(pace)
+    os.close(write_fd)
+
+
+def run_per_chunk(read_fd, log_path, stats):
+    with open(log_path, 'wb') as log_f:
+        while True:
+            data = os.read(read_fd, 4096)
+            if not data:
+                break
+            read_at = time.monotonic()
+            log_f.write(_OLD_ANSI_ESCAPE.sub(b'', data))
+            log_f.flush()
+            stats['flushes'] += 1
+            stats['max_latency'] = max(stats['max_latency'], time.monotonic() - read_at)
+
+
+def run_buffered(read_fd, log_path, stats):
+    writer = LiveLogWriter(log_path, log_path + '.idx')
+    with BufferedLogWriter(writer) as log_f:
+        while True:
+            ready, _, _ = select.select([read_fd], [], [], log_f.timeout())
+            if ready:
+                data = os.read(read_fd, 65536)
+                if not data:
+                    break
+                log_f.feed(data)
+            log_f.flush_if_due()
+    stats['flushes'] = log_f.flushes
+    stats['max_latency'] = log_f.max_latency
+
+
+def measure(name, reader, data, pace, tmp_dir):
+    read_fd, write_fd = os.pipe()
+    log_path = os.path.join(tmp_dir, f'{name}.log')
+    stats = {'flushes': 0, 'max_latency': 0.0}
+
+    producer = threading.Thread(target=replay, args=(data, write_fd, pace))
+    start = time.perf_counter()
+    producer.start()
+    reader(read_fd, log_path, stats)
+    elapsed = time.perf_counter() - start
+    producer.join()
+    os.close(read_fd)
+
+    stats['elapsed'] = elapsed
+    stats['mb_per_s'] = len(data) / elapsed / 1e6
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--capture', help='Raw PTY capture to replay (default: synthetic)')
+    parser.add_argument('--size-mb', type=float, default=32, help='Synthetic stream size for the burst run')
+    parser.add_argument('--trickle-s', type=float, default=2.0, help='Duration of the paced trickle run')
+    args = parser.parse_args()
+
+    if args.capture:
+        data = Path(args.capture).read_bytes()
+    else:
+        data = synthetic_stream(int(args.size_mb * 1e6))
+
+    # Trickle: ~1 ms between chunks, the pattern of a chatty but not flooding scraper
+    trickle = data[:int(args.trickle_s * 1000 * 2048)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'scenario':<10} {'writer':<10} {'MB/s':>8} {'flushes':>9} {'max latency':>12}")
+        for scenario, payload, pace in (('burst', data, 0), ('trickle', trickle, 0.001)):
+            for name, reader in (('per-chunk', run_per_chunk), ('buffered', run_buffered)):
+                stats = measure(name, reader, payload, pace, tmp_dir)
+                print(f"{scenario:<10} {name:<10} {stats['mb_per_s']:>8.1f} {stats['flushes']:>9} "
+                      f"{stats['max_latency'] * 1000:>10.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
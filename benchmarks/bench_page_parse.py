@@ -0,0 +1,126 @@
+"""
+Per-page CPU cost of the login check + HTML parse in get_requests.
+
+  before      BeautifulSoup(html.parser) for the account-button check, then
+              BeautifulSoup(html.parser) again in the page processor
+  lxml        pages.is_logged_in byte search + one lxml tree (Page.tree)
+  lxml-soup   pages.is_logged_in + one BeautifulSoup on the lxml parser
+              (Page.soup, for processors still written against bs4)
+
+CPU time per organization assumes the update scraper's four pages
+(summary, financial, news, tech). Pass saved pages, e.g. the
+summary_response.html update_scrapper.py dumps; without arguments a
+synthetic page shaped like a Crunchbase profile is used. The byte check is
+also compared against the BeautifulSoup check on every page, signed in and
+with the account button removed.
+
+Run with:
+    python benchmarks/bench_page_parse.py
+    python benchmarks/bench_page_parse.py crunchbase/summary_response.html --repeat 15
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'crunchbase'))
+
+import lxml.html  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+from pages import is_logged_in  # noqa: E402
+
+PAGES_PER_ORG = 4
+ACCOUNT_BUTTON = '<button mat-icon-button aria-label="Account" class="account-button"><span>RK</span></button>'
+
+
+def synthetic_page(rnd, sections=120):
+    """An Angular-rendered profile page: header, many cards, a big ng-state blob."""
+    head = ''.join(f'<link rel="stylesheet" href="/styles.{i}.css"><script src="/chunk.{i}.js"></script>' for i in range(40))
+    header = (
+        '<header><nav><a href="/">Crunchbase</a><input aria-label="Search" placeholder="Search">'
+        f'<button aria-label="Notifications"></button>{ACCOUNT_BUTTON}</nav></header>'
+    )
+    cards = []
+    for i in range(sections):
+        rows = ''.join(
+            f'<li class="field"><span class="label">Field {j}</span>'
+            f'<a href="/organization/org-{rnd.randrange(10**6)}">Value {rnd.random():.6f}</a></li>'
+            for j in range(12)
+        )
+        cards.append(f'<mat-card class="card section-{i}"><h2 class="title">Section {i}</h2><ul>{rows}</ul></mat-card>')
+    state = json.dumps({f'key{i}': {'value': rnd.random(), 'text': 'lorem ipsum ' * 8} for i in range(1500)})
+    return (
+        f'<!DOCTYPE html><html><head><title>Org | Crunchbase</title>{head}</head><body>'
+        f'{header}<main>{"".join(cards)}</main>'
+        f'<script id="ng-state" type="application/json">{state}</script></body></html>'
+    ).encode()
+
+
+def bs4_logged_in(content):
+    return BeautifulSoup(content.decode('utf-8', 'replace'), 'html.parser').find('button', {"aria-label": "Account"}) is not None
+
+
+def before(content):
+    text = content.decode('utf-8', 'replace')
+    BeautifulSoup(text, 'html.parser').find('button', {"aria-label": "Account"})
+    BeautifulSoup(text, 'html.parser')
+
+
+def after_lxml(content):
+    is_logged_in(content)
+    lxml.html.fromstring(content)
+
+
+def after_soup(content):
+    is_logged_in(content)
+    BeautifulSoup(content, 'lxml')
+
+
+def bench(methods, pages, repeat):
+    """Best-of-``repeat`` CPU seconds per method; methods are interleaved to share noise."""
+    best = {name: float('inf') for name in methods}
+    for _ in range(repeat):
+        for name, fn in methods.items():
+            start = time.process_time()
+            for content in pages:
+                fn(content)
+            best[name] = min(best[name], time.process_time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('pages', nargs='*', help='Saved HTML pages (default: one synthetic page)')
+    parser.add_argument('--repeat', type=int, default=7, help='Passes per method (best is reported)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    pages = [Path(p).read_bytes() for p in args.pages] or [synthetic_page(random.Random(args.seed))]
+
+    for content in pages:
+        logged_out = content.replace(b'aria-label="Account"', b'aria-label="Sign in"')
+        assert is_logged_in(content) == bs4_logged_in(content)
+        assert is_logged_in(logged_out) == bs4_logged_in(logged_out)
+
+    methods = {'before': before, 'lxml': after_lxml, 'lxml-soup': after_soup}
+    best = bench(methods, pages, args.repeat)
+
+    total_kb = sum(len(p) for p in pages) / 1024
+    print(f"{len(pages)} page(s), avg {total_kb / len(pages):.0f} KB; {PAGES_PER_ORG} pages per organization")
+    print(f"{'method':<10} {'ms/page':>8} {'ms/org':>8} {'vs before':>10}")
+    for name, elapsed in best.items():
+        per_page = elapsed / len(pages) * 1000
+        print(f"{name:<10} {per_page:>8.2f} {per_page * PAGES_PER_ORG:>8.1f} {best['before'] / elapsed:>9.1f}x")
+
+    start = time.process_time()
+    for _ in range(100):
+        for content in pages:
+            is_logged_in(content)
+    print(f"login check alone: {(time.process_time() - start) / (100 * len(pages)) * 1e6:.1f} µs/page")
+
+
+if __name__ == '__main__':
+    main()
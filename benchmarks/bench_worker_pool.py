@@ -0,0 +1,141 @@
+"""
+Modelled throughput of the persistent worker pool vs the respawn-per-cycle engine.
+
+This is a model, not a measurement of scraping: no request reaches
+Crunchbase, MongoDB or a stub server. Only interpreter start-up and
+imports are timed; everything else is an assumption set by the flags
+below, and the output is only as good as those assumptions.
+
+  cycle    ThreadManager.run_parallel_mode (--engine process): every cycle
+           starts one scraper process per account, each runs max_batches
+           batches, the manager waits for the slowest and sleeps 10 s
+  workers  worker_pool.WorkerPool (--engine workers): one process per
+           account started once, pulling batches until the run ends
+
+The model runs over --hours of simulated wall-clock time. Organization
+times are synthetic, drawn from a log-normal around --org-seconds (an
+assumption: four pages at the rate scheduler's starting 12 requests per
+minute is ~20 s). Process start-up is a fresh interpreter importing the
+scrapers' heavy dependencies (measured) plus --startup-seconds (assumed,
+default 4 s) for the MongoDB ping, index checks and session check or
+login. Both engines draw the same organization times, so the difference
+reported is start-up and waiting for the slowest account; check the
+assumed costs against real logs before relying on the ratio.
+
+Run with:
+    python benchmarks/bench_worker_pool.py
+    python benchmarks/bench_worker_pool.py --accounts 25 --max-batches 5 10 50 --startup-seconds 8
+"""
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+CYCLE_SLEEP = 10
+HEAVY_IMPORTS = ["bs4", "lxml.html", "pymongo", "curl_cffi.requests", "cryptography.fernet"]
+
+
+def measure_spawn(repeat=5):
+    """Median seconds for a new interpreter to import the scrapers' dependencies."""
+    available = []
+    for module in HEAVY_IMPORTS:
+        if subprocess.run([sys.executable, "-c", f"import {module}"], capture_output=True).returncode == 0:
+            available.append(module)
+    code = "; ".join(f"import {module}" for module in available) or "pass"
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), available
+
+
+class OrgTimes:
+    """Per-account stream of organization scrape times, shared by both models."""
+
+    def __init__(self, seed, median, sigma):
+        self.rnd = random.Random(seed)
+        self.median = median
+        self.sigma = sigma
+        self.drawn = []
+
+    def __getitem__(self, i):
+        while len(self.drawn) <= i:
+            self.drawn.append(self.median * self.rnd.lognormvariate(0, self.sigma))
+        return self.drawn[i]
+
+
+def simulate_cycle(streams, horizon, startup, batch_size, max_batches):
+    """Organizations finished by ``horizon`` when all accounts restart together each cycle."""
+    done, busy = 0, 0.0
+    positions = [0] * len(streams)
+    now = 0.0
+    while now < horizon:
+        ends = []
+        for i, stream in enumerate(streams):
+            t = now + startup
+            for _ in range(batch_size * max_batches):
+                t += stream[positions[i]]
+                if t > horizon:
+                    break
+                positions[i] += 1
+                done += 1
+                busy += stream[positions[i] - 1]
+            ends.append(min(t, horizon))
+        now = max(ends) + CYCLE_SLEEP
+    return done, busy
+
+
+def simulate_workers(streams, horizon, startup):
+    """Organizations finished by ``horizon`` when every account starts once and keeps pulling."""
+    done, busy = 0, 0.0
+    for stream in streams:
+        t, i = startup, 0
+        while t + stream[i] <= horizon:
+            t += stream[i]
+            busy += stream[i]
+            i += 1
+        done += i
+    return done, busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--hours', type=float, default=4)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--max-batches', type=int, nargs='+', default=[5, 10, 50],
+                        help='Batches per process per cycle (new scraper default 10, update 50)')
+    parser.add_argument('--org-seconds', type=float, default=20, help='Assumed median seconds per organization')
+    parser.add_argument('--sigma', type=float, default=0.6, help='Log-normal spread of organization times')
+    parser.add_argument('--startup-seconds', type=float, default=4,
+                        help='Assumed per-process MongoDB ping, index checks and session check/login, on top of imports')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    spawn, imported = measure_spawn()
+    startup = spawn + args.startup_seconds
+    horizon = args.hours * 3600
+    print("MODEL: organization times and --startup-seconds are assumptions, not measurements")
+    print(f"interpreter + imports ({', '.join(imported) or 'none available'}): {spawn:.2f} s measured; "
+          f"start-up per process {startup:.1f} s with {args.startup_seconds:g} s assumed")
+    print(f"{args.accounts} accounts, {args.hours:g} h, batches of {args.batch_size}, "
+          f"median {args.org_seconds:g} s/organization (sigma {args.sigma:g})\n")
+
+    streams = [OrgTimes(args.seed * 1000 + i, args.org_seconds, args.sigma) for i in range(args.accounts)]
+    workers_done, workers_busy = simulate_workers(streams, horizon, startup)
+    capacity = args.accounts * horizon
+
+    print(f"{'model':<22} {'orgs':>7} {'orgs/min':>9} {'busy':>6} {'vs cycle':>9}")
+    for max_batches in args.max_batches:
+        done, busy = simulate_cycle(streams, horizon, startup, args.batch_size, max_batches)
+        print(f"{f'cycle, {max_batches} batches':<22} {done:>7} {done / (horizon / 60):>9.2f} "
+              f"{busy / capacity:>6.0%} {'':>9}")
+        print(f"{'  workers':<22} {workers_done:>7} {workers_done / (horizon / 60):>9.2f} "
+              f"{workers_busy / capacity:>6.0%} {workers_done / done:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
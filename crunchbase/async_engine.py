@@ -0,0 +1,316 @@
+"""
+asyncio fetch engine: one process drives every account.
+
+The process-per-account model runs one blocking curl_cffi Session per OS
+process and fetches the summary, financial, news and tech pages strictly
+one after another. Here every account gets a curl_cffi AsyncSession and
+ORGS_PER_ACCOUNT organizations per account are in flight at once; an
+organization's detail pages are fetched concurrently once its summary is
+parsed. Politeness is the account's RateScheduler (rate_scheduler.py),
+the same one the sync scrapers use, so waiting for a request slot no
+longer blocks a process. Outcomes also go to the scraper's ProxyPool
+(proxy_pool.py); when the account's proxy is ejected it moves to another
+one and logs in again.
+
+Claiming, leases and writes are the scrapers' own (UpdateScrapper /
+NewScrapper instances sharing one MongoClient); their blocking pymongo
+calls and the page parsers run in worker threads via asyncio.to_thread.
+
+    python main.py --engine async ...
+    python async_engine.py --accounts-file config.json --update 5 --new 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from curl_cffi.requests import AsyncSession
+from pymongo import MongoClient
+
+from pages import Page, is_logged_in
+from rate_scheduler import retry_after_seconds
+from session_cache import import_cookies
+from summery import SUMMARY
+from news import NEWS
+from finance import FINANCIAL
+from tech import TECH
+from update_scrapper import MONGO_URI, UpdateScrapper
+from new_scrapper import NewScrapper
+from worker_pool import assign_accounts
+
+# Organizations scraped concurrently per account
+ORGS_PER_ACCOUNT = 3
+FETCH_RETRIES = 10
+REQUEST_TIMEOUT = 30
+
+SESSIONS_URL = "https://www.crunchbase.com/v4/cb/sessions"
+IMPERSONATE = "chrome110"
+
+
+class AccountSession:
+    """One Crunchbase login: an AsyncSession through the scraper's proxy, paced by its RateScheduler."""
+
+    def __init__(self, scraper, label):
+        self.scraper = scraper
+        self.email = scraper.email
+        self.password = scraper.password
+        self.logger = scraper.logger
+        self.label = label
+        self.session = None
+        self._login_lock = asyncio.Lock()
+        self._proxy_lock = asyncio.Lock()
+        self._generation = 0
+        # Requests in flight per session (by id), and replaced sessions waiting for theirs to finish
+        self._in_flight = {}
+        self._retired = {}
+        # The scraper's scheduler: one per account, kept across proxy switches
+        self.rate = scraper.rate
+
+    async def report_proxy(self, started, status=None, error=None):
+        """Feed the outcome to the proxy pool; False if the proxy was ejected (and replaced)."""
+        proxy = self.scraper.proxy_url
+        if await asyncio.to_thread(self.scraper.report_proxy, started, status, error):
+            return True
+        async with self._proxy_lock:
+            # Concurrent fetches through the same dead proxy switch only once
+            if self.scraper.proxy_url == proxy:
+                await asyncio.to_thread(self.scraper.switch_proxy)
+        return False
+
+    async def start(self):
+        """Resume the account's cached login (session_cache.py), else log in."""
+        cookies = await asyncio.to_thread(self.scraper.cached_session_cookies)
+        if not cookies:
+            return await self.login()
+        self.session = AsyncSession(impersonate=IMPERSONATE, proxies=self.scraper.proxy, timeout=REQUEST_TIMEOUT)
+        import_cookies(self.session.cookies, cookies)
+        self._generation += 1
+        self.logger.log(f"{self.label}: Resumed cached session for {self.email}")
+        return True
+
+    async def login(self):
+        """Log in on a new session and swap it in; the old one closes once its requests finish."""
+        for _ in range(FETCH_RETRIES):
+            await self.rate.acquire()
+            started = time.monotonic()
+            session = AsyncSession(impersonate=IMPERSONATE, proxies=self.scraper.proxy, timeout=REQUEST_TIMEOUT)
+            try:
+                response = await session.post(
+                    SESSIONS_URL, json={"email": self.email, "password": self.password}
+                )
+                self.rate.record(response.status_code, retry_after=retry_after_seconds(response))
+                if not await self.report_proxy(started, response.status_code):
+                    await session.close()
+                    continue
+                if response.status_code == 201:
+                    old, self.session = self.session, session
+                    self._generation += 1
+                    await self._retire(old)
+                    self.logger.log(f"{self.label}: Login successful for {self.email}")
+                    await asyncio.to_thread(self.scraper.save_session_cookies, session.cookies)
+                    return True
+                self.logger.error(f"{self.label}: Login failed with status {response.status_code}")
+            except Exception as e:
+                self.rate.record(error=e)
+                self.logger.error(f"{self.label}: Login error: {e}")
+                await self.report_proxy(started, error=e)
+            await session.close()
+        return False
+
+    async def _retire(self, session):
+        """Close a replaced session now if it is idle, else when its last request finishes."""
+        if session is None:
+            return
+        if self._in_flight.get(id(session)):
+            self._retired[id(session)] = session
+        else:
+            await session.close()
+
+    async def _finished(self, session):
+        key = id(session)
+        self._in_flight[key] -= 1
+        if not self._in_flight[key]:
+            del self._in_flight[key]
+            if key in self._retired:
+                await self._retired.pop(key).close()
+
+    async def relogin(self, generation):
+        """Log in again unless a concurrent fetch already did since ``generation``."""
+        async with self._login_lock:
+            if self._generation == generation:
+                await self.login()
+
+    async def get(self, url):
+        """GET with retries; the response (200 or 404) or False, like get_requests."""
+        for _ in range(FETCH_RETRIES):
+            await self.rate.acquire()
+            session, generation = self.session, self._generation
+            started = time.monotonic()
+            self._in_flight[id(session)] = self._in_flight.get(id(session), 0) + 1
+            try:
+                try:
+                    response = await session.get(url)
+                finally:
+                    await self._finished(session)
+                self.rate.record(response.status_code, retry_after=retry_after_seconds(response))
+                if not await self.report_proxy(started, response.status_code):
+                    await self.relogin(generation)
+                    continue
+                if response.status_code == 200:
+                    if not is_logged_in(response.content):
+                        self.logger.error(f"{self.label}: Session may have expired while fetching {url}")
+                        await self.relogin(generation)
+                        continue
+                    return Page(response)
+                elif response.status_code == 404:
+                    return response
+                else:
+                    self.logger.error(f"{self.label}: Failed to fetch {url} with status {response.status_code}")
+            except Exception as e:
+                if generation != self._generation:
+                    # The session was replaced under this request: not the proxy's or the server's doing
+                    self.logger.log(f"{self.label}: Retrying {url} on the new session ({e})")
+                    continue
+                self.rate.record(error=e)
+                self.logger.error(f"{self.label}: Error fetching {url}: {e}")
+                if not await self.report_proxy(started, error=e):
+                    await self.relogin(generation)
+        return False
+
+    async def close(self):
+        for session in [self.session, *self._retired.values()]:
+            if session:
+                await session.close()
+        self._retired.clear()
+
+
+# Detail pages per role: (path suffix, summary link that enables it, processor)
+UPDATE_PAGES = [
+    ("financial_details", "financial", lambda r: FINANCIAL().financial_process_logic(r, {})),
+    ("news_and_analysis", "news", lambda r: NEWS().news_process_logic(r, {})),
+    ("tech_details", "news", lambda r: TECH().tech_process_logic(r, {})),
+]
+NEW_PAGES = UPDATE_PAGES[:2]
+
+
+async def scrape_organization(account, org_url, org_name, pages):
+    """Async UpdateScrapper.scrape_organization: data dict, 404 or None."""
+    try:
+        account.logger.log(f"{account.label}: Fetching summary for {org_name}")
+        summary_response = await account.get(org_url)
+        if not summary_response:
+            return None
+        if summary_response.status_code == 404:
+            return 404
+
+        summary_data, financial_url, signals_and_news_url, _, _ = await asyncio.to_thread(
+            SUMMARY().summary_process_logic, summary_response, {}
+        )
+        links = {"financial": financial_url, "news": signals_and_news_url}
+        wanted = [(suffix, process) for suffix, link, process in pages if links[link]]
+
+        responses = await asyncio.gather(*(account.get(f"{org_url}/{suffix}") for suffix, _ in wanted))
+        data = dict(summary_data)
+        for (suffix, process), response in zip(wanted, responses):
+            if not response or response.status_code != 200:
+                account.logger.error(f"{account.label}: Failed to fetch {suffix} for {org_name}")
+                return None
+            data.update(await asyncio.to_thread(process, response))
+        return data
+
+    except Exception as e:
+        account.logger.error(f"{account.label}: Error scraping {org_name}: {e}")
+        return None
+
+
+ROLES = {
+    # role: (scraper class, claim method, detail pages, batch size env, max batches env)
+    "update": (UpdateScrapper, "read_crunch_details", UPDATE_PAGES,
+               "SCRAPER_BATCH_SIZE_UPDATE", "SCRAPER_MAX_BATCHES_UPDATE"),
+    "new": (NewScrapper, "read_crunch_details_new", NEW_PAGES,
+            "SCRAPER_BATCH_SIZE_NEW", "SCRAPER_MAX_BATCHES_NEW"),
+}
+
+
+async def run_account(role, account, thread_id, client, concurrency=ORGS_PER_ACCOUNT):
+    """The async counterpart of UpdateScrapper.run / NewScrapper.run for one account."""
+    scraper_class, claim_method, pages, batch_env, max_batches_env = ROLES[role]
+    batch_size = int(os.environ.get(batch_env, 10))
+    max_batches = int(os.environ.get(max_batches_env, 50 if role == "update" else 10))
+
+    scraper = await asyncio.to_thread(scraper_class, account['email'], account['password'], thread_id, client)
+    label = f"{role}-{thread_id}"
+    session = AccountSession(scraper, label)
+    if not await session.start():
+        scraper.logger.error(f"{label}: Cannot start - login failed")
+        return
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(item, leases):
+        async with semaphore:
+            try:
+                target = await asyncio.to_thread(scraper.scrape_target, item)
+                if not target:
+                    return False
+                org_url, org_name = target
+                scraped_data = await scrape_organization(session, org_url, org_name, pages)
+                return await asyncio.to_thread(scraper.save_result, item, org_name, scraped_data, leases)
+            finally:
+                await asyncio.to_thread(scraper.finish, item)
+
+    try:
+        for batch_num in range(max_batches):
+            try:
+                items = await asyncio.to_thread(getattr(scraper, claim_method), batch_size)
+                if not items:
+                    scraper.logger.log(f"{label}: No more work")
+                    break
+                # Entering starts the heartbeat thread and exiting joins it: keep both off the loop
+                heartbeat = scraper.lease_batch(items)
+                leases = await asyncio.to_thread(heartbeat.__enter__)
+                try:
+                    results = await asyncio.gather(*(process(item, leases) for item in items), return_exceptions=True)
+                    await asyncio.to_thread(scraper.writes.flush)
+                    failed = scraper.writes.forget([item['_id'] for item in items])
+                finally:
+                    await asyncio.to_thread(heartbeat.__exit__, None, None, None)
+                for result in results:
+                    if isinstance(result, Exception):
+                        scraper.logger.error(f"{label}: Error processing item: {result}")
+                succeeded = {item['_id'] for item, result in zip(items, results) if result is True}
+                success_count = len(succeeded - failed.keys())
+                scraper.logger.log(f"{label}: Batch {batch_num + 1} completed - {success_count}/{len(items)} successful")
+                await asyncio.to_thread(scraper.export_state)
+            except Exception as e:
+                scraper.logger.error(f"{label}: Error in batch {batch_num + 1}: {e}")
+                await asyncio.sleep(30)
+    finally:
+        await asyncio.to_thread(scraper.writes.flush)
+        await session.close()
+
+
+async def run_accounts(assignments, mongo_uri=MONGO_URI, concurrency=ORGS_PER_ACCOUNT):
+    """Run ``[(role, account, thread_id), ...]`` concurrently in this process."""
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=50000)
+    try:
+        await asyncio.gather(*(
+            run_account(role, account, thread_id, client, concurrency)
+            for role, account, thread_id in assignments
+        ))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run Crunchbase scrapers for several accounts in one process')
+    parser.add_argument('--update', type=int, default=1, help='Accounts for the update scraper')
+    parser.add_argument('--new', type=int, default=0, help='Accounts for the new scraper')
+    parser.add_argument('--concurrency', type=int, default=ORGS_PER_ACCOUNT, help='Organizations in flight per account')
+    parser.add_argument('--accounts-file', type=str, required=True, help='JSON config with an "accounts" list')
+    args = parser.parse_args()
+
+    with open(args.accounts_file) as f:
+        active = [acc for acc in json.load(f).get('accounts', []) if acc.get('active', False)]
+    asyncio.run(run_accounts(assign_accounts(active, args.update, args.new), concurrency=args.concurrency))
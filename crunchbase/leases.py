@@ -0,0 +1,155 @@
+"""
+Expiring, owner-stamped leases on MongoDB documents.
+
+A worker claims a document with one atomic find_one_and_update that only
+matches when nobody holds an unexpired lease on it, stamping its owner id
+and an expiry. While it works it renews the lease (heartbeat); when it is
+done it releases the lease, optionally writing its result in the same
+update. If the worker dies the lease simply runs out and the next claim
+picks the document up again, so there is no cleanup job.
+
+Owner ids combine host, pid and thread, so the protocol holds across
+update/new threads on one machine as well as across machines. Expiry uses
+each host's UTC clock; keep LEASE_TTL well above any expected clock skew.
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, DeleteOne, ReturnDocument, UpdateOne
+
+from queries import LEASE_EXPIRES_FIELD as EXPIRES_FIELD, LEASE_OWNER_FIELD as OWNER_FIELD, claimable
+
+# How long a claim lasts without a heartbeat
+LEASE_TTL = timedelta(minutes=10)
+
+
+def make_owner(role, thread_id):
+    return f"{socket.gethostname()}:{os.getpid()}:{role}-{thread_id}"
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+class Leases:
+    def __init__(self, collection, owner, ttl=LEASE_TTL, logger=None):
+        self.collection = collection
+        self.owner = owner
+        self.ttl = ttl
+        self.logger = logger
+
+    def ensure_index(self, keys, name=None):
+        """Index ``keys`` followed by the lease expiry, for claim filters on ``keys``."""
+        self.collection.create_index(list(keys) + [(EXPIRES_FIELD, ASCENDING)], name=name)
+
+    def claim(self, filter, sort=None, projection=None, now=None):
+        """Atomically lease one document matching ``filter``; None when there is none."""
+        now = now or utcnow()
+        return self.collection.find_one_and_update(
+            claimable(filter, now),
+            {"$set": {OWNER_FIELD: self.owner, EXPIRES_FIELD: now + self.ttl}},
+            sort=sort,
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def claim_many(self, filter, count, sort=None, projection=None, now=None):
+        docs = []
+        while len(docs) < count:
+            doc = self.claim(filter, sort, projection, now)
+            if doc is None:
+                break
+            docs.append(doc)
+        return docs
+
+    def renew(self, doc_id, now=None):
+        """Extend our lease; False if it expired and someone else took it."""
+        now = now or utcnow()
+        result = self.collection.update_one(
+            {"_id": doc_id, OWNER_FIELD: self.owner},
+            {"$set": {EXPIRES_FIELD: now + self.ttl}}
+        )
+        return result.matched_count == 1
+
+    def release(self, doc_id, set_fields=None, hold=None, now=None):
+        """Give the lease up, writing ``set_fields`` atomically with it.
+
+        With ``hold`` the document stays unclaimable for that long (e.g.
+        a retry back-off after a failure). Returns False if the lease had
+        already been lost, in which case nothing is written.
+        """
+        result = self.collection.update_one(*self._release(doc_id, set_fields, hold, now))
+        return result.matched_count == 1
+
+    def release_op(self, doc_id, set_fields=None, hold=None, now=None):
+        """``release`` as an UpdateOne request, for a bulk write."""
+        return UpdateOne(*self._release(doc_id, set_fields, hold, now))
+
+    def _release(self, doc_id, set_fields, hold, now):
+        update = {"$set": dict(set_fields or {})}
+        if hold:
+            update["$set"][EXPIRES_FIELD] = (now or utcnow()) + hold
+            update["$set"][OWNER_FIELD] = None
+        else:
+            update["$unset"] = {OWNER_FIELD: "", EXPIRES_FIELD: ""}
+        return {"_id": doc_id, OWNER_FIELD: self.owner}, update
+
+    def delete(self, doc_id):
+        """Remove a document we hold (work-queue entries)."""
+        return self.collection.delete_one({"_id": doc_id, OWNER_FIELD: self.owner}).deleted_count == 1
+
+    def delete_op(self, doc_id):
+        """``delete`` as a DeleteOne request, for a bulk write."""
+        return DeleteOne({"_id": doc_id, OWNER_FIELD: self.owner})
+
+    def heartbeat(self, doc_ids):
+        """Context manager renewing our leases on ``doc_ids`` in the background."""
+        return _Heartbeat(self, doc_ids)
+
+
+class _Heartbeat:
+    """Renews leases every ttl/3 until the block exits.
+
+    A worker that claims a batch heartbeats all of it, so documents waiting
+    their turn do not expire. Call ``confirm(doc_id)`` before writing a
+    result: it renews synchronously and returns False if the lease is gone,
+    so a stalled worker cannot overwrite the work of whoever took the
+    document over.
+    """
+
+    def __init__(self, leases, doc_ids):
+        self.leases = leases
+        self.doc_ids = list(doc_ids)
+        self.lost = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        interval = self.leases.ttl.total_seconds() / 3
+        while not self._stop.wait(interval):
+            for doc_id in self.doc_ids:
+                if doc_id in self.lost:
+                    continue
+                try:
+                    if not self.leases.renew(doc_id):
+                        self.lost.add(doc_id)
+                except Exception as e:
+                    # Transient: the lease is still valid until it expires
+                    if self.leases.logger:
+                        self.leases.logger.error(f"{self.leases.owner}: Lease renewal for {doc_id} failed: {e}")
+
+    def confirm(self, doc_id):
+        if doc_id not in self.lost and not self.leases.renew(doc_id):
+            self.lost.add(doc_id)
+        return doc_id not in self.lost
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
@@ -1,4 +1,5 @@
 import re
+import asyncio
 import threading
 import time
 import json
@@ -67,12 +68,15 @@ def parse_arguments():
     parser.add_argument('--config-file', type=str, default=None, help='Path to JSON config file (written by manager)')
     parser.add_argument('--mode', type=str, choices=['all', 'new_only', 'update_only'], default='all',
                         help='Run mode: all (both scrapers), new_only, update_only')
+    parser.add_argument('--engine', type=str, choices=['workers', 'process', 'async'], default=None,
+                        help='workers: one long-lived process per account (default); '
+                             'process: a new subprocess per account every cycle; async: all accounts in this process')
     return parser.parse_args()
 
 
 class ThreadManager:
     def __init__(self, accounts, update_threads=None, new_threads=None,
-                 mongo_uri=None, log_base=None, config=None):
+                 mongo_uri=None, log_base=None, config=None, engine='workers'):
         self.accounts = accounts
         self.active_threads = []
         self.lock = threading.Lock()
@@ -83,6 +87,7 @@ class ThreadManager:
         self.db = self.client['STARTUPSCRAPERDATA']
         self.manual_update_threads = update_threads
         self.manual_new_threads = new_threads
+        self.engine = engine
 
         os.makedirs(os.path.join(self.log_base, "main_logs"), exist_ok=True)
         self.logger = CustomLogger(log_folder=os.path.join(self.log_base, "main_logs"))
@@ -127,6 +132,28 @@ class ThreadManager:
             new_threads = 0
             return {'update': update_threads, 'new': new_threads, 'alternating': False}
 
+    def scraper_env(self):
+        """Settings the scrapers read from the environment"""
+        # Pass log_base and mongo_uri via environment
+        env = {
+            'SCRAPER_LOG_BASE': self.log_base,
+            'SCRAPER_MONGO_URI': self.mongo_uri,
+        }
+
+        # Pass batch settings via environment if available from config
+        if self.config.get('batch_size_new'):
+            env['SCRAPER_BATCH_SIZE_NEW'] = str(self.config['batch_size_new'])
+        if self.config.get('batch_size_update'):
+            env['SCRAPER_BATCH_SIZE_UPDATE'] = str(self.config['batch_size_update'])
+        if self.config.get('max_batches_new'):
+            env['SCRAPER_MAX_BATCHES_NEW'] = str(self.config['max_batches_new'])
+        if self.config.get('max_batches_update'):
+            env['SCRAPER_MAX_BATCHES_UPDATE'] = str(self.config['max_batches_update'])
+        # Proxy list for proxy_pool.load_proxies
+        if self.config.get('proxies'):
+            env['SCRAPER_PROXIES'] = '\n'.join(self.config['proxies'])
+        return env
+
     def start_scraper_thread(self, script_name, account, thread_id):
         """Start a scraper thread"""
         try:
@@ -138,20 +165,8 @@ class ThreadManager:
                    account['password'],
                    str(thread_id)]
 
-            # Pass log_base and mongo_uri via environment
             env = os.environ.copy()
-            env['SCRAPER_LOG_BASE'] = self.log_base
-            env['SCRAPER_MONGO_URI'] = self.mongo_uri
-
-            # Pass batch settings via environment if available from config
-            if self.config.get('batch_size_new'):
-                env['SCRAPER_BATCH_SIZE_NEW'] = str(self.config['batch_size_new'])
-            if self.config.get('batch_size_update'):
-                env['SCRAPER_BATCH_SIZE_UPDATE'] = str(self.config['batch_size_update'])
-            if self.config.get('max_batches_new'):
-                env['SCRAPER_MAX_BATCHES_NEW'] = str(self.config['max_batches_new'])
-            if self.config.get('max_batches_update'):
-                env['SCRAPER_MAX_BATCHES_UPDATE'] = str(self.config['max_batches_update'])
+            env.update(self.scraper_env())
 
             # Run from the script's directory
             script_dir = os.path.dirname(os.path.abspath(script_name)) or os.path.dirname(os.path.abspath(__file__))
@@ -273,6 +288,60 @@ class ThreadManager:
                 self.logger.error(f"Error in parallel mode: {e}")
                 time.sleep(30)
 
+    def run_async_mode(self, active_accounts, distribution):
+        """Run every account in this process on the asyncio engine"""
+        self.logger.log(f"Running in ASYNC mode: {distribution['update']} update accounts, {distribution['new']} new accounts")
+
+        # The scraper modules read their settings at import time
+        os.environ.update(self.scraper_env())
+        import async_engine
+        concurrency = self.config.get('orgs_per_account', async_engine.ORGS_PER_ACCOUNT)
+
+        cycle = 0
+        while True:
+            try:
+                if distribution.get('alternating', False):
+                    # Single account - alternate update and new cycles
+                    role = 'update' if cycle % 2 == 0 else 'new'
+                    assignments = [(role, active_accounts[0], 1)]
+                else:
+                    assignments = async_engine.assign_accounts(
+                        active_accounts, distribution['update'], distribution['new']
+                    )
+                asyncio.run(async_engine.run_accounts(assignments, self.mongo_uri, concurrency))
+
+                cycle += 1
+                self.logger.log("All accounts completed. Starting new cycle...")
+                time.sleep(10)  # Delay between cycles
+
+            except KeyboardInterrupt:
+                self.logger.log("Async mode interrupted by user")
+                break
+            except Exception as e:
+                self.logger.error(f"Error in async mode: {e}")
+                time.sleep(30)
+
+    def run_worker_mode(self, active_accounts, distribution):
+        """Run one long-lived worker process per account (see worker_pool.py)"""
+        from worker_pool import WorkerPool, assign_accounts
+
+        if distribution.get('alternating', False):
+            # Single account - one worker alternating update and new batches
+            assignments = [(('update', 'new'), active_accounts[0], 1)]
+        else:
+            assignments = [
+                ((role,), account, thread_id)
+                for role, account, thread_id in assign_accounts(
+                    active_accounts, distribution['update'], distribution['new']
+                )
+            ]
+        self.logger.log(f"Running in WORKER mode: {len(assignments)} persistent workers")
+
+        try:
+            WorkerPool(assignments, self.scraper_env(), self.logger).run()
+        except KeyboardInterrupt:
+            self.logger.log("Worker mode interrupted by user")
+
     def start(self):
         """Main entry point"""
         self.logger.log("=" * 80)
@@ -290,7 +359,11 @@ class ThreadManager:
             distribution = self.calculate_thread_distribution(len(active_accounts))
             self.logger.log(f"Thread distribution: {distribution}")
 
-            if distribution.get('alternating', False):
+            if self.engine == 'workers':
+                self.run_worker_mode(active_accounts, distribution)
+            elif self.engine == 'async':
+                self.run_async_mode(active_accounts, distribution)
+            elif distribution.get('alternating', False):
                 # Single account - alternating mode
                 self.run_alternating_mode(active_accounts[0])
             else:
@@ -366,6 +439,9 @@ if __name__ == "__main__":
     logger.log(f"Configuration: {update_acc} update threads, {new_acc} new threads (Total active accounts: {accounts_len})")
     logger.log(f"Mode: {mode}")
 
+    engine = args.engine or config.get('engine', 'workers')
+    logger.log(f"Engine: {engine}")
+
     manager = ThreadManager(
         accounts=accounts,
         update_threads=update_acc,
@@ -373,6 +449,7 @@ if __name__ == "__main__":
         mongo_uri=mongo_uri,
         log_base=log_base,
         config=config,
+        engine=engine,
     )
     try:
         manager.start()
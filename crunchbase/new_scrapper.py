@@ -1,16 +1,25 @@
-from bs4 import BeautifulSoup
 from curl_cffi import requests
 import json
 import time
 import random
 import sys
 from datetime import datetime, timedelta
-from pymongo import MongoClient, UpdateOne
+from pymongo import InsertOne, MongoClient, UpdateOne
 from pymongo.errors import BulkWriteError, ConnectionFailure
 from logger import CustomLogger
 from summery import SUMMARY
 from news import NEWS
 from finance import FINANCIAL
+from queries import (
+    DB_NAME, NEW_ORGANIZATIONS, NEW_RAW_URLS, SCHEDULER_STATS,
+    existing_organization_urls, new_url_priority_filters,
+)
+from pages import Page, is_logged_in
+from leases import Leases, make_owner
+from write_buffer import WriteBuffer
+from rate_scheduler import RateScheduler, retry_after_seconds
+from proxy_pool import PROXY_ERROR_STATUSES, ProxyPool, as_requests_proxies, load_proxies
+from session_cache import SessionCache, import_cookies
 import pytz
 import os
 
@@ -20,6 +29,8 @@ MONGO_URI = os.environ.get(
 )
 LOG_BASE = os.environ.get('SCRAPER_LOG_BASE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs'))
 STATS_FILE = os.path.join(LOG_BASE, 'run_status.json')
+# Failed URLs are not claimed again for this long
+FAILED_RETRY_AFTER = timedelta(hours=1)
 import json
 def save_run_stats(inserted_count):
     
@@ -31,7 +42,7 @@ def save_run_stats(inserted_count):
         json.dump(config, f, ensure_ascii=False, indent=4)
         
 class NewScrapper:
-    def __init__(self, email, password, thread_id):
+    def __init__(self, email, password, thread_id, client=None):
         self.email = email
         self.password = password
         self.thread_id = thread_id
@@ -41,50 +52,63 @@ class NewScrapper:
         
         # MongoDB setup
         try:
-            self.client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=50000)
+            # The async engine shares one client between all accounts
+            self.client = client or MongoClient(MONGO_URI, serverSelectionTimeoutMS=50000)
             self.client.admin.command('ping')
             self.logger.log(f"Thread-{self.thread_id}: MongoDB connection established")
         except ConnectionFailure as e:
             self.logger.error(f"Thread-{self.thread_id}: MongoDB connection failed: {e}")
             raise
         
-        self.db = self.client['STARTUPSCRAPERDATA']
-        self.crunch_organization_details = self.db['OrganiztionDetails']
-        self.crunch_raw_urls = self.db['CrunchURLS']
+        self.db = self.client[DB_NAME]
+        self.crunch_organization_details = self.db[NEW_ORGANIZATIONS]
+        self.crunch_raw_urls = self.db[NEW_RAW_URLS]
+        
+        # Raw URLs are leased so concurrent threads and hosts never scrape the same one
+        self.owner = make_owner("new", thread_id)
+        self.url_leases = Leases(self.crunch_raw_urls, self.owner, logger=self.logger)
+        self.url_leases.ensure_index([("status", 1)], name="status_lease")
+        self.url_leases.ensure_index([("is_read", 1)], name="is_read_lease")
+        # Backs the per-batch duplicate check in read_crunch_details_new
+        self.crunch_organization_details.create_index([("organization_url", 1)], name="organization_url")
+        
+        # Results are written in bulk (see write_buffer.py)
+        self.writes = WriteBuffer(self.db, on_error=self.on_write_error, logger=self.logger)
         
         # Session setup
         self.session = None
+        # Logged-in cookies survive restarts (see session_cache.py)
+        self.sessions = SessionCache(self.db, logger=self.logger)
+        self.sessions.ensure_index()
+        # Health-scored proxies shared by every scraper (see proxy_pool.py)
+        self.proxy_pool = ProxyPool(self.db, load_proxies(), logger=self.logger)
+        # Paces every request to Crunchbase for this account; kept across proxy switches
+        self.rate = RateScheduler(self.email)
         self.proxy = self.get_proxy()
+        self.rate_stats = self.db[SCHEDULER_STATS]
         self.tz = pytz.timezone('UTC')
     
-    def save_stats_count(self, count):
-        """Save run statistics to the MongoDB collection"""    
-        try:
-            stats_collection = self.db['run_stats']
-            stats_collection.update_one(
-                {"_id": "update_run_stats"},
-                {"$inc": {"new_added_organiztion": count}}
-            )
-        except Exception as e:
-            self.logger.error(f"Thread-{self.thread_id}: Failed to save stats: {e}")
-
-        
-    def get_proxy(self):
-        """Get random proxy"""
-        plist = [
-            "37.48.118.90:13082",
-            "83.149.70.159:13082"
-        ]
-        prx = random.choice(plist)
-        return {
-            'http': 'http://' + prx,
-            'https': 'http://' + prx
-        }
+    def get_proxy(self, exclude=()):
+        """This account's proxy from the pool; it stays the same while it is healthy"""
+        self.proxy_url = self.proxy_pool.assign(self.email, exclude)
+        return as_requests_proxies(self.proxy_url)
+    
+    def report_proxy(self, started, status=None, error=None):
+        """Feed a request's outcome to the proxy pool; False once the proxy is ejected"""
+        ok = error is None and status not in PROXY_ERROR_STATUSES
+        return self.proxy_pool.record(self.proxy_url, time.monotonic() - started, ok, error)
+    
+    def switch_proxy(self):
+        """Move this account off an ejected proxy; the session must log in again"""
+        old_proxy = self.proxy_url
+        self.proxy = self.get_proxy(exclude={old_proxy})
+        self.logger.error(f"Thread-{self.thread_id}: Proxy {old_proxy} ejected, switched to {self.proxy_url}")
     
     def login(self):
         """Login to Crunchbase"""
         for _ in range(10):
-            self.random_sleep(5,10)
+            self.rate.wait()
+            started = time.monotonic()
             try:
                 self.session = requests.Session()
                 login_response = self.session.post(
@@ -97,18 +121,50 @@ class NewScrapper:
                     proxies=self.proxy,
                     timeout=30
                 )
+                self.rate.record(login_response.status_code, retry_after=retry_after_seconds(login_response))
+                if not self.report_proxy(started, login_response.status_code):
+                    self.switch_proxy()
+                    continue
                 
                 if login_response.status_code == 201:
                     self.logger.log(f"Thread-{self.thread_id}: Login successful for {self.email}")
+                    self.save_session_cookies(self.session.cookies)
                     return True
                 else:
                     self.logger.error(f"Thread-{self.thread_id}: Login failed with status {login_response.status_code}")
                     # return False
                     
             except Exception as e:
+                self.rate.record(error=e)
                 self.logger.error(f"Thread-{self.thread_id}: Login error: {e}")
+                if not self.report_proxy(started, error=e):
+                    self.switch_proxy()
         return False
     
+    def cached_session_cookies(self):
+        """This account's cached login cookies, or None if it has to log in"""
+        try:
+            return self.sessions.load(self.email)
+        except Exception as e:
+            self.logger.error(f"Thread-{self.thread_id}: Session cache unavailable: {e}")
+            return None
+    
+    def save_session_cookies(self, cookies):
+        try:
+            self.sessions.save(self.email, cookies)
+        except Exception as e:
+            self.logger.error(f"Thread-{self.thread_id}: Failed to cache session: {e}")
+    
+    def resume_session(self):
+        """Start from the cached login; a rejected session is caught by get_requests"""
+        cookies = self.cached_session_cookies()
+        if not cookies:
+            return False
+        self.session = requests.Session()
+        import_cookies(self.session.cookies, cookies)
+        self.logger.log(f"Thread-{self.thread_id}: Resumed cached session for {self.email}")
+        return True
+    
     def random_sleep(self, a=3, b=7):
         """Sleep for random duration"""
         random_int = random.randint(a, b)
@@ -118,87 +174,89 @@ class NewScrapper:
     def read_crunch_details_new(self, numberofrecords=10):
         """Get new URLs to scrape with priority system"""
         current_time = datetime.now(self.tz)
-        one_month_ago = current_time - timedelta(days=30)
-        
-        # Get existing URLs to avoid duplicates
-        existing_urls = set(
-            doc["organization_url"]
-            for doc in self.crunch_organization_details.find(
-                {"organization_url": {"$ne": None}}, 
-                {"organization_url": 1}
-            )
-        )
-        
-        def filter_out_existing(docs):
-            return [doc for doc in docs if doc.get("url") not in existing_urls]
         
         final_docs = []
         
-        # Priority 1: Only status = pending
-        self.logger.log(f"Thread-{self.thread_id}: Fetching Priority 1 URLs (status=pending)")
-        priority1_match = {"status": "pending"}
-        docs1 = list(self.crunch_raw_urls.aggregate([
-            {"$match": priority1_match},
-            {"$sample": {"size": numberofrecords * 2}}
-        ]))
-        docs1 = filter_out_existing(docs1)
-        final_docs.extend(docs1[:numberofrecords])
-        
-        # Priority 2: is_read=0 or status=pending AND created_at < one_month_ago
-        if len(final_docs) < numberofrecords:
-            remaining = numberofrecords - len(final_docs)
-            self.logger.log(f"Thread-{self.thread_id}: Fetching Priority 2 URLs (old pending/unread)")
-            priority2_match = {
-                "$and": [
-                    {"$or": [{"is_read": 0}, {"status": "pending"}]},
-                    {"$or": [
-                        {"created_at": {"$lt": one_month_ago}},
-                        {"created_at": {"$exists": False}}
-                    ]}
-                ]
-            }
-            docs2 = list(self.crunch_raw_urls.aggregate([
-                {"$match": priority2_match},
-                {"$sample": {"size": remaining * 2}}
-            ]))
-            docs2 = filter_out_existing(docs2)
-            final_docs.extend(docs2[:remaining])
-        
-        # Priority 3: is_read = 0 or status = pending (no date filter)
-        if len(final_docs) < numberofrecords:
-            remaining = numberofrecords - len(final_docs)
-            self.logger.log(f"Thread-{self.thread_id}: Fetching Priority 3 URLs (any pending/unread)")
-            priority3_match = {
-                "$or": [{"is_read": 0}, {"status": "pending"}]
-            }
-            docs3 = list(self.crunch_raw_urls.aggregate([
-                {"$match": priority3_match},
-                {"$sample": {"size": remaining * 2}}
-            ]))
-            docs3 = filter_out_existing(docs3)
-            final_docs.extend(docs3[:remaining])
+        # Priority 1: status = pending; 2: old pending/unread; 3: any pending/unread
+        for label, match in new_url_priority_filters(current_time):
+            self.logger.log(f"Thread-{self.thread_id}: Claiming '{label}' URLs")
+            while len(final_docs) < numberofrecords:
+                claimed = self.url_leases.claim_many(match, numberofrecords - len(final_docs), now=current_time)
+                if not claimed:
+                    break
+                final_docs.extend(self.drop_existing(claimed, current_time))
+            if len(final_docs) >= numberofrecords:
+                break
         
-        self.logger.log(f"Thread-{self.thread_id}: Found {len(final_docs)} new URLs to scrape")
+        self.logger.log(f"Thread-{self.thread_id}: Claimed {len(final_docs)} new URLs to scrape")
         return final_docs
     
+    def drop_existing(self, url_docs, current_time):
+        """Close claimed URLs that already have an organization; return the rest"""
+        urls = [doc.get("url") for doc in url_docs]
+        existing_urls = {
+            doc["organization_url"]
+            for doc in self.crunch_organization_details.find(
+                existing_organization_urls(urls),
+                {"organization_url": 1, "_id": 0}
+            )
+        }
+        
+        new_docs = []
+        for doc in url_docs:
+            if doc.get("url") in existing_urls:
+                # Already scraped; close it so no thread claims it again
+                self.url_leases.release(doc["_id"], {
+                    "is_read": 1,
+                    "status": "completed",
+                    "processed_at": current_time
+                })
+            else:
+                new_docs.append(doc)
+        return new_docs
+    
+    def export_state(self):
+        """Publish the request scheduler's state (achieved requests/minute, backoff) and proxy health"""
+        state = self.rate.state()
+        self.logger.log(
+            f"Thread-{self.thread_id}: Request rate {state['achieved_per_min']}/min "
+            f"(limit {state['rate_per_min']}/min, {state['throttled']} throttled, {state['errors']} errors)"
+        )
+        try:
+            self.rate.export(self.rate_stats)
+            self.proxy_pool.sync()
+        except Exception as e:
+            self.logger.error(f"Thread-{self.thread_id}: Failed to export rate/proxy state: {e}")
+    
     def get_requests(self, url):
         """Get request with retries"""
         for _ in range(10):
+            self.rate.wait()
+            started = time.monotonic()
             try:
                 response = self.session.get(url, impersonate="chrome110", proxies=self.proxy, timeout=30)
+                self.rate.record(response.status_code, retry_after=retry_after_seconds(response))
+                if not self.report_proxy(started, response.status_code):
+                    self.switch_proxy()
+                    self.login()
+                    continue
                 if response.status_code == 200:
-                    data = BeautifulSoup(response.text, 'html.parser')
-                    if not data.find('button',{"aria-label":"Account"}):
+                    if not is_logged_in(response.content):
                         self.logger.error(f"Thread-{self.thread_id}: Session may have expired while fetching {url}")
                         self.login()
                         continue
                     
-                    return response
+                    # Parsed once, on first use, for all processors
+                    return Page(response)
                 else:
                     self.logger.error(f"Thread-{self.thread_id}: Failed to fetch {url} with status {response.status_code}")
             except Exception as e:
+                # Timeouts and connection errors slow the scheduler down too
+                self.rate.record(error=e)
                 self.logger.error(f"Thread-{self.thread_id}: Error fetching {url}: {e}")
-            self.random_sleep(5,10)
+                if not self.report_proxy(started, error=e):
+                    self.switch_proxy()
+                    self.login()
         return False
     
     def scrape_organization(self, org_url, org_name):
@@ -207,7 +265,6 @@ class NewScrapper:
             data = {}
             
             # Scrape summary
-            self.random_sleep()
             self.logger.log(f"Thread-{self.thread_id}: Fetching summary for {org_name}")
             summary_response = self.get_requests(f"{org_url}")
             if not summary_response :
@@ -217,10 +274,8 @@ class NewScrapper:
             summary_data, financial_url, signals_and_news_url, investment_url, tech_url = summary_processor.summary_process_logic(summary_response, {})
             data.update(summary_data)
             
-            
             # Scrape financial details
             if financial_url:
-                self.random_sleep()
                 self.logger.log(f"Thread-{self.thread_id}: Fetching financial details for {org_name}")
                 finance_response = self.get_requests(f"{org_url}/financial_details")
                 if not finance_response :
@@ -231,7 +286,6 @@ class NewScrapper:
             
             # Scrape news
             if signals_and_news_url:
-                self.random_sleep()
                 self.logger.log(f"Thread-{self.thread_id}: Fetching news for {org_name}")
                 news_response = self.get_requests(f"{org_url}/news_and_analysis")
                 if not news_response :
@@ -255,8 +309,48 @@ class NewScrapper:
         except:
             return "Unknown"
     
+    def mark_failed(self, url_id, error=None):
+        """Mark a raw URL failed and keep it unclaimable for FAILED_RETRY_AFTER"""
+        fields = {"status": "failed", "failed_at": datetime.now(self.tz)}
+        if error:
+            fields["error"] = error
+        self.url_leases.release(url_id, fields, hold=FAILED_RETRY_AFTER)
+    
+    def on_write_error(self, url_id, error):
+        """Buffered writes for ``url_id`` failed; the URL is not marked completed"""
+        self.logger.error(f"Thread-{self.thread_id}: Error saving organization for URL {url_id}: {error}")
+        try:
+            self.mark_failed(url_id, error=error)
+        except Exception as e:
+            self.logger.error(f"Thread-{self.thread_id}: Could not mark URL {url_id} failed: {e}")
+    
+    def lease_batch(self, url_docs):
+        """Heartbeat the leases of a claimed batch of raw URLs"""
+        return self.url_leases.heartbeat([doc['_id'] for doc in url_docs])
+    
+    def scrape_target(self, url_doc):
+        """(url, name) to scrape"""
+        org_url = url_doc.get('url', '')
+        return org_url, self.extract_org_name_from_url(org_url)
+    
+    def save_result(self, url_doc, org_name, scraped_data, leases):
+        """Queue the writes for one scraped URL; True if a new organization was saved"""
+        if not leases.confirm(url_doc['_id']):
+            self.logger.error(f"Thread-{self.thread_id}: Lease on {org_name} expired and was taken over; discarding result")
+            return False
+        
+        if scraped_data:
+            return self.save_new_organization(url_doc, scraped_data)
+        # Mark as failed
+        self.mark_failed(url_doc['_id'])
+        return False
+    
+    def finish(self, url_doc):
+        # Nothing to do: save_new_organization / mark_failed release the raw URL's lease
+        pass
+    
     def save_new_organization(self, url_doc, scraped_data):
-        """Save new organization to database"""
+        """Queue the new organization and the raw URL status for the next flush"""
         try:
             current_time = datetime.now(self.tz)
             
@@ -285,21 +379,20 @@ class NewScrapper:
                 "last_processed_at": current_time,
                 "created_at": current_time
             }
-            # Insert new organization
-            result = self.crunch_organization_details.insert_one(new_org)
-            
-            # Update raw URL status
-            self.crunch_raw_urls.update_one(
-                {"_id": url_doc['_id']},
-                {"$set": {
-                    "is_read": 1,
-                    "status": "completed",
-                    "processed_at": current_time
-                }}
+            # Insert new organization; run_stats is incremented once the insert succeeds
+            self.writes.add(
+                NEW_ORGANIZATIONS, InsertOne(new_org), key=url_doc['_id'],
+                stat=("update_run_stats", "new_added_organiztion"),
             )
             
-            self.logger.log(f"Thread-{self.thread_id}: Successfully saved new organization: {org_name}")
-            self.save_stats_count(1)
+            # Update raw URL status and give up the lease (skipped if the insert fails)
+            self.writes.add(NEW_RAW_URLS, self.url_leases.release_op(url_doc['_id'], {
+                "is_read": 1,
+                "status": "completed",
+                "processed_at": current_time
+            }), key=url_doc['_id'])
+            
+            self.logger.log(f"Thread-{self.thread_id}: Queued new organization: {org_name}")
             return True
             
         except Exception as e:
@@ -307,72 +400,64 @@ class NewScrapper:
             
             # Mark URL as failed
             try:
-                self.crunch_raw_urls.update_one(
-                    {"_id": url_doc['_id']},
-                    {"$set": {
-                        "status": "failed",
-                        "error": str(e),
-                        "failed_at": datetime.now(self.tz)
-                    }}
-                )
+                self.mark_failed(url_doc['_id'], error=str(e))
             except:
                 pass
             
             return False
     
+    def process_batch(self, batch_size, batch_num):
+        """Claim and scrape one batch; returns (claimed, successful) counts"""
+        self.logger.log(f"Thread-{self.thread_id}: Processing batch {batch_num}")
+        
+        # Get new URLs to scrape
+        url_docs = self.read_crunch_details_new(batch_size)
+        if not url_docs:
+            return 0, 0
+        
+        # Process each URL, keeping the whole batch leased
+        succeeded = set()
+        with self.lease_batch(url_docs) as leases:
+            for url_doc in url_docs:
+                org_url, org_name = self.scrape_target(url_doc)
+                
+                self.logger.log(f"Thread-{self.thread_id}: Processing NEW: {org_name}")
+                
+                scraped_data = self.scrape_organization(org_url, org_name)
+                if self.save_result(url_doc, org_name, scraped_data, leases):
+                    succeeded.add(url_doc['_id'])
+            
+            # Flush while the batch is still leased
+            self.writes.flush()
+            failed = self.writes.forget([url_doc['_id'] for url_doc in url_docs])
+        
+        # Only URLs that were saved can turn into failures here
+        success_count = len(succeeded - failed.keys())
+        self.logger.log(f"Thread-{self.thread_id}: Batch {batch_num} completed - {success_count}/{len(url_docs)} successful")
+        self.export_state()
+        return len(url_docs), success_count
+    
     def run(self, batch_size=None, max_batches=None):
+        """Main execution loop"""
         batch_size = batch_size or int(os.environ.get('SCRAPER_BATCH_SIZE_NEW', 10))
         max_batches = max_batches or int(os.environ.get('SCRAPER_MAX_BATCHES_NEW', 10))
-        """Main execution loop"""
-        if not self.login():
+        if not self.resume_session() and not self.login():
             self.logger.error(f"Thread-{self.thread_id}: Cannot start - login failed")
             return
         
         self.logger.log(f"Thread-{self.thread_id}: Starting NEW scraping")
-        for batch_num in range(max_batches):
+        for batch_num in range(1, max_batches + 1):
             try:
-                self.logger.log(f"Thread-{self.thread_id}: Processing batch {batch_num + 1}/{max_batches}")
-                
-                # Get new URLs to scrape
-                url_docs = self.read_crunch_details_new(batch_size)
-                
-                if not url_docs:
+                claimed, _ = self.process_batch(batch_size, batch_num)
+                if not claimed:
                     self.logger.log(f"Thread-{self.thread_id}: No more URLs to scrape")
+                    # Idle: nothing to fetch, so wait before the manager starts the next cycle
                     self.random_sleep(50, 100)
                     break
-                
-                # Process each URL
-                success_count = 0
-                for url_doc in url_docs:
-                    org_url = url_doc.get('url', '')
-                    org_name = self.extract_org_name_from_url(org_url)
-                    
-                    self.logger.log(f"Thread-{self.thread_id}: Processing NEW: {org_name}")
-                    
-                    scraped_data = self.scrape_organization(org_url, org_name)
-                    
-                    if scraped_data:
-                        if self.save_new_organization(url_doc, scraped_data):
-                            success_count += 1
-                    else:
-                        # Mark as failed
-                        self.crunch_raw_urls.update_one(
-                            {"_id": url_doc['_id']},
-                            {"$set": {
-                                "status": "failed",
-                                "failed_at": datetime.now(self.tz)
-                            }}
-                        )
-                    
-                    self.random_sleep(2, 5)
-                
-                self.logger.log(f"Thread-{self.thread_id}: Batch {batch_num + 1} completed - {success_count}/{len(url_docs)} successful")
-                
             except Exception as e:
-                self.logger.error(f"Thread-{self.thread_id}: Error in batch {batch_num + 1}: {e}")
+                self.logger.error(f"Thread-{self.thread_id}: Error in batch {batch_num}: {e}")
                 time.sleep(30)
                 
-        self.random_sleep(50, 100)
         self.logger.log(f"Thread-{self.thread_id}: NEW scraping completed")
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+"""
+Login check and a single shared parse for fetched Crunchbase pages.
+
+get_requests used to build a BeautifulSoup(html.parser) tree of every 200
+response just to look for the header's account button, and the page
+processors then parsed the same HTML again. The login check is now a byte
+search on the raw body, and Page parses the HTML at most once, with lxml,
+for every processor that reads it.
+
+benchmarks/bench_page_parse.py measures both paths.
+"""
+import lxml.html
+from bs4 import BeautifulSoup
+
+# The signed-in header's account menu: <button ... aria-label="Account">
+ACCOUNT_MARKERS = (b'aria-label="Account"', b"aria-label='Account'")
+
+
+def is_logged_in(content):
+    """True if the raw HTML has the account button of a signed-in session."""
+    for marker in ACCOUNT_MARKERS:
+        start = 0
+        while (at := content.find(marker, start)) != -1:
+            # Same element as the marker: the nearest '<' opens a <button
+            tag = content.rfind(b"<", 0, at)
+            if content.startswith(b"<button", tag) and content.find(b">", tag, at) == -1:
+                return True
+            start = at + len(marker)
+    return False
+
+
+class Page:
+    """A fetched response whose HTML is parsed at most once.
+
+    Stands in for the curl_cffi response (status_code, text, content, ...
+    are forwarded), so the processors take it unchanged. They should read
+    ``tree`` (lxml) or ``soup`` (BeautifulSoup on the same lxml parser,
+    for code written against bs4) rather than parse ``text`` again.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self._tree = None
+        self._soup = None
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = lxml.html.fromstring(self.response.content)
+        return self._tree
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.response.content, 'lxml')
+        return self._soup
@@ -0,0 +1,250 @@
+"""
+Proxy pool with health scoring and sticky account assignment.
+
+get_proxy() used to pick one of two hard-coded proxies at random and keep
+it for the life of the scraper, so a dead proxy burned every retry. Now
+each request's outcome is fed to the pool, which keeps an EWMA of latency
+and error rate per proxy. A proxy is ejected after EJECT_AFTER_FAILURES
+failures in a row, or when its error rate passes EJECT_ERROR_RATE. The
+ejection lasts EJECT_FOR, doubling on each repeat up to MAX_EJECT_FOR.
+Once it expires, the proxy has to pass a probe request before it is
+handed out again.
+
+Accounts keep their proxy while it is healthy (a logged-in session stays
+on one IP). Otherwise they get the healthy proxy with the fewest accounts
+assigned, then the best score. Assignments (ProxyAssignments) and health
+(ProxyHealth) live in MongoDB, so every scraper process shares them and
+the dashboard's control panel can show them.
+
+The proxy list comes from SCRAPER_PROXIES (set by main.py from the
+control panel's ScraperConfig), else from the file named by
+SCRAPER_PROXY_FILE, else DEFAULT_PROXIES.
+"""
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from queries import PROXY_ASSIGNMENTS, PROXY_HEALTH
+
+DEFAULT_PROXIES = [
+    "http://37.48.118.90:13082",
+    "http://83.149.70.159:13082",
+]
+
+# Weight of the newest sample in the latency / error-rate averages
+ALPHA = 0.2
+EJECT_ERROR_RATE = 0.5
+MIN_SAMPLES = 5
+EJECT_AFTER_FAILURES = 3
+EJECT_FOR = timedelta(minutes=5)
+MAX_EJECT_FOR = timedelta(hours=1)
+
+# Statuses that come from the proxy itself; anything else is the site's answer
+PROXY_ERROR_STATUSES = {407, 502, 503, 504}
+PROBE_URL = "https://www.crunchbase.com/robots.txt"
+PROBE_TIMEOUT = 10
+
+
+def normalize(proxy):
+    proxy = proxy.strip()
+    return proxy if "://" in proxy else f"http://{proxy}"
+
+
+def parse_proxies(text):
+    """Proxies from text, one per line or comma-separated; # starts a comment."""
+    proxies = []
+    for line in text.replace(",", "\n").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line and normalize(line) not in proxies:
+            proxies.append(normalize(line))
+    return proxies
+
+
+def load_proxies():
+    if os.environ.get("SCRAPER_PROXIES", "").strip():
+        return parse_proxies(os.environ["SCRAPER_PROXIES"])
+    path = os.environ.get("SCRAPER_PROXY_FILE")
+    if path and os.path.isfile(path):
+        with open(path) as f:
+            proxies = parse_proxies(f.read())
+        if proxies:
+            return proxies
+    return list(DEFAULT_PROXIES)
+
+
+def as_requests_proxies(proxy):
+    return {"http": proxy, "https": proxy}
+
+
+def probe_proxy(proxy):
+    """True if a small request through ``proxy`` gets an answer from the site."""
+    from curl_cffi import requests
+    response = requests.get(
+        PROBE_URL, proxies=as_requests_proxies(proxy), impersonate="chrome110", timeout=PROBE_TIMEOUT
+    )
+    return response.status_code not in PROXY_ERROR_STATUSES
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _aware(value):
+    # pymongo returns naive UTC datetimes unless the client is tz_aware
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+class ProxyStats:
+    def __init__(self):
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = None
+        self.last_error = None
+        # Not yet written to ProxyHealth
+        self.pending = Counter()
+
+    def score(self):
+        """Lower is better: latency, penalised by the error rate."""
+        return (self.latency_ms or 1000) * (1 + 4 * self.error_rate)
+
+
+class ProxyPool:
+    def __init__(self, db, proxies, logger=None, probe=probe_proxy):
+        self.health = db[PROXY_HEALTH]
+        self.assignments = db[PROXY_ASSIGNMENTS]
+        self.proxies = list(proxies)
+        self.logger = logger
+        self.probe = probe
+        self.stats = {proxy: ProxyStats() for proxy in self.proxies}
+        # The async engine reports from worker threads
+        self._lock = threading.Lock()
+
+    def _log(self, message, error=False):
+        if self.logger:
+            (self.logger.error if error else self.logger.log)(message)
+
+    # ── Shared state ──
+
+    def refresh(self):
+        """Pick up ejections, readmissions and averages written by other processes."""
+        for doc in self.health.find({"_id": {"$in": self.proxies}}):
+            stats = self.stats[doc["_id"]]
+            with self._lock:
+                ejected_until = _aware(doc.get("ejected_until"))
+                if ejected_until and (stats.ejected_until is None or ejected_until > stats.ejected_until):
+                    stats.ejected_until = ejected_until
+                stats.ejections = max(stats.ejections, doc.get("ejections", 0))
+                if not stats.samples:
+                    stats.latency_ms = doc.get("latency_ms")
+                    stats.error_rate = doc.get("error_rate", 0.0)
+
+    def _write(self, proxy, fields):
+        self.health.update_one({"_id": proxy}, {"$set": {**fields, "updated_at": utcnow()}}, upsert=True)
+
+    def sync(self):
+        """Write this process's averages and request counts to ProxyHealth."""
+        for proxy, stats in self.stats.items():
+            with self._lock:
+                if not stats.pending:
+                    continue
+                pending, stats.pending = stats.pending, Counter()
+                fields = {"latency_ms": stats.latency_ms, "error_rate": round(stats.error_rate, 4),
+                          "last_error": stats.last_error, "updated_at": utcnow()}
+            self.health.update_one({"_id": proxy}, {"$set": fields, "$inc": dict(pending)}, upsert=True)
+
+    # ── Health ──
+
+    def record(self, proxy, latency=None, ok=True, error=None):
+        """Feed back one request through ``proxy``; returns False once it is ejected."""
+        stats = self.stats.get(proxy)
+        if stats is None:
+            return True
+        with self._lock:
+            stats.samples += 1
+            stats.pending["requests"] += 1
+            stats.error_rate = (1 - ALPHA) * stats.error_rate + ALPHA * (0 if ok else 1)
+            if ok:
+                stats.failures = 0
+                if latency is not None:
+                    ms = latency * 1000
+                    stats.latency_ms = ms if stats.latency_ms is None else round((1 - ALPHA) * stats.latency_ms + ALPHA * ms, 1)
+                return True
+            stats.failures += 1
+            stats.pending["errors"] += 1
+            stats.last_error = str(error)[:200] if error else "proxy error"
+            eject = stats.failures >= EJECT_AFTER_FAILURES or (
+                stats.samples >= MIN_SAMPLES and stats.error_rate > EJECT_ERROR_RATE
+            )
+        if eject:
+            self._eject(proxy, stats.last_error)
+        return not eject
+
+    def _eject(self, proxy, reason):
+        stats = self.stats[proxy]
+        with self._lock:
+            stats.ejections += 1
+            period = min(MAX_EJECT_FOR, EJECT_FOR * 2 ** (stats.ejections - 1))
+            stats.ejected_until = utcnow() + period
+            stats.failures = 0
+        self._log(f"Proxy {proxy} ejected for {period} ({reason})", error=True)
+        self._write(proxy, {"ejected_until": stats.ejected_until, "ejections": stats.ejections, "last_error": reason})
+
+    def _readmit(self, proxy):
+        stats = self.stats[proxy]
+        with self._lock:
+            stats.ejected_until = None
+            stats.error_rate = 0.0
+            stats.failures = 0
+            stats.samples = 0
+        self._log(f"Proxy {proxy} passed its probe and is back in the pool")
+        self._write(proxy, {"ejected_until": None, "error_rate": 0.0, "last_probe_at": utcnow()})
+
+    def usable(self, proxy, now=None):
+        """Healthy, or ejected but past its ejection and passing a probe now."""
+        ejected_until = self.stats[proxy].ejected_until
+        if ejected_until is None:
+            return True
+        if ejected_until > (now or utcnow()):
+            return False
+        try:
+            ok = self.probe(proxy)
+        except Exception as e:
+            ok = False
+            self.stats[proxy].last_error = f"probe: {e}"[:200]
+        if ok:
+            self._readmit(proxy)
+        else:
+            self._eject(proxy, self.stats[proxy].last_error or "probe failed")
+        return ok
+
+    # ── Assignment ──
+
+    def assign(self, account, exclude=()):
+        """Sticky proxy for ``account``; a new one if its proxy is unusable or excluded."""
+        self.refresh()
+        current = self.assignments.find_one({"_id": account})
+        if current and current["proxy"] in self.stats and current["proxy"] not in exclude and self.usable(current["proxy"]):
+            return current["proxy"]
+
+        load = Counter({doc["_id"]: doc["accounts"] for doc in self.assignments.aggregate([
+            {"$match": {"_id": {"$ne": account}}},
+            {"$group": {"_id": "$proxy", "accounts": {"$sum": 1}}},
+        ])})
+        ranked = sorted(
+            (p for p in self.proxies if p not in exclude),
+            key=lambda p: (load[p], self.stats[p].score()),
+        )
+        chosen = next((p for p in ranked if self.usable(p)), None)
+        if chosen is None:
+            # Everything is ejected: take the one that comes back first rather than stall
+            chosen = min(self.proxies, key=lambda p: self.stats[p].ejected_until or utcnow())
+            self._log(f"No healthy proxy for {account}; using {chosen}", error=True)
+
+        self.assignments.update_one(
+            {"_id": account}, {"$set": {"proxy": chosen, "assigned_at": utcnow()}}, upsert=True
+        )
+        return chosen
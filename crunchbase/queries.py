@@ -0,0 +1,184 @@
+"""
+MongoDB filters the Crunchbase scrapers use to pick their work.
+
+The update queue refill (work_queue.py) and
+NewScrapper.read_crunch_details_new build their priority filters from here, and the dashboard's index advisor
+(`python manage.py advise_indexes`) explains the very same filters,
+wrapped in the lease condition the claims add (``claimable``), so keep
+this module free of scraper-only dependencies.
+"""
+from datetime import timedelta
+
+DB_NAME = 'STARTUPSCRAPERDATA'
+
+# UpdateScrapper
+UPDATE_ORGANIZATIONS = 'CorrectData'
+UPDATE_RAW_URLS = 'CrunchURLs'
+CORRUPT_ORGANIZATIONS = 'CorruptData'
+UPDATE_QUEUE = 'UpdateQueue'
+QUEUE_LOCKS = 'QueueLocks'
+
+# NewScrapper
+NEW_ORGANIZATIONS = 'OrganiztionDetails'
+NEW_RAW_URLS = 'CrunchURLS'
+
+# Both: request scheduler state per account/proxy (rate_scheduler.py)
+SCHEDULER_STATS = 'RateSchedulerStats'
+# Both: proxy health and account -> proxy assignments (proxy_pool.py)
+PROXY_HEALTH = 'ProxyHealth'
+PROXY_ASSIGNMENTS = 'ProxyAssignments'
+# Both: encrypted login cookies per account (session_cache.py)
+SESSION_CACHE = 'SessionCache'
+
+# Lease fields (leases.py), here so claims and the index advisor share one condition
+LEASE_OWNER_FIELD = "lease_owner"
+LEASE_EXPIRES_FIELD = "lease_expires_at"
+
+RECENT_FOUNDING_YEARS = "(2020|2021|2022|2023|2024|2025)"
+
+HAS_DESCRIPTION = {"$exists": True, "$nin": ["", None]}
+
+
+def unleased(now):
+    # Never leased, released, or expired
+    return {LEASE_EXPIRES_FIELD: {"$not": {"$gt": now}}}
+
+
+def claimable(filter, now):
+    """``filter`` limited to documents nobody holds a lease on: what Leases.claim matches."""
+    return {"$and": [filter, unleased(now)]}
+
+
+def base_filter(exclude_corrupted=True):
+    return {"corrupted_data": {"$ne": True}} if exclude_corrupted else {}
+
+
+def not_updated_since(cutoff):
+    return {"$or": [
+        {"updated_at": {"$lt": cutoff}},
+        {"updated_at": None},
+        {"updated_at": {"$exists": False}}
+    ]}
+
+
+def not_recently_queued(cutoff):
+    # Also matches organizations that were never queued
+    return {"update_queued_at": {"$not": {"$gte": cutoff}}}
+
+
+# ── UpdateScrapper ──────────────────────────────────────────────────────
+
+def update_priority_filters(now, exclude_corrupted=True):
+    """Organization filters, most urgent first (the update queue's priorities).
+
+    Returns a list of (label, filter). Flagged organizations (update_first
+    on the raw URL) come last and are handled by flagged_url_filter /
+    flagged_organization_filter.
+    """
+    base = base_filter(exclude_corrupted)
+    thirty_days_ago = now - timedelta(days=30)
+    seven_days_ago = now - timedelta(days=7)
+    return [
+        ("blank description", {
+            **base,
+            "$or": [
+                {"summary.details.description": ""},
+                {"summary.details.description": None},
+                {"summary.details.description": {"$exists": False}}
+            ]
+        }),
+        ("obfuscated funding total", {
+            **base,
+            "financial.funding_round.total_funding_amount": "obfuscated obfuscation",
+        }),
+        ("recently founded (founded_at), stale", {
+            **base,
+            "summary.about.founded_at": {"$regex": RECENT_FOUNDING_YEARS},
+            **not_updated_since(thirty_days_ago),
+        }),
+        ("recently founded (founded_date), stale", {
+            **base,
+            "summary.details.founded_date": {"$regex": RECENT_FOUNDING_YEARS},
+            **not_updated_since(thirty_days_ago),
+        }),
+        ("stale financials", {
+            **base,
+            "financial": {"$exists": True, "$nin": [{}, None]},
+            "summary.details.description": HAS_DESCRIPTION,
+            **not_updated_since(seven_days_ago),
+        }),
+        ("obfuscated fields", {
+            **base,
+            "summary.details.description": HAS_DESCRIPTION,
+            "$or": [
+                {"summary.about.founded_at": {"$regex": "obfuscate", "$options": "i"}},
+                {"financial.funding_round.table.1.money_raised": {"$regex": "obfuscate", "$options": "i"}}
+            ]
+        }),
+    ]
+
+
+FLAGGED_URL_FILTER = {"update_first": 1}
+
+
+def flagged_organization_filter(org_urls, now, exclude_corrupted=True):
+    return {
+        **base_filter(exclude_corrupted),
+        "organization_url": {"$in": org_urls},
+        "summary.details.description": HAS_DESCRIPTION,
+        **not_updated_since(now - timedelta(days=30)),
+    }
+
+
+# ── NewScrapper ─────────────────────────────────────────────────────────
+
+def existing_organization_urls(urls):
+    """Organizations already saved for any of ``urls`` (a batch of claimed raw URLs)."""
+    return {"organization_url": {"$in": list(urls)}}
+
+
+def new_url_priority_filters(now):
+    """Raw-URL filters in the order read_crunch_details_new samples them."""
+    one_month_ago = now - timedelta(days=30)
+    unread_or_pending = {"$or": [{"is_read": 0}, {"status": "pending"}]}
+    return [
+        ("pending", {"status": "pending"}),
+        ("old pending/unread", {
+            "$and": [
+                unread_or_pending,
+                {"$or": [
+                    {"created_at": {"$lt": one_month_ago}},
+                    {"created_at": {"$exists": False}}
+                ]}
+            ]
+        }),
+        ("any pending/unread", unread_or_pending),
+    ]
+
+
+def advisor_queries(now):
+    """Every selection query both scrapers run, for the index advisor.
+
+    Returns dicts with scraper, label, collection, filter and sort.
+    """
+    queries = [
+        {"scraper": "update", "label": label, "collection": UPDATE_ORGANIZATIONS, "filter": f, "sort": None}
+        for label, f in update_priority_filters(now)
+    ]
+    queries += [
+        {"scraper": "update", "label": "claim next queued organization", "collection": UPDATE_QUEUE,
+         "filter": claimable({}, now), "sort": [("priority", 1), ("enqueued_at", 1)]},
+        {"scraper": "update", "label": "flagged raw URLs", "collection": UPDATE_RAW_URLS,
+         "filter": FLAGGED_URL_FILTER, "sort": None},
+        {"scraper": "update", "label": "flagged organizations", "collection": UPDATE_ORGANIZATIONS,
+         "filter": flagged_organization_filter(["https://www.crunchbase.com/organization/example"], now),
+         "sort": None},
+        {"scraper": "new", "label": "existing organization URLs", "collection": NEW_ORGANIZATIONS,
+         "filter": existing_organization_urls(["https://www.crunchbase.com/organization/example"]),
+         "sort": None},
+    ]
+    queries += [
+        {"scraper": "new", "label": label, "collection": NEW_RAW_URLS, "filter": claimable(f, now), "sort": None}
+        for label, f in new_url_priority_filters(now)
+    ]
+    return queries
@@ -0,0 +1,153 @@
+"""
+Adaptive request budget per account.
+
+The scrapers used to sleep a fixed random 3-7 s before every page, 2-5 s
+between organizations and 5-10 s after every failure, whatever the
+server was doing. A RateScheduler instead hands out request slots from a
+token budget whose rate follows the responses (AIMD):
+
+- 429, 403, timeouts and transport errors cut the rate by DECREASE and
+  pause the scheduler for BASE_BACKOFF * 2**(failures-1) seconds (capped
+  at MAX_BACKOFF, or longer if the server sent Retry-After);
+- other 5xx responses pause the same way but leave the rate alone;
+- every INCREASE_AFTER healthy responses in a row raise the rate by
+  INCREASE, up to MAX_RATE.
+
+So throughput settles just under what the server tolerates for that
+account. A scraper keeps one scheduler for its lifetime: Crunchbase
+throttles the account, so moving to another proxy keeps the rate and any
+pause. ``state()`` reports the current and achieved requests per
+minute; the scrapers export it to the RateSchedulerStats collection after
+every batch.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+# Requests per minute
+START_RATE = 12
+MIN_RATE = 2
+MAX_RATE = 40
+BURST = 2
+# Multiplicative decrease on throttling, additive increase when healthy
+DECREASE = 0.5
+INCREASE = 1
+INCREASE_AFTER = 20
+# Exponential pause after consecutive failures, in seconds
+BASE_BACKOFF = 5
+MAX_BACKOFF = 600
+# Random extra delay, as a fraction of the request interval
+JITTER = 0.3
+
+THROTTLE_STATUSES = {403, 429}
+
+
+class RateScheduler:
+    def __init__(self, key, rate=START_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=BURST,
+                 clock=time.monotonic):
+        self.key = key
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.backoff_until = 0
+        self.failures = 0
+        self.healthy_streak = 0
+        self.counts = Counter()
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Tokens are counted as of self.updated, which a pause moves into the future
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate / 60)
+            self.updated = now
+
+    def reserve(self):
+        """Take the next request slot; returns the seconds to wait before using it."""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            self.tokens -= 1
+            interval = 60 / self.rate
+            # Negative tokens are slots already promised to earlier callers
+            wait = max(0, self.updated - now) + max(0, -self.tokens) * interval
+            wait += random.uniform(0, JITTER * interval)
+            self._sent.append(now + wait)
+            return wait
+
+    def wait(self):
+        time.sleep(self.reserve())
+
+    async def acquire(self):
+        await asyncio.sleep(self.reserve())
+
+    def record(self, status=None, error=None, retry_after=None):
+        """Feed back one outcome: an HTTP ``status`` or a transport ``error``."""
+        with self._lock:
+            now = self.clock()
+            if error is not None or status in THROTTLE_STATUSES:
+                self.counts["throttled" if status in THROTTLE_STATUSES else "errors"] += 1
+                self.rate = max(self.min_rate, self.rate * DECREASE)
+                self._pause(now, retry_after)
+            elif status is not None and status >= 500:
+                self.counts["errors"] += 1
+                self._pause(now, retry_after)
+            else:
+                self.counts["ok"] += 1
+                self.failures = 0
+                self.healthy_streak += 1
+                if self.healthy_streak >= INCREASE_AFTER:
+                    self.rate = min(self.max_rate, self.rate + INCREASE)
+                    self.healthy_streak = 0
+
+    def _pause(self, now, retry_after):
+        self.failures += 1
+        self.healthy_streak = 0
+        pause = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (self.failures - 1))
+        if retry_after:
+            pause = max(pause, float(retry_after))
+        self.backoff_until = max(self.backoff_until, now + pause)
+        # Nothing is sent before the pause ends, then one request per interval
+        self._refill(now)
+        self.tokens = min(self.tokens, 1)
+        self.updated = max(self.updated, self.backoff_until)
+
+    def state(self):
+        with self._lock:
+            now = self.clock()
+            while self._sent and self._sent[0] < now - 60:
+                self._sent.popleft()
+            return {
+                "key": self.key,
+                "rate_per_min": round(self.rate, 2),
+                "achieved_per_min": sum(1 for t in self._sent if t <= now),
+                "backoff_seconds": round(max(0, self.backoff_until - now), 1),
+                "consecutive_failures": self.failures,
+                "ok": self.counts["ok"],
+                "throttled": self.counts["throttled"],
+                "errors": self.counts["errors"],
+            }
+
+    def export(self, collection):
+        """Upsert ``state()`` into ``collection`` (one document per key)."""
+        collection.update_one(
+            {"_id": self.key},
+            {"$set": {**self.state(), "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+
+def retry_after_seconds(response):
+    """The Retry-After header in seconds, if it is given as a number."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,138 @@
+"""
+Encrypted cache of logged-in Crunchbase sessions, shared by every scraper.
+
+Every scraper process used to log in at startup, and ThreadManager starts
+fresh processes every cycle, so each account signed in over and over. That
+is slow, and repeated sign-ins are what gets accounts locked. After a
+successful login the session cookies are now saved per account (keyed by
+email) in the SessionCache collection, Fernet-encrypted. The next process
+for that account resumes with them instead of logging in, whether it is
+the update or the new scraper, sync or async engine. A new login happens
+only when a fetch shows the cached session was rejected (the login check
+in get_requests), and that login saves the fresh cookies.
+
+Cookies past their own expiry are dropped when an entry is read and when
+it is loaded into a session. An entry is a miss once its login cookies
+(AUTH_COOKIES) have all expired, or once nothing is left; entries older
+than MAX_AGE expire (a TTL index removes them). The key is SCRAPER_SESSION_KEY (a Fernet key), else
+the one in SCRAPER_SESSION_KEY_FILE, generated on first use. Entries that
+do not decrypt with it (written with another key, or tampered with) count
+as misses.
+"""
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from queries import SESSION_CACHE
+
+MAX_AGE = timedelta(hours=12)
+# The cookies that carry the login itself; without them the rest are useless
+AUTH_COOKIES = {"authcookie"}
+KEY_FILE = os.environ.get(
+    'SCRAPER_SESSION_KEY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.session_key')
+)
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def load_key(path=KEY_FILE):
+    """SCRAPER_SESSION_KEY, else the key in ``path``, created (mode 600) if missing."""
+    if os.environ.get('SCRAPER_SESSION_KEY'):
+        return os.environ['SCRAPER_SESSION_KEY'].encode()
+    if not os.path.exists(path):
+        # Write aside, then link into place: concurrent first starts agree on one key
+        tmp = f"{path}.{os.getpid()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(Fernet.generate_key())
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp)
+    with open(path, 'rb') as f:
+        return f.read().strip()
+
+
+def export_cookies(cookies):
+    """A curl_cffi Cookies jar as plain dicts."""
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+         "secure": bool(c.secure), "expires": c.expires}
+        for c in cookies.jar
+    ]
+
+
+def unexpired(entry, now):
+    return not entry["expires"] or entry["expires"] > now.timestamp()
+
+
+def import_cookies(cookies, entries, now=None):
+    """Load ``export_cookies`` output into a (new) session's Cookies jar, skipping expired cookies."""
+    now = now or utcnow()
+    for entry in entries:
+        if not unexpired(entry, now):
+            continue
+        # __Host- cookies must not carry a domain
+        domain = "" if entry["name"].startswith("__Host-") else entry["domain"]
+        cookies.set(entry["name"], entry["value"], domain=domain, path=entry["path"], secure=entry["secure"])
+        if entry["expires"]:
+            # Cookies.set takes no expiry; restore it so the jar drops the cookie on time
+            for cookie in cookies.jar:
+                if (cookie.name, cookie.domain, cookie.path) == (entry["name"], domain, entry["path"]):
+                    cookie.expires, cookie.discard = int(entry["expires"]), False
+
+
+class SessionCache:
+    def __init__(self, db, key=None, logger=None):
+        self.collection = db[SESSION_CACHE]
+        self.fernet = Fernet(key or load_key())
+        self.logger = logger
+
+    def ensure_index(self):
+        self.collection.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+
+    def load(self, email, now=None):
+        """The unexpired cached cookies for ``email``, or None if there are none or they are unreadable."""
+        now = now or utcnow()
+        doc = self.collection.find_one({"_id": email})
+        if not doc:
+            return None
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            # pymongo returns naive UTC datetimes unless the client is tz_aware
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at <= now:
+            return None
+        try:
+            entries = json.loads(self.fernet.decrypt(doc["token"].encode(), ttl=int(MAX_AGE.total_seconds())))
+        except InvalidToken:
+            if self.logger:
+                self.logger.error(f"Cached session for {email} cannot be decrypted with this key; ignoring it")
+            return None
+        live = [entry for entry in entries if unexpired(entry, now)]
+        auth = [entry for entry in entries if entry["name"] in AUTH_COOKIES]
+        if auth and not any(unexpired(entry, now) for entry in auth):
+            if self.logger:
+                self.logger.log(f"Cached session for {email} has expired; logging in again")
+            return None
+        return live or None
+
+    def save(self, email, cookies, now=None):
+        """Cache the cookies of a freshly logged-in session."""
+        now = now or utcnow()
+        entries = export_cookies(cookies)
+        self.collection.update_one(
+            {"_id": email},
+            {"$set": {
+                "token": self.fernet.encrypt(json.dumps(entries).encode()).decode(),
+                "saved_at": now,
+                "expires_at": now + MAX_AGE,
+            }},
+            upsert=True,
+        )
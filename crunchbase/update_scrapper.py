@@ -1,17 +1,23 @@
-from bs4 import BeautifulSoup
 from curl_cffi import requests
 import json
 import time
-import random
 import sys
 from datetime import datetime, timedelta
-from pymongo import MongoClient, UpdateOne
+from pymongo import InsertOne, MongoClient, UpdateOne
 from pymongo.errors import BulkWriteError, ConnectionFailure
 from logger import CustomLogger
 from summery import SUMMARY
 from news import NEWS
 from finance import FINANCIAL
 from tech import TECH
+from queries import DB_NAME, UPDATE_ORGANIZATIONS, UPDATE_RAW_URLS, CORRUPT_ORGANIZATIONS, UPDATE_QUEUE, SCHEDULER_STATS
+from work_queue import UpdateQueue
+from pages import Page, is_logged_in
+from leases import make_owner
+from write_buffer import WriteBuffer
+from rate_scheduler import RateScheduler, retry_after_seconds
+from proxy_pool import PROXY_ERROR_STATUSES, ProxyPool, as_requests_proxies, load_proxies
+from session_cache import SessionCache, import_cookies
 import pytz
 import os
 
@@ -32,7 +38,7 @@ def save_run_stats(inserted_count):
         json.dump(config, f, ensure_ascii=False, indent=4)
         
 class UpdateScrapper:
-    def __init__(self, email, password, thread_id):
+    def __init__(self, email, password, thread_id, client=None):
         self.email = email
         self.password = password
         self.thread_id = thread_id
@@ -42,52 +48,63 @@ class UpdateScrapper:
         
         # MongoDB setup
         try:
-            self.client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=50000)
+            # The async engine shares one client between all accounts
+            self.client = client or MongoClient(MONGO_URI, serverSelectionTimeoutMS=50000)
             self.client.admin.command('ping')
             self.logger.log(f"Thread-{self.thread_id}: MongoDB connection established")
         except ConnectionFailure as e:
             self.logger.error(f"Thread-{self.thread_id}: MongoDB connection failed: {e}")
             raise
         
-        self.db = self.client['STARTUPSCRAPERDATA']
-        self.crunch_organization_details = self.db['CorrectData']
+        self.db = self.client[DB_NAME]
+        self.crunch_organization_details = self.db[UPDATE_ORGANIZATIONS]
         # self.crunch_organization_details = self.db['OrganiztionDetails']
         # self.CorrectData = self.db['CorrectData']
-        self.corrupt_data = self.db['CorruptData']
-        self.crunch_raw_urls = self.db['CrunchURLs']
+        self.corrupt_data = self.db[CORRUPT_ORGANIZATIONS]
+        self.crunch_raw_urls = self.db[UPDATE_RAW_URLS]
+        
+        # Shared work queue; the owner id is unique across hosts and threads
+        self.owner = make_owner("update", thread_id)
+        self.update_queue = UpdateQueue(self.db, self.owner, self.logger)
+        self.update_queue.ensure_indexes()
+        
+        # Results are written in bulk (see write_buffer.py)
+        self.writes = WriteBuffer(self.db, on_error=self.on_write_error, logger=self.logger)
         
         # Session setup
         self.session = None
+        # Logged-in cookies survive restarts (see session_cache.py)
+        self.sessions = SessionCache(self.db, logger=self.logger)
+        self.sessions.ensure_index()
+        # Health-scored proxies shared by every scraper (see proxy_pool.py)
+        self.proxy_pool = ProxyPool(self.db, load_proxies(), logger=self.logger)
+        # Paces every request to Crunchbase for this account; kept across proxy switches
+        self.rate = RateScheduler(self.email)
         self.proxy = self.get_proxy()
+        self.rate_stats = self.db[SCHEDULER_STATS]
         self.tz = pytz.timezone('UTC')
     
-    def save_stats_count(self, count):
-        """Save run statistics to the MongoDB collection"""    
-        try:
-            stats_collection = self.db['run_stats']
-            stats_collection.update_one(
-                {"_id": "update_run_stats"},
-                {"$inc": {"updated_count": count}}
-            )
-        except Exception as e:
-            self.logger.error(f"Thread-{self.thread_id}: Failed to save stats: {e}")
-
-    def get_proxy(self):
-        """Get random proxy"""
-        plist = [
-            "37.48.118.90:13082",
-            "83.149.70.159:13082"
-        ]
-        prx = random.choice(plist)
-        return {
-            'http': 'http://' + prx,
-            'https': 'http://' + prx
-        }
+    def get_proxy(self, exclude=()):
+        """This account's proxy from the pool; it stays the same while it is healthy"""
+        self.proxy_url = self.proxy_pool.assign(self.email, exclude)
+        return as_requests_proxies(self.proxy_url)
+    
+    def report_proxy(self, started, status=None, error=None):
+        """Feed a request's outcome to the proxy pool; False once the proxy is ejected"""
+        ok = error is None and status not in PROXY_ERROR_STATUSES
+        return self.proxy_pool.record(self.proxy_url, time.monotonic() - started, ok, error)
+    
+    def switch_proxy(self):
+        """Move this account off an ejected proxy; the session must log in again"""
+        old_proxy = self.proxy_url
+        self.proxy = self.get_proxy(exclude={old_proxy})
+        self.logger.error(f"Thread-{self.thread_id}: Proxy {old_proxy} ejected, switched to {self.proxy_url}")
     
     def login(self):
         """Login to Crunchbase"""
         for _ in range(10):
-            self.random_sleep(5,10)
+            self.rate.wait()
+            started = time.monotonic()
             try:
                 self.session = requests.Session()
                 login_response = self.session.post(
@@ -100,328 +117,126 @@ class UpdateScrapper:
                     proxies=self.proxy,
                     timeout=30
                 )
+                self.rate.record(login_response.status_code, retry_after=retry_after_seconds(login_response))
+                if not self.report_proxy(started, login_response.status_code):
+                    self.switch_proxy()
+                    continue
                 
                 if login_response.status_code == 201:
                     self.logger.log(f"Thread-{self.thread_id}: Login successful for {self.email}")
+                    self.save_session_cookies(self.session.cookies)
                     return True
                 else:
                     self.logger.error(f"Thread-{self.thread_id}: Login failed with status {login_response.status_code}")
                     # return False
                     
             except Exception as e:
+                self.rate.record(error=e)
                 self.logger.error(f"Thread-{self.thread_id}: Login error: {e}")
+                if not self.report_proxy(started, error=e):
+                    self.switch_proxy()
         return False
     
-    def random_sleep(self, a=3, b=7):
-        """Sleep for random duration"""
-        random_int = random.randint(a, b)
-        self.logger.log(f"Thread-{self.thread_id}: Sleeping for {random_int} seconds")
-        time.sleep(random_int)
+    def cached_session_cookies(self):
+        """This account's cached login cookies, or None if it has to log in"""
+        try:
+            return self.sessions.load(self.email)
+        except Exception as e:
+            self.logger.error(f"Thread-{self.thread_id}: Session cache unavailable: {e}")
+            return None
+    
+    def save_session_cookies(self, cookies):
+        try:
+            self.sessions.save(self.email, cookies)
+        except Exception as e:
+            self.logger.error(f"Thread-{self.thread_id}: Failed to cache session: {e}")
+    
+    def resume_session(self):
+        """Start from the cached login; a rejected session is caught by get_requests"""
+        cookies = self.cached_session_cookies()
+        if not cookies:
+            return False
+        self.session = requests.Session()
+        import_cookies(self.session.cookies, cookies)
+        self.logger.log(f"Thread-{self.thread_id}: Resumed cached session for {self.email}")
+        return True
     
     def read_crunch_details(self, batch_size=1, exclude_corrupted=True):
+        """Claim the next ``batch_size`` organizations from the update queue"""
         if batch_size <= 0:
             return []
         
         try:
             current_time = datetime.now(self.tz)
-            thirty_days_ago = current_time - timedelta(days=30)
-            seven_days_ago = current_time - timedelta(days=7)
-            
-            organizations = []
-            bulk_operations = []
-            
-            # Base exclusion filter
-            base_filter = {}
-            if exclude_corrupted:
-                base_filter["corrupted_data"] = {"$ne": True}
-                
-                
-            # condition = {"organization_url" : "https://www.crunchbase.com/organization/loreal"}
-            # pipeline = [
-            #         {"$match": condition},
-            #         {"$sample": {"size": batch_size - len(organizations)}}
-            #     ]
-            # organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-            # return organizations
-            
-            # PRIORITY 1: Blank descriptions
-            if len(organizations) < batch_size:
-                condition = {
-                    **base_filter,
-                    "$or": [
-                        {"summary.details.description": ""},
-                        {"summary.details.description": None},
-                        {"summary.details.description": {"$exists": False}}
-                    ]
-                }
-                pipeline = [
-                    {"$match": condition},
-                    {"$sample": {"size": batch_size - len(organizations)}}
-                ]
-                organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-                self.logger.log(f"Thread-{self.thread_id}: Found {len(organizations)} organizations with blank descriptions---------1")
-
-            # if len(organizations) < batch_size:
-            #     condition = {
-            #         **base_filter,
-            #         "summary.about.founded_at": {
-            #                     "$in": [
-            #                         "Founded 2020",
-            #                         "Founded 2021", 
-            #                         "Founded 2022",
-            #                         "Founded 2023",
-            #                         "Founded 2024",
-            #                         "Founded 2025"
-            #                     ]
-            #                 },
-            #         "$or": [
-            #             {"updated_at": {"$lt": thirty_days_ago}},
-            #             {"updated_at": None},
-            #             {"updated_at": {"$exists": False}}
-            #         ]
-            #     }
-            #     pipeline = [
-            #         {"$match": condition},
-            #         {"$sample": {"size": batch_size - len(organizations)}}
-            #     ]
-            #     organizations = []
-            #     organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-            #     [ i['summary']['about']['founded_at'] for i in organizations]
-            #     print(f"Thread-{self.thread_id}: Found {len(organizations)} organizations with blank descriptions",'---------2')
-                
-            
-            if len(organizations) < batch_size:
-                condition = {
-                    **base_filter,
-                    "financial.funding_round.total_funding_amount":"obfuscated obfuscation",
-                }
-                pipeline = [
-                    {"$match": condition},
-                    {"$sample": {"size": batch_size - len(organizations)}}
-                ]
-                organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-                self.logger.log(f"Thread-{self.thread_id}: Found {len(organizations)} organizations with founded_at ---------3")
-                
-                
-            if len(organizations) < batch_size:
-                condition = {
-                    **base_filter,
-                    "summary.about.founded_at": {
-                                "$regex": "(2020|2021|2022|2023|2024|2025)" 
-                            },
-                    "$or": [
-                        {"updated_at": {"$lt": thirty_days_ago}},
-                        {"updated_at": None},
-                        {"updated_at": {"$exists": False}}
-                    ]
-                }
-                pipeline = [
-                    {"$match": condition},
-                    {"$sample": {"size": batch_size - len(organizations)}}
-                ]
-                organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-                self.logger.log(f"Thread-{self.thread_id}: Found {len(organizations)} organizations with founded_at ---------3")
-                
-            
-            if len(organizations) < batch_size:
-                condition = {
-                    **base_filter,
-                    "summary.details.founded_date": {
-                                "$regex": "(2020|2021|2022|2023|2024|2025)" 
-                            },
-                    "$or": [
-                        {"updated_at": {"$lt": thirty_days_ago}},
-                        {"updated_at": None},
-                        {"updated_at": {"$exists": False}}
-                    ]
-                }
-                pipeline = [
-                    {"$match": condition},
-                    {"$sample": {"size": batch_size - len(organizations)}}
-                ]
-                organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-                self.logger.log(f"Thread-{self.thread_id}: Found {len(organizations)} organizations with founded_date---------4")
-            
-            
-            
-            # # PRIORITY : update data which have been founded after 2020
-            # if len(organizations) < batch_size:
-            #     condition = {
-            #         **base_filter,
-            #         "$or" : [
-            #             {
-            #                 "summary.about.founded_at": {
-            #                     "$in": [
-            #                     "Founded 2020",
-            #                     "Founded 2021", 
-            #                     "Founded 2022",
-            #                     "Founded 2023",
-            #                     "Founded 2024",
-            #                     "Founded 2025"
-            #                     ]
-            #                 }
-            #             },
-            #             {
-            #                 "summary.about.founded_at": { 
-            #                     "$regex": "(2020|2021|2022|2023|2024|2025)" 
-            #                     }
-            #                 },
-            #             {
-            #                 "summary.details.founded_date": { 
-            #                     "$regex": "(2020|2021|2022|2023|2024|2025)" 
-            #                     }
-            #                 }
-            #         ],
-            #         "$or": [
-            #             {"updated_at": {"$lt": thirty_days_ago}},
-            #             {"updated_at": None},
-            #             {"updated_at": {"$exists": False}}
-            #         ]
-            #     }
-            #     pipeline = [
-            #         {"$match": condition},
-            #         {"$sample": {"size": batch_size - len(organizations)}}
-            #     ]
-            #     organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-
-            # PRIORITY 2: Stale financial data
-            if len(organizations) < batch_size:
-                condition = {
-                    **base_filter,
-                    "financial": {"$exists": True, "$nin": [{}, None]},
-                    "summary.details.description": {"$exists": True, "$ne": "", "$ne": None},
-                    # "updated_at": {"$lt": thirty_days_ago},
-                    "$or": [
-                        {"updated_at": {"$lt": seven_days_ago}},
-                        {"updated_at": None},
-                        {"updated_at": {"$exists": False}}
-                    ]
-                }
-                pipeline = [
-                    {"$match": condition},
-                    {"$sample": {"size": batch_size - len(organizations)}}
-                ]
-                organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-            
-            # PRIORITY 3: Obfuscated fields
-            if len(organizations) < batch_size:
-                condition = {
-                    **base_filter,
-                    "summary.details.description": {"$exists": True, "$ne": "", "$ne": None},
-                    "$or": [
-                        {"summary.about.founded_at": {"$regex": "obfuscate", "$options": "i"}},
-                        {"financial.funding_round.table.1.money_raised": {"$regex": "obfuscate", "$options": "i"}}
-                    ]
-                }
-                pipeline = [
-                    {"$match": condition},
-                    {"$sample": {"size": batch_size - len(organizations)}}
-                ]
-                organizations.extend(list(self.crunch_organization_details.aggregate(pipeline)))
-            
-            # PRIORITY 4: Flagged for update
-            if len(organizations) < batch_size:
-                for _ in range(3):
-                    if len(organizations) >= batch_size:
-                        break
-                    
-                    remaining = batch_size - len(organizations)
-                    url_pipeline = [
-                        {"$match": {"update_first": 1}},
-                        {"$sample": {"size": remaining}}
-                    ]
-                    flagged_urls = list(self.crunch_raw_urls.aggregate(url_pipeline))
-                    
-                    if not flagged_urls:
-                        break
-                    
-                    org_urls = [url_doc["url"] for url_doc in flagged_urls]
-                    org_condition = {
-                        **base_filter,
-                        "organization_url": {"$in": org_urls},
-                        "summary.details.description": {"$exists": True, "$ne": "", "$ne": None},
-                        "$or": [
-                            {"updated_at": {"$lt": thirty_days_ago}},
-                            {"updated_at": None},
-                            {"updated_at": {"$exists": False}},
-                        ]
-                    }
-                    
-                    flagged_orgs = list(self.crunch_organization_details.find(org_condition))
-                    organizations.extend(flagged_orgs)
-                    
-                    bulk_operations.extend([
-                        UpdateOne(
-                            {"_id": url_doc["_id"]},
-                            {"$set": {"update_first": 0, "processed_at": current_time}}
-                        )
-                        for url_doc in flagged_urls
-                    ])
-
-            
-            # Remove duplicates
-            seen_ids = set()
-            unique_orgs = []
-            for org in organizations:
-                org_id = org.get("_id")
-                if org_id and org_id not in seen_ids:
-                    seen_ids.add(org_id)
-                    unique_orgs.append(org)
+            org_ids = self.update_queue.claim(batch_size, current_time, exclude_corrupted)
+            if not org_ids:
+                return []
             
-            organizations = unique_orgs[:batch_size]
-            
-            # Mark as queued
-            if organizations:
-                bulk_operations.extend([
-                    UpdateOne(
-                        {"_id": org["_id"]},
-                        {"$set": {"is_updated": 0, "update_queued_at": current_time}}
-                    )
-                    for org in organizations
-                ])
-                
-                if bulk_operations:
-                    try:
-                        self.crunch_organization_details.bulk_write(bulk_operations, ordered=False)
-                        self.logger.log(f"Thread-{self.thread_id}: Queued {len(organizations)} organizations")
-                    except BulkWriteError as e:
-                        self.logger.error(f"Thread-{self.thread_id}: Bulk write error: {e.details}")
-                    except Exception as e:
-                        self.logger.error(f"Thread-{self.thread_id}: Error in bulk write: {e}")
+            # Keep the queue's priority order
+            by_id = {org["_id"]: org for org in self.crunch_organization_details.find({"_id": {"$in": org_ids}})}
+            organizations = [by_id[org_id] for org_id in org_ids if org_id in by_id]
+            for org_id in org_ids:
+                if org_id not in by_id:
+                    # Deleted since it was queued
+                    self.update_queue.complete(org_id)
             
+            self.logger.log(f"Thread-{self.thread_id}: Claimed {len(organizations)} organizations")
             return organizations
             
         except Exception as e:
             self.logger.error(f"Thread-{self.thread_id}: Error reading organizations: {e}")
             return []
         
+    def export_state(self):
+        """Publish the request scheduler's state (achieved requests/minute, backoff) and proxy health"""
+        state = self.rate.state()
+        self.logger.log(
+            f"Thread-{self.thread_id}: Request rate {state['achieved_per_min']}/min "
+            f"(limit {state['rate_per_min']}/min, {state['throttled']} throttled, {state['errors']} errors)"
+        )
+        try:
+            self.rate.export(self.rate_stats)
+            self.proxy_pool.sync()
+        except Exception as e:
+            self.logger.error(f"Thread-{self.thread_id}: Failed to export rate/proxy state: {e}")
+    
     def get_requests(self, url):
         """Get request with retries"""
         for _ in range(10):
+            self.rate.wait()
+            started = time.monotonic()
             try:
                 response = self.session.get(url, impersonate="chrome110", proxies=self.proxy, timeout=30)
+                self.rate.record(response.status_code, retry_after=retry_after_seconds(response))
+                if not self.report_proxy(started, response.status_code):
+                    self.switch_proxy()
+                    self.login()
+                    continue
                 if response.status_code == 200:
-                    data = BeautifulSoup(response.text, 'html.parser')
-                    if not data.find('button',{"aria-label":"Account"}):
+                    if not is_logged_in(response.content):
                         self.logger.error(f"Thread-{self.thread_id}: Session may have expired while fetching {url}")
                         self.login()
                         continue
                     
-                    return response
+                    # Parsed once, on first use, for all processors
+                    return Page(response)
                 elif response.status_code == 404:
                     return response
                 else:
                     self.logger.error(f"Thread-{self.thread_id}: Failed to fetch {url} with status {response.status_code}")
             except Exception as e:
+                # Timeouts and connection errors slow the scheduler down too
+                self.rate.record(error=e)
                 self.logger.error(f"Thread-{self.thread_id}: Error fetching {url}: {e}")
-            self.random_sleep(5,10)
+                if not self.report_proxy(started, error=e):
+                    self.switch_proxy()
+                    self.login()
         return False
     
     def scrape_organization(self, org_url, org_name):
         """Scrape all data for an organization"""
         try:
             data = {}
-            self.random_sleep()
             self.logger.log(f"Thread-{self.thread_id}: Fetching summary for {org_name}")
             summary_response = self.get_requests(f"{org_url}")
             if not summary_response :
@@ -440,7 +255,6 @@ class UpdateScrapper:
             data.update(summary_data)
             # Scrape financial details
             if financial_url :
-                self.random_sleep()
                 self.logger.log(f"Thread-{self.thread_id}: Fetching financial details for {org_name}")
                 finance_response = self.get_requests(f"{org_url}/financial_details")
                 if not finance_response :
@@ -456,7 +270,6 @@ class UpdateScrapper:
             
             # Scrape news
             if signals_and_news_url:
-                self.random_sleep()
                 self.logger.log(f"Thread-{self.thread_id}: Fetching news for {org_name}")
                 news_response = self.get_requests(f"{org_url}/news_and_analysis")
                 if not news_response :
@@ -472,7 +285,6 @@ class UpdateScrapper:
             
             # Scrape techs
             if signals_and_news_url:
-                self.random_sleep()
                 self.logger.log(f"Thread-{self.thread_id}: Fetching tech details for {org_name}")
                 tech_response = self.get_requests(f"{org_url}/tech_details")
                 if not tech_response :
@@ -492,18 +304,22 @@ class UpdateScrapper:
             return None
     
     def update_organization(self, org_id, scraped_data, is_corrupt = False):
-        """Update organization in database, handling corrupt data separately"""
+        """Queue the organization update, handling corrupt data separately"""
         try:
             current_time = datetime.now(self.tz)
             
             if is_corrupt:
                 # Handle corrupted data
                 corrupt_data = {**scraped_data,"corrupted_data": True,"detected_at": current_time,"original_collection": "crunch_organization_details"}
-                if not self.corrupt_data.find_one({"organization_url": scraped_data.get("organization_url")}):
-                    self.corrupt_data.insert_one(corrupt_data)
-                    self.crunch_organization_details.insert_one(corrupt_data)
+                organization_url = scraped_data.get("organization_url")
+                if not self.corrupt_data.find_one({"organization_url": organization_url}):
+                    self.writes.add(CORRUPT_ORGANIZATIONS, InsertOne(corrupt_data), key=org_id)
+                    self.writes.add(UPDATE_ORGANIZATIONS, InsertOne(corrupt_data), key=org_id)
                 else:
-                    self.crunch_organization_details.update_one({"organization_url": scraped_data.get("organization_url")},{"$set": {"corrupted_data": True,"last_processed_at": current_time,"corruption_detected_at": current_time}})
+                    self.writes.add(UPDATE_ORGANIZATIONS, UpdateOne(
+                        {"organization_url": organization_url},
+                        {"$set": {"corrupted_data": True,"last_processed_at": current_time,"corruption_detected_at": current_time}}
+                    ), key=org_id)
 
                 update_data = {
                     "corrupted_data": True,
@@ -525,85 +341,120 @@ class UpdateScrapper:
                     "corrupted_data": False  # Explicitly mark as clean
                 }
             
-            # Perform the update
-            result = self.crunch_organization_details.update_one(
-                {"_id": org_id},
-                {"$set": update_data}
+            # Queue the update; run_stats is incremented once the write succeeds
+            self.writes.add(
+                UPDATE_ORGANIZATIONS,
+                UpdateOne({"_id": org_id}, {"$set": update_data}),
+                key=org_id,
+                stat=("update_run_stats", "updated_count"),
             )
-            
-            if result.modified_count > 0:
-                self.save_stats_count(1)
-                status = "flagged as corrupted" if is_corrupt else "updated successfully"
-                self.logger.log(f"Thread-{self.thread_id}: Organization {org_id} {status}")
-                return True
-            else:
-                self.logger.error(
-                    f"Thread-{self.thread_id}: No changes made for organization {org_id}. "
-                    f"Document may not exist."
-                )
-                return False
+            status = "flagged as corrupted" if is_corrupt else "queued for update"
+            self.logger.log(f"Thread-{self.thread_id}: Organization {org_id} {status}")
+            return True
                     
         except Exception as e:
             self.logger.error(
                 f"Thread-{self.thread_id}: Error updating organization {org_id}: {e}"
             )
             return False
+    
+    def lease_batch(self, organizations):
+        """Heartbeat the queue leases of a claimed batch"""
+        return self.update_queue.heartbeat([org['_id'] for org in organizations])
+    
+    def scrape_target(self, org):
+        """(url, name) to scrape, or None after flagging an organization with missing data"""
+        org_url = org.get('organization_url', '')
+        org_name = org.get('organization_name', 'Unknown')
+        org_id = org.get('_id')
+        if not org_url or not org_id or not org_name:
+            self.update_organization(org_id, org,is_corrupt = True)
+            self.logger.error(f"Thread-{self.thread_id}: Missing data for organization {org}")
+            return None
+        return org_url, org_name
+    
+    def save_result(self, org, org_name, scraped_data, leases):
+        """Queue the writes for one scraped organization; True if it was updated"""
+        org_id = org['_id']
+        if not leases.confirm(org_id):
+            self.logger.error(f"Thread-{self.thread_id}: Lease on {org_name} expired and was taken over; discarding result")
+            return False
+        
+        if scraped_data == 404 or ( scraped_data and scraped_data['summary']['details'].get('description') in [None,''] ):
+            self.logger.log(f"Thread-{self.thread_id}: Organization {org_name} not found (404). Marking as updated.")
+            self.update_organization(org_id, org,is_corrupt = True)
+            return False
+        
+        if scraped_data:
+            return self.update_organization(org_id, scraped_data)
+        return False
+    
+    def finish(self, org):
+        # Done with it either way; the refill re-queues it if it still qualifies.
+        # Skipped by the buffer if the organization's own writes fail.
+        self.writes.add(UPDATE_QUEUE, self.update_queue.complete_op(org['_id']), key=org['_id'])
+    
+    def on_write_error(self, org_id, error):
+        """Buffered writes for ``org_id`` failed; its queue entry stays leased until it expires"""
+        self.logger.error(f"Thread-{self.thread_id}: Error updating organization {org_id}: {error}")
         
     
+    def process_batch(self, batch_size, batch_num):
+        """Claim and scrape one batch; returns (claimed, successful) counts"""
+        self.logger.log(f"Thread-{self.thread_id}: Processing batch {batch_num}")
+        
+        # Get organizations to update
+        organizations = self.read_crunch_details(batch_size)
+        if not organizations:
+            return 0, 0
+        
+        # Process each organization, keeping the whole batch leased
+        succeeded = set()
+        with self.lease_batch(organizations) as leases:
+            for org in organizations:
+                try:
+                    target = self.scrape_target(org)
+                    if not target:
+                        continue
+                    org_url, org_name = target
+                    
+                    self.logger.log(f"Thread-{self.thread_id}: Processing {org_name}")
+                    
+                    scraped_data = self.scrape_organization(org_url, org_name)
+                    if self.save_result(org, org_name, scraped_data, leases):
+                        succeeded.add(org['_id'])
+                finally:
+                    self.finish(org)
+            
+            self.writes.flush()
+            failed = self.writes.forget([org['_id'] for org in organizations])
+        
+        # Only organizations that were saved can turn into failures here
+        success_count = len(succeeded - failed.keys())
+        self.logger.log(f"Thread-{self.thread_id}: Batch {batch_num} completed - {success_count}/{len(organizations)} successful")
+        self.export_state()
+        return len(organizations), success_count
+    
     def run(self, batch_size=None, max_batches=None):
+        """Main execution loop"""
         batch_size = batch_size or int(os.environ.get('SCRAPER_BATCH_SIZE_UPDATE', 10))
         max_batches = max_batches or int(os.environ.get('SCRAPER_MAX_BATCHES_UPDATE', 50))
-        """Main execution loop"""
-        if not self.login():
+        if not self.resume_session() and not self.login():
             self.logger.error(f"Thread-{self.thread_id}: Cannot start - login failed")
             return
         
         self.logger.log(f"Thread-{self.thread_id}: Starting UPDATE scraping")
-        batch_num = 0
-        for batch_num in range(max_batches):
+        for batch_num in range(1, max_batches + 1):
             try:
-                batch_num += 1
-                self.logger.log(f"Thread-{self.thread_id}: Processing batch {batch_num }")
-                
-                # Get organizations to update
-                organizations = self.read_crunch_details(batch_size)
-                
-                if not organizations:
+                claimed, _ = self.process_batch(batch_size, batch_num)
+                if not claimed:
                     self.logger.log(f"Thread-{self.thread_id}: No more organizations to update")
                     break
-                
-                # Process each organization
-                success_count = 0
-                for org in organizations:
-                    org_url = org.get('organization_url', '')
-                    org_name = org.get('organization_name', 'Unknown')
-                    org_id = org.get('_id')
-                    if not org_url or not org_id or not org_name:
-                        self.update_organization(org_id, org,is_corrupt = True)
-                        self.logger.error(f"Thread-{self.thread_id}: Missing data for organization {org}")
-                        continue
-                    
-                    self.logger.log(f"Thread-{self.thread_id}: Processing {org_name}")
-                    
-                    scraped_data = self.scrape_organization(org_url, org_name)
-                    
-                    if scraped_data == 404 or ( scraped_data['summary']['details'].get('description') in [None,''] ):
-                        self.logger.log(f"Thread-{self.thread_id}: Organization {org_name} not found (404). Marking as updated.")
-                        self.update_organization(org_id, org,is_corrupt = True)
-                        continue
-                    
-                    if scraped_data:
-                        if self.update_organization(org_id, scraped_data):
-                            success_count += 1
-                    
-                    self.random_sleep(2, 5)
-                
-                self.logger.log(f"Thread-{self.thread_id}: Batch {batch_num + 1} completed - {success_count}/{len(organizations)} successful")
-                
             except Exception as e:
-                self.logger.error(f"Thread-{self.thread_id}: Error in batch {batch_num + 1}: {e}")
+                self.logger.error(f"Thread-{self.thread_id}: Error in batch {batch_num}: {e}")
                 time.sleep(30)
         
+        self.writes.flush()
         self.logger.log(f"Thread-{self.thread_id}: UPDATE scraping completed")
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+"""
+Indexed priority queue of organizations waiting for an update.
+
+read_crunch_details used to run up to six $match + $sample aggregations
+per batch on every update thread, each a near-full scan of the
+organizations collection, and threads regularly sampled the same
+organizations. Instead, the priority filters from queries.py are now
+evaluated by one thread at a time, only when the queue runs low, and the
+matching ids are upserted into a small queue collection (its _id is the
+organization _id, so an organization can be queued only once).
+
+Threads lease entries (leases.py) with find_one_and_update on the
+(priority, enqueued_at, lease_expires_at) index: the cost of picking a
+batch no longer depends on the size of the organizations collection, and
+an entry is held by one thread at a time. A thread heartbeats the leases
+of its batch while it scrapes and deletes each entry when done; if it dies, the lease
+expires and another thread takes the organization over.
+"""
+from datetime import timedelta
+
+from pymongo import ASCENDING, UpdateOne
+
+from leases import Leases, utcnow
+from queries import (
+    FLAGGED_URL_FILTER, QUEUE_LOCKS, UPDATE_ORGANIZATIONS, UPDATE_QUEUE, UPDATE_RAW_URLS,
+    flagged_organization_filter, not_recently_queued, unleased, update_priority_filters,
+)
+
+# Refill when fewer unclaimed entries than this are left
+LOW_WATERMARK = 100
+# Entries added per refill (higher priorities first, like the old sampling)
+REFILL_TARGET = 500
+# Server-side budget for each priority scan during a refill
+REFILL_MAX_TIME_MS = 60_000
+# Only one thread refills; its lease runs out in case that thread dies
+REFILL_LOCK_TTL = timedelta(minutes=10)
+# Organizations queued this recently are not queued again
+REQUEUE_COOLDOWN = timedelta(days=1)
+
+REFILL_LOCK_ID = "update-queue-refill"
+
+
+class UpdateQueue:
+    def __init__(self, db, owner, logger=None):
+        self.queue = db[UPDATE_QUEUE]
+        self.locks = db[QUEUE_LOCKS]
+        self.organizations = db[UPDATE_ORGANIZATIONS]
+        self.raw_urls = db[UPDATE_RAW_URLS]
+        self.owner = owner
+        self.logger = logger
+        self.leases = Leases(self.queue, owner, logger=logger)
+        self.refill_lock = Leases(self.locks, owner, ttl=REFILL_LOCK_TTL, logger=logger)
+
+    def ensure_indexes(self):
+        self.leases.ensure_index(
+            [("priority", ASCENDING), ("enqueued_at", ASCENDING)], name="lease_claim_order"
+        )
+        self.raw_urls.create_index([("update_first", ASCENDING)], name="update_first")
+        self.locks.update_one(
+            {"_id": REFILL_LOCK_ID}, {"$setOnInsert": {"purpose": "update queue refill"}}, upsert=True
+        )
+
+    # ── Claiming ──
+
+    def claim(self, count, now=None, exclude_corrupted=True):
+        """Lease up to ``count`` organization ids, most urgent first."""
+        now = now or utcnow()
+        if count > 0 and self.unclaimed(now, LOW_WATERMARK) < LOW_WATERMARK:
+            self.refill(now, exclude_corrupted)
+
+        entries = self.leases.claim_many(
+            {}, count, sort=[("priority", ASCENDING), ("enqueued_at", ASCENDING)],
+            projection={"_id": 1}, now=now,
+        )
+        return [entry["_id"] for entry in entries]
+
+    def heartbeat(self, org_ids):
+        return self.leases.heartbeat(org_ids)
+
+    def complete(self, org_id):
+        """Drop a processed organization from the queue (no-op if the lease was lost)."""
+        self.leases.delete(org_id)
+
+    def complete_op(self, org_id):
+        """``complete`` as a bulk-write request (see write_buffer.py)."""
+        return self.leases.delete_op(org_id)
+
+    def unclaimed(self, now=None, limit=0):
+        return self.queue.count_documents(unleased(now or utcnow()), limit=limit)
+
+    # ── Refilling ──
+
+    def _enqueue(self, org_ids, priority, now):
+        if not org_ids:
+            return 0
+        result = self.queue.bulk_write([
+            UpdateOne(
+                {"_id": org_id},
+                {"$setOnInsert": {"priority": priority, "enqueued_at": now}},
+                upsert=True,
+            )
+            for org_id in org_ids
+        ], ordered=False)
+        self.organizations.update_many(
+            {"_id": {"$in": org_ids}},
+            {"$set": {"is_updated": 0, "update_queued_at": now}}
+        )
+        return result.upserted_count
+
+    def refill(self, now, exclude_corrupted=True):
+        """Queue up to REFILL_TARGET organizations from the priority filters.
+
+        Returns the number of entries added, or None if another thread is
+        already refilling.
+        """
+        if self.refill_lock.claim({"_id": REFILL_LOCK_ID}, now=now) is None:
+            return None
+        try:
+            added = 0
+            cooldown = not_recently_queued(now - REQUEUE_COOLDOWN)
+            filters = update_priority_filters(now, exclude_corrupted)
+            for priority, (label, condition) in enumerate(filters):
+                if added >= REFILL_TARGET:
+                    break
+                cursor = self.organizations.find(
+                    {"$and": [condition, cooldown]}, {"_id": 1}
+                ).limit(REFILL_TARGET - added).max_time_ms(REFILL_MAX_TIME_MS)
+                added += self._enqueue([doc["_id"] for doc in cursor], priority, now)
+
+            # Organizations whose raw URL is flagged with update_first
+            if added < REFILL_TARGET:
+                flagged_urls = list(self.raw_urls.find(FLAGGED_URL_FILTER, {"url": 1}).limit(REFILL_TARGET - added))
+                if flagged_urls:
+                    org_ids = [doc["_id"] for doc in self.organizations.find(
+                        flagged_organization_filter([u["url"] for u in flagged_urls], now, exclude_corrupted),
+                        {"_id": 1}
+                    )]
+                    added += self._enqueue(org_ids, len(filters), now)
+                    self.raw_urls.update_many(
+                        {"_id": {"$in": [u["_id"] for u in flagged_urls]}},
+                        {"$set": {"update_first": 0, "processed_at": now}}
+                    )
+
+            if self.logger:
+                self.logger.log(f"{self.owner}: Refilled update queue with {added} organizations")
+            return added
+        finally:
+            self.refill_lock.release(REFILL_LOCK_ID)
@@ -0,0 +1,194 @@
+"""
+Long-lived scraper workers: one process per account for the manager's lifetime.
+
+The process engine starts `python update_scrapper.py <account>` per
+account every cycle, waits for all of them, sleeps and starts them again.
+Every cycle pays interpreter start-up, the bs4/lxml/curl_cffi/pymongo
+imports, a MongoDB ping and a session check, and an account that finishes
+early sits idle until the slowest one is done.
+
+Here each account gets one worker process, started once. It builds its
+scraper once, so the MongoDB client, proxy pool, rate scheduler and
+logged-in session stay warm, and then claims batch after batch until it
+is told to stop. When there is no work it waits IDLE_WAIT (doubling up to
+MAX_IDLE_WAIT) and asks again. A single account alternates between the
+update and new scraper, batch by batch, inside one worker.
+
+WorkerPool restarts workers that exit and logs the pool's throughput from
+their batch reports every REPORT_INTERVAL.
+benchmarks/bench_worker_pool.py models (does not measure) it against the cycle engine.
+"""
+import importlib
+import multiprocessing
+import os
+import queue
+import time
+from collections import Counter
+
+IDLE_WAIT = 15
+MAX_IDLE_WAIT = 300
+ERROR_WAIT = 30
+# A worker that exits is restarted after RESTART_DELAY; the delay doubles
+# (up to MAX_RESTART_DELAY) while workers keep dying within MIN_UPTIME
+RESTART_DELAY = 30
+MAX_RESTART_DELAY = 1800
+MIN_UPTIME = 300
+REPORT_INTERVAL = 300
+POLL_INTERVAL = 5
+STOP_TIMEOUT = 60
+
+ROLES = {
+    # role: (module, scraper class, batch size env)
+    "update": ("update_scrapper", "UpdateScrapper", "SCRAPER_BATCH_SIZE_UPDATE"),
+    "new": ("new_scrapper", "NewScrapper", "SCRAPER_BATCH_SIZE_NEW"),
+}
+
+
+def assign_accounts(accounts, update_count, new_count):
+    """Hand accounts out to roles the way ThreadManager.run_parallel_mode does."""
+    roles = ["update"] * update_count + ["new"] * new_count
+    assignments, numbers = [], {"update": 0, "new": 0}
+    for role, account in zip(roles, accounts):
+        numbers[role] += 1
+        assignments.append((role, account, numbers[role]))
+    return assignments
+
+
+def worker_main(roles, account, thread_id, env, stop, reports):
+    """Worker process: build the scrapers once, then claim batches until ``stop`` is set."""
+    os.environ.update(env)
+    scrapers = []
+    for role in roles:
+        module, class_name, batch_env = ROLES[role]
+        scraper_class = getattr(importlib.import_module(module), class_name)
+        scraper = scraper_class(account["email"], account["password"], thread_id)
+        if not scraper.resume_session() and not scraper.login():
+            scraper.logger.error(f"Thread-{thread_id}: Cannot start - login failed")
+            return
+        scrapers.append((role, scraper, int(os.environ.get(batch_env, 10))))
+
+    idle_wait = IDLE_WAIT
+    batch_num = 0
+    try:
+        while not stop.is_set():
+            worked = False
+            for role, scraper, batch_size in scrapers:
+                batch_num += 1
+                try:
+                    claimed, succeeded = scraper.process_batch(batch_size, batch_num)
+                except Exception as e:
+                    scraper.logger.error(f"Thread-{thread_id}: Error in batch {batch_num}: {e}")
+                    stop.wait(ERROR_WAIT)
+                    continue
+                reports.put((role, claimed, succeeded))
+                worked = worked or claimed > 0
+                if stop.is_set():
+                    break
+
+            if worked:
+                idle_wait = IDLE_WAIT
+            elif not stop.is_set():
+                scrapers[0][1].logger.log(f"Thread-{thread_id}: No work for {'/'.join(roles)}, checking again in {idle_wait}s")
+                stop.wait(idle_wait)
+                idle_wait = min(MAX_IDLE_WAIT, idle_wait * 2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, scraper, _ in scrapers:
+            scraper.writes.flush()
+
+
+class WorkerPool:
+    """Runs ``[(roles, account, thread_id), ...]`` as persistent worker processes."""
+
+    def __init__(self, assignments, env, logger):
+        self.assignments = assignments
+        self.env = env
+        self.logger = logger
+        # Spawned, not forked: the manager's MongoClient must not be copied into workers
+        self.ctx = multiprocessing.get_context("spawn")
+        self.stop = self.ctx.Event()
+        self.reports = self.ctx.Queue()
+        self.workers = {}
+
+    def _name(self, index):
+        roles, account, thread_id = self.assignments[index]
+        return f"{'/'.join(roles)} Thread-{thread_id} ({account['email']})"
+
+    def _start(self, index, restart_delay=RESTART_DELAY):
+        roles, account, thread_id = self.assignments[index]
+        process = self.ctx.Process(
+            target=worker_main,
+            args=(roles, account, thread_id, self.env, self.stop, self.reports),
+            name=f"worker-{'-'.join(roles)}-{thread_id}",
+        )
+        process.start()
+        self.workers[index] = {"process": process, "started": time.monotonic(), "delay": restart_delay, "exited": None}
+        self.logger.log(f"Started worker {self._name(index)} (pid {process.pid})")
+
+    def _check_workers(self, now):
+        for index, worker in self.workers.items():
+            process = worker["process"]
+            if process.is_alive():
+                continue
+            if worker["exited"] is None:
+                uptime = now - worker["started"]
+                if uptime >= MIN_UPTIME:
+                    worker["delay"] = RESTART_DELAY
+                worker["exited"] = now
+                self.logger.error(
+                    f"Worker {self._name(index)} exited with code {process.exitcode} after {uptime:.0f}s; "
+                    f"restarting in {worker['delay']}s"
+                )
+            elif now - worker["exited"] >= worker["delay"]:
+                # Should it die again right after start (e.g. failed login), wait longer
+                self._start(index, min(MAX_RESTART_DELAY, worker["delay"] * 2))
+
+    def _report(self, totals, window, elapsed):
+        minutes = elapsed / 60
+        by_role = ", ".join(
+            f"{role} {window[role, 'succeeded']}/{window[role, 'claimed']}" for role in ROLES if window[role, 'claimed']
+        )
+        self.logger.log(
+            f"Throughput: {window['succeeded'] / minutes:.1f} orgs/min saved, "
+            f"{window['claimed'] / minutes:.1f} claimed over {minutes:.0f} min ({by_role or 'idle'}); "
+            f"{totals['succeeded']} saved since start"
+        )
+
+    def run(self):
+        """Start every worker and supervise them until interrupted."""
+        for index in range(len(self.assignments)):
+            # Staggered so the workers' logins do not hit Crunchbase at once
+            self._start(index)
+            time.sleep(1)
+
+        totals, window = Counter(), Counter()
+        window_start = time.monotonic()
+        try:
+            while True:
+                try:
+                    role, claimed, succeeded = self.reports.get(timeout=POLL_INTERVAL)
+                    for counter in (totals, window):
+                        counter.update({"claimed": claimed, "succeeded": succeeded,
+                                        (role, "claimed"): claimed, (role, "succeeded"): succeeded})
+                except queue.Empty:
+                    pass
+
+                now = time.monotonic()
+                self._check_workers(now)
+                if now - window_start >= REPORT_INTERVAL:
+                    self._report(totals, window, now - window_start)
+                    window, window_start = Counter(), now
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Let the workers finish their batch and flush, then stop them."""
+        self.stop.set()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for index, worker in self.workers.items():
+            worker["process"].join(max(0, deadline - time.monotonic()))
+            if worker["process"].is_alive():
+                self.logger.error(f"Worker {self._name(index)} did not stop in time; terminating")
+                worker["process"].terminate()
+                worker["process"].join()
@@ -0,0 +1,139 @@
+"""
+Write-behind buffer for scraped results.
+
+Saving one organization used to take four or five round-trips (find_one,
+insert_one, update_one, the raw URL / queue bookkeeping and a separate
+run_stats $inc). The scrapers now queue those writes here and they are
+sent as unordered bulk_writes when the buffer holds FLUSH_SIZE
+operations, when the oldest one is FLUSH_INTERVAL old, or when the
+scraper flushes at the end of a batch. Stats increments are summed
+locally and written as a single $inc per flush.
+
+Every operation carries a key (the raw URL or organization it came from).
+A key's operations are written in the order they were added: a flush
+sends every key's first operation (one bulk_write per collection), then
+every key's second, and so on. When a write fails, the key's later
+operations are skipped, its stats are not counted, and
+``on_error(key, error)`` is called, so a failed insert never marks its
+URL completed. The failure is remembered across flushes, because a key's
+operations can straddle an automatic flush, until the scraper collects it
+with ``forget`` once the key's batch is done.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+# Flush once this many operations are buffered
+FLUSH_SIZE = 100
+# ... or once the oldest buffered operation is this old
+FLUSH_INTERVAL = timedelta(seconds=30)
+
+STATS_COLLECTION = "run_stats"
+
+
+class WriteBuffer:
+    def __init__(self, db, on_error=None, logger=None, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db = db
+        self.on_error = on_error
+        self.logger = logger
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval.total_seconds()
+        self._ops = []
+        self._first_at = None
+        # {key: error} for keys whose writes failed, until forget()
+        self._failed = {}
+        # The async engine adds from worker threads
+        self._lock = threading.Lock()
+        # Held for a whole flush, so concurrent flushes neither reorder a key's
+        # writes nor miss failures an earlier flush has yet to record
+        self._flush_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ops)
+
+    def add(self, collection_name, op, key, stat=None):
+        """Queue ``op`` (an InsertOne/UpdateOne/... request) for ``key``.
+
+        ``stat`` is an optional (run_stats _id, field) counted once the
+        write succeeds.
+        """
+        with self._lock:
+            if not self._ops:
+                self._first_at = time.monotonic()
+            self._ops.append((collection_name, op, key, stat))
+        if self.due():
+            self.flush()
+
+    def due(self):
+        return bool(self._ops) and (
+            len(self._ops) >= self.flush_size
+            or time.monotonic() - self._first_at >= self.flush_interval
+        )
+
+    def flush(self):
+        """Write everything buffered; returns {key: error} for keys that failed in this flush."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            ops, self._ops = self._ops, []
+            failed_before = set(self._failed)
+        if not ops:
+            return {}
+
+        # Round n holds every key's n-th operation, so a key's writes keep their order
+        rounds, position = defaultdict(list), Counter()
+        for entry in ops:
+            rounds[position[entry[2]]].append(entry)
+            position[entry[2]] += 1
+
+        failed, skipped = {}, 0
+        for n in sorted(rounds):
+            # One bulk_write per collection, in the order collections were first used
+            by_collection = defaultdict(list)
+            for entry in rounds[n]:
+                if entry[2] in failed or entry[2] in failed_before:
+                    skipped += 1
+                else:
+                    by_collection[entry[0]].append(entry)
+            for name, entries in by_collection.items():
+                try:
+                    self.db[name].bulk_write([e[1] for e in entries], ordered=False)
+                except BulkWriteError as e:
+                    for error in e.details.get("writeErrors", []):
+                        failed.setdefault(entries[error["index"]][2], error.get("errmsg", str(error)))
+                except PyMongoError as e:
+                    for entry in entries:
+                        failed.setdefault(entry[2], str(e))
+
+        stats = defaultdict(lambda: defaultdict(int))
+        for _, _, key, stat in ops:
+            if stat and key not in failed and key not in failed_before:
+                stats[stat[0]][stat[1]] += 1
+        for stats_id, counts in stats.items():
+            try:
+                self.db[STATS_COLLECTION].update_one({"_id": stats_id}, {"$inc": dict(counts)})
+            except PyMongoError as e:
+                if self.logger:
+                    self.logger.error(f"Failed to save stats: {e}")
+
+        with self._lock:
+            self._failed.update(failed)
+        if self.logger:
+            self.logger.log(f"Flushed {len(ops)} writes, {len(failed)} failed, {skipped} skipped")
+        for key, error in failed.items():
+            if self.on_error:
+                self.on_error(key, error)
+        return failed
+
+    def forget(self, keys):
+        """Stop tracking ``keys``; returns {key: error} for those whose writes failed in any flush.
+
+        Call it after the final flush of the batch the keys belong to.
+        """
+        with self._lock:
+            return {key: self._failed.pop(key) for key in keys if key in self._failed}
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
-    MainScraper, SubScraper, ScraperSchedule, ScraperRunHistory, ScraperProcess,
-    ScraperAccount, ScraperConfig,
+    MainScraper, SubScraper, ScraperSchedule, ScraperRunHistory, ScraperRunDaily, ScraperProcess,
+    ScraperAccount, ScraperConfig, MongoCollectionCount,
 )
 
 @admin.register(MainScraper)
@@ -24,6 +24,11 @@ class ScraperRunHistoryAdmin(admin.ModelAdmin):
     list_display = ['sub_scraper', 'triggered_by', 'status', 'duration_seconds', 'started_at']
     list_filter = ['status', 'triggered_by']
 
+@admin.register(ScraperRunDaily)
+class ScraperRunDailyAdmin(admin.ModelAdmin):
+    list_display = ['sub_scraper', 'day', 'total_runs', 'success_runs', 'failed_runs', 'records_inserted']
+    list_filter = ['sub_scraper']
+
 @admin.register(ScraperProcess)
 class ScraperProcessAdmin(admin.ModelAdmin):
     list_display = ['sub_scraper', 'pid', 'is_running', 'started_at']
@@ -38,3 +43,7 @@ class ScraperAccountAdmin(admin.ModelAdmin):
 class ScraperConfigAdmin(admin.ModelAdmin):
     list_display = ['main_scraper', 'update_account_count', 'new_account_count', 'update_ratio']
 
+@admin.register(MongoCollectionCount)
+class MongoCollectionCountAdmin(admin.ModelAdmin):
+    list_display = ['collection_name', 'db_name', 'count', 'status', 'counted_at']
+    list_filter = ['status']
@@ -1,13 +1,26 @@
 import os
 import json
-from django.http import JsonResponse
+from datetime import timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-from .models import SubScraper, ScraperProcess
+from pymongo.errors import ExecutionTimeout, PyMongoError
+
+from crunchbase import queries as crunchbase_queries
+
+from .models import MainScraper, SubScraper, ScraperProcess
+from .index_advisor import advise
+from .mongo import MAX_PAGE_SIZE, QueryError, keyset_sort, parse_json_arg, query_page
 from .schedule_utils import get_next_runs
-from .tasks import get_live_log_path, get_stdin_queue_path
+from .live_log import cursor_is_stale, line_to_cursor, read_from_cursor, read_generation
+from .live_stream import stream_events
+from .tasks import (
+    get_live_log_path, get_live_log_index_path, get_stdin_queue_path, is_stdin_available,
+)
 
 
 def _tail_file(file_path, num_lines=100):
@@ -63,40 +76,50 @@ def api_log_tail(request):
 def api_status(request, sub_id):
     """Return current status of a sub scraper."""
     try:
-        sub = SubScraper.objects.get(pk=sub_id)
+        sub = SubScraper.objects.select_related('process').get(pk=sub_id)
     except SubScraper.DoesNotExist:
         return JsonResponse({'error': 'Not found'}, status=404)
 
     process = getattr(sub, 'process', None)
     is_running = process and process.is_running
-    last_run = sub.run_history.order_by('-started_at').first()
 
     return JsonResponse({
         'sub_id': sub.id,
         'name': sub.name,
         'is_running': is_running,
         'pid': process.pid if process and is_running else None,
-        'status': 'running' if is_running else (last_run.status if last_run else 'never_run'),
-        'last_run_at': last_run.started_at.isoformat() if last_run else None,
-        'last_run_status': last_run.status if last_run else None,
+        'status': sub.current_status,
+        'last_run_at': sub.last_run_started_at.isoformat() if sub.last_run_started_at else None,
+        'last_run_status': sub.last_run_status or None,
         # Does the live log file exist?
         'has_live_log': os.path.isfile(get_live_log_path(sub_id)),
         # Can we send stdin right now?
-        'stdin_available': os.path.isfile(get_stdin_queue_path(sub_id)),
+        'stdin_available': is_stdin_available(sub_id),
     })
 
 
 def api_live_log(request, sub_id):
-    """Return live log lines for a running scraper with line-offset support.
+    """Return live log lines for a running scraper, incrementally.
 
     Query params:
-        offset (int): number of lines already seen by the client (default 0)
+        cursor (int): byte position returned by the previous poll. When
+            given, the server seeks straight there and returns only the
+            bytes written since, so poll cost tracks new output rather
+            than total log size.
+        offset (int): number of lines already seen by the client
+            (default 0). Used for line numbering, and to locate the start
+            position through the sidecar line index when no cursor is sent.
+        generation (str): log generation returned with the cursor; a
+            different one means a new run replaced the log.
 
     Response:
-        { lines: [...], total: N, is_running: bool }
+        { lines: [...], total: N, cursor: B, generation: G, reset: bool, is_running: bool }
     """
     log_path = get_live_log_path(sub_id)
-    offset = int(request.GET.get('offset', 0))
+    index_path = get_live_log_index_path(sub_id)
+    offset = max(0, int(request.GET.get('offset', 0)))
+    raw_cursor = request.GET.get('cursor')
+    client_generation = request.GET.get('generation') or None
 
     # Check running status
     try:
@@ -110,42 +133,104 @@ def api_live_log(request, sub_id):
         return JsonResponse({
             'lines': [],
             'total': 0,
+            'cursor': 0,
+            'generation': None,
+            'reset': offset > 0,
             'is_running': is_running,
         })
 
     try:
-        with open(log_path, 'r', errors='replace') as f:
-            content = f.read()
-
-        all_lines = content.split('\n')
-        # Remove trailing empty line artifact from split
-        if all_lines and all_lines[-1] == '':
-            all_lines = all_lines[:-1]
-
-        total = len(all_lines)
-        new_lines = all_lines[offset:] if offset < total else []
+        reset = False
+        generation = read_generation(index_path)
+        if raw_cursor is not None:
+            cursor = max(0, int(raw_cursor))
+            # The cursor points into an earlier run's log
+            if cursor_is_stale(log_path, client_generation, generation, cursor):
+                cursor, offset, reset = 0, 0, True
+        else:
+            cursor = line_to_cursor(log_path, index_path, offset)
+
+        new_lines, cursor = read_from_cursor(log_path, cursor, include_partial=not is_running)
 
         return JsonResponse({
             'lines': new_lines,
-            'total': total,
+            'total': offset + len(new_lines),
+            'cursor': cursor,
+            'generation': generation,
+            'reset': reset,
             'is_running': is_running,
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+async def api_live_stream(request, sub_id):
+    """Server-Sent Events stream of live log lines and status changes.
+
+    Query params (or the ``Last-Event-ID`` header, as
+    ``cursor:line:generation``, when an EventSource reconnects):
+        cursor (int): byte position already rendered by the client
+        offset (int): number of lines already rendered by the client
+        generation (str): log generation the cursor belongs to
+
+    Events:
+        lines  — { lines: [...], total: N, cursor: B, generation: G }
+        status — { is_running: bool, status: str }
+        reset  — the log was replaced by a new run; clear and start over
+
+    Needs the ASGI application; under WSGI the client falls back to
+    polling ``api_live_log``.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Live stream requires the ASGI server — poll /api/live-log/ instead'},
+            status=503,
+        )
+
+    if not await SubScraper.objects.filter(pk=sub_id).aexists():
+        return JsonResponse({'error': 'Not found'}, status=404)
+
+    try:
+        last_event_id = request.headers.get('Last-Event-ID')
+        if last_event_id:
+            cursor, _, rest = last_event_id.partition(':')
+            offset, _, generation = rest.partition(':')
+            cursor, offset, generation = int(cursor), int(offset or 0), generation or None
+        else:
+            generation = request.GET.get('generation') or None
+            offset = max(0, int(request.GET.get('offset', 0)))
+            raw_cursor = request.GET.get('cursor')
+            if raw_cursor is not None:
+                cursor = max(0, int(raw_cursor))
+            else:
+                log_path = get_live_log_path(sub_id)
+                cursor = 0
+                if os.path.isfile(log_path):
+                    cursor = await sync_to_async(line_to_cursor, thread_sensitive=False)(
+                        log_path, get_live_log_index_path(sub_id), offset
+                    )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    response = StreamingHttpResponse(
+        stream_events(sub_id, cursor, offset, generation),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @csrf_exempt
 @require_POST
 def api_send_input(request, sub_id):
     """Send a line of input to the running scraper's stdin.
 
     Body (JSON): { "input": "some text" }
-    The text is appended to the stdin queue file which the Celery worker reads
-    and forwards to the process's PTY master fd.
+    The text is written to the run's stdin named pipe; the Celery worker's
+    I/O loop wakes on it and forwards it to the process's PTY master fd.
     """
-    stdin_queue_path = get_stdin_queue_path(sub_id)
-
-    if not os.path.isfile(stdin_queue_path):
+    if not is_stdin_available(sub_id):
         return JsonResponse(
             {'error': 'No active stdin queue — scraper may not be running'},
             status=400,
@@ -161,24 +246,167 @@ def api_send_input(request, sub_id):
     line = text + '\n'
 
     try:
-        with open(stdin_queue_path, 'ab') as f:
-            f.write(line.encode('utf-8'))
+        # Non-blocking: fails fast (ENXIO) if no run is reading the pipe
+        fd = os.open(get_stdin_queue_path(sub_id), os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
         return JsonResponse({'status': 'ok', 'sent': text})
     except OSError as e:
         return JsonResponse({'error': f'Failed to write to stdin: {str(e)}'}, status=500)
 
 
+def _mongo_sub_or_error(sub_id):
+    try:
+        sub = SubScraper.objects.select_related('main_scraper').get(pk=sub_id)
+    except SubScraper.DoesNotExist:
+        return JsonResponse({'error': 'Sub-scraper not found'}, status=404)
+    if not sub.mongo_collection_name:
+        return JsonResponse({'error': 'No MongoDB collection configured for this scraper.'}, status=400)
+    return sub
+
+
+@require_POST
+def api_mongo_query(request, sub_id):
+    """Return one page of a read-only query against the scraper's collection.
+
+    Body (JSON): { "filter": "{...}", "projection": "{...}", "sort": "{...}",
+                   "page_size": 25, "cursor": "<next_cursor of previous page>" }
+    filter/projection/sort are MongoDB Extended JSON strings. Responds with
+    { "documents": [...], "next_cursor": str|null, "bytes": int, "truncated": bool }.
+    """
+    sub = _mongo_sub_or_error(sub_id)
+    if isinstance(sub, JsonResponse):
+        return sub
+
+    try:
+        body = json.loads(request.body)
+        page = query_page(
+            sub.get_mongo_collection(),
+            filter=parse_json_arg(body.get('filter'), {}, 'filter'),
+            projection=parse_json_arg(body.get('projection'), None, 'projection'),
+            sort=parse_json_arg(body.get('sort'), {'_id': -1}, 'sort'),
+            cursor=body.get('cursor') or None,
+            page_size=body.get('page_size', 25),
+        )
+    except (QueryError, json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ExecutionTimeout:
+        return JsonResponse(
+            {'error': 'Query exceeded the server time limit — narrow the filter or use an indexed sort'},
+            status=408,
+        )
+    except PyMongoError as e:
+        return JsonResponse({'error': f'Query error: {str(e)}'}, status=500)
+    return JsonResponse(page)
+
+
+@require_POST
+def api_mongo_explain(request, sub_id):
+    """Explain plan and index suggestions for the query the panel would run.
+
+    Same body as api_mongo_query (cursor ignored). Runs
+    explain("executionStats") for the first page and responds with
+    { "plan": {...}, "indexes": [[[field, dir], ...]], "commands": [...], "notes": [...] };
+    indexes are only suggested when the plan is a COLLSCAN, sorts in memory,
+    or examines far more documents than it returns.
+    """
+    sub = _mongo_sub_or_error(sub_id)
+    if isinstance(sub, JsonResponse):
+        return sub
+
+    try:
+        body = json.loads(request.body)
+        page_size = max(1, min(int(body.get('page_size', 25)), MAX_PAGE_SIZE))
+        result = advise(
+            sub.get_mongo_collection(),
+            parse_json_arg(body.get('filter'), {}, 'filter'),
+            sort=keyset_sort(parse_json_arg(body.get('sort'), {'_id': -1}, 'sort')),
+            limit=page_size + 1,
+        )
+    except (QueryError, json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ExecutionTimeout:
+        return JsonResponse({'error': 'Explain exceeded the server time limit'}, status=408)
+    except PyMongoError as e:
+        return JsonResponse({'error': f'Explain error: {str(e)}'}, status=500)
+    return JsonResponse(result)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def api_proxy_health(request, pk):
+    """Health of the Crunchbase proxy pool, as the scrapers last reported it.
+
+    Reads the ProxyHealth and ProxyAssignments collections that
+    crunchbase/proxy_pool.py maintains. Responds with
+    { "proxies": [{"proxy", "status", "latency_ms", "error_rate", "requests",
+    "errors", "ejections", "ejected_until", "last_error", "accounts",
+    "updated_at"}, ...] }; configured proxies the scrapers have not used yet
+    are listed with status "unused".
+    """
+    try:
+        main_scraper = MainScraper.objects.select_related('scraper_config').get(pk=pk)
+    except MainScraper.DoesNotExist:
+        return JsonResponse({'error': 'Scraper not found'}, status=404)
+
+    config = getattr(main_scraper, 'scraper_config', None)
+    configured = [
+        proxy if '://' in proxy else f'http://{proxy}'
+        for proxy in (config.get_proxy_list() if config else [])
+    ]
+
+    try:
+        db = main_scraper.get_mongo_client()[crunchbase_queries.DB_NAME]
+        health = list(db[crunchbase_queries.PROXY_HEALTH].find().sort('_id', 1))
+        accounts = {
+            doc['_id']: doc['accounts']
+            for doc in db[crunchbase_queries.PROXY_ASSIGNMENTS].aggregate([
+                {'$group': {'_id': '$proxy', 'accounts': {'$sum': 1}}},
+            ])
+        }
+    except PyMongoError as e:
+        return JsonResponse({'error': f'Query error: {str(e)}'}, status=500)
+
+    now = timezone.now()
+    proxies = []
+    for doc in health:
+        ejected_until = doc.get('ejected_until')
+        if ejected_until and timezone.is_naive(ejected_until):
+            ejected_until = ejected_until.replace(tzinfo=dt_timezone.utc)
+        proxies.append({
+            'proxy': doc['_id'],
+            'status': 'ejected' if ejected_until and ejected_until > now else 'healthy',
+            'latency_ms': doc.get('latency_ms'),
+            'error_rate': doc.get('error_rate', 0),
+            'requests': doc.get('requests', 0),
+            'errors': doc.get('errors', 0),
+            'ejections': doc.get('ejections', 0),
+            'ejected_until': _isoformat(ejected_until),
+            'last_error': doc.get('last_error'),
+            'accounts': accounts.get(doc['_id'], 0),
+            'updated_at': _isoformat(doc.get('updated_at')),
+        })
+    seen = {p['proxy'] for p in proxies}
+    proxies.extend(
+        {'proxy': proxy, 'status': 'unused', 'accounts': accounts.get(proxy, 0)}
+        for proxy in configured if proxy not in seen
+    )
+    return JsonResponse({'proxies': proxies})
+
+
 def api_watcher_data(request):
     """Return watcher data for all active scrapers."""
-    sub_scrapers = SubScraper.objects.filter(is_active=True).select_related(
-        'main_scraper'
-    ).prefetch_related('run_history', 'process', 'schedule').all()
+    sub_scrapers = SubScraper.objects.filter(is_active=True).with_status()
 
     data = []
     for sub in sub_scrapers:
         process = getattr(sub, 'process', None)
         is_running = process and process.is_running
-        last_run = sub.run_history.order_by('-started_at').first()
+        last_run = sub.last_run
         schedule = getattr(sub, 'schedule', None)
 
         next_run = None
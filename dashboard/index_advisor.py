@@ -0,0 +1,183 @@
+"""Explain plans and index suggestions for MongoDB find filters.
+
+``explain_find`` runs ``explain`` with ``executionStats`` verbosity and
+boils the (version- and topology-dependent) output down to the numbers an
+operator needs: documents examined vs returned, keys examined, the index
+used and the execution time, plus whether the plan scanned the whole
+collection or sorted in memory.
+
+``suggest_indexes`` proposes compound indexes following the
+Equality → Sort → Range rule. A top-level ``$or`` needs an index per
+branch for the planner to avoid a COLLSCAN, so each branch gets its own
+suggestion (duplicates collapsed).
+"""
+import json
+
+from .mongo import QUERY_MAX_TIME_MS
+
+# Examined/returned ratio above which a plan is reported as inefficient
+INEFFICIENT_RATIO = 10
+
+_EQUALITY_OPS = {'$eq', '$in'}
+_BOUNDED_OPS = {'$gt', '$gte', '$lt', '$lte'}
+# Usable as index bounds, but they match most of the key space
+_BROAD_OPS = {'$ne', '$nin', '$exists', '$not', '$type', '$size', '$all', '$elemMatch'}
+_UNINDEXABLE = {'$where', '$expr', '$nor', '$jsonSchema'}
+
+
+# ── Explain ─────────────────────────────────────────────────────────────
+
+def _walk(plan):
+    """Yield every stage of a (possibly sharded / SBE) plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        yield plan
+    for key in ('inputStage', 'queryPlan', 'outerStage', 'innerStage'):
+        yield from _walk(plan.get(key))
+    for key in ('inputStages', 'shards'):
+        for child in plan.get(key) or []:
+            yield from _walk(child)
+    # Sharded queryPlanner nests each shard's plan under winningPlan
+    yield from _walk(plan.get('winningPlan'))
+
+
+def summarize_explain(explain):
+    """Reduce raw ``explain`` output to a flat summary dict."""
+    stats = explain.get('executionStats', {})
+    stages = list(_walk(explain.get('queryPlanner', {}).get('winningPlan', {})))
+    names = [s['stage'] for s in stages]
+    indexes = sorted({s['indexName'] for s in stages if s.get('indexName')})
+
+    returned = stats.get('nReturned', 0)
+    docs_examined = stats.get('totalDocsExamined', 0)
+    collscan = 'COLLSCAN' in names
+    return {
+        'returned': returned,
+        'docs_examined': docs_examined,
+        'keys_examined': stats.get('totalKeysExamined', 0),
+        'time_ms': stats.get('executionTimeMillis'),
+        'stages': names,
+        'indexes': indexes,
+        'collscan': collscan,
+        'in_memory_sort': 'SORT' in names,
+        'inefficient': collscan or docs_examined > max(returned, 1) * INEFFICIENT_RATIO,
+    }
+
+
+def explain_find(collection, filter, sort=None, limit=0, max_time_ms=QUERY_MAX_TIME_MS):
+    """Run ``explain('executionStats')`` for a find and summarize it.
+
+    ``sort`` is a list of (field, direction) pairs. The explained query
+    really executes, so it is bounded by ``max_time_ms``.
+    """
+    find = {'find': collection.name, 'filter': filter or {}}
+    if sort:
+        find['sort'] = dict(sort)
+    if limit:
+        find['limit'] = limit
+    explain = collection.database.command(
+        {'explain': find, 'verbosity': 'executionStats', 'maxTimeMS': max_time_ms}
+    )
+    return summarize_explain(explain)
+
+
+# ── Suggestions ─────────────────────────────────────────────────────────
+
+def _conjuncts(filter):
+    """Flatten top-level ``$and`` into a list of single-condition dicts."""
+    out = []
+    for key, value in filter.items():
+        if key == '$and':
+            for part in value:
+                out.extend(_conjuncts(part))
+        else:
+            out.append({key: value})
+    return out
+
+
+def _classify(field, cond, notes):
+    """'equality', 'range' or 'broad' for one field condition."""
+    if not isinstance(cond, dict) or not any(k.startswith('$') for k in cond):
+        return 'equality'
+    ops = set(cond) - {'$options'}
+    if ops <= _EQUALITY_OPS:
+        return 'equality'
+    if '$regex' in ops:
+        pattern = cond['$regex']
+        pattern = getattr(pattern, 'pattern', pattern)
+        if 'i' in cond.get('$options', '') or not str(pattern).startswith('^'):
+            notes.add(f"{field}: unanchored or case-insensitive $regex has to check every index key")
+            return 'broad'
+        return 'range'
+    if ops & _BOUNDED_OPS and not ops & _BROAD_OPS:
+        return 'range'
+    notes.add(f"{field}: {'/'.join(sorted(ops & _BROAD_OPS))} matches most of an index; "
+              "put it last or replace it with a positive condition")
+    return 'broad'
+
+
+def _esr_index(conjuncts, sort, notes):
+    equality, ranges, broad = [], [], []
+    for part in conjuncts:
+        (field, cond), = part.items()
+        if field in _UNINDEXABLE:
+            notes.add(f"{field} cannot use an index")
+            continue
+        kind = _classify(field, cond, notes)
+        target = {'equality': equality, 'range': ranges, 'broad': broad}[kind]
+        if field not in target:
+            target.append(field)
+
+    keys = [(f, 1) for f in equality]
+    keys += [(f, d) for f, d in (sort or []) if f not in equality]
+    for field in ranges + broad:
+        if all(field != f for f, _ in keys):
+            keys.append((field, 1))
+    return keys
+
+
+def suggest_indexes(filter, sort=None):
+    """Suggest compound indexes for ``filter`` (and ``sort`` pairs).
+
+    Returns ``{'indexes': [[(field, dir), ...], ...], 'notes': [str, ...]}``.
+    """
+    notes = set()
+    conjuncts = _conjuncts(filter or {})
+    ors = [c['$or'] for c in conjuncts if '$or' in c]
+    common = [c for c in conjuncts if '$or' not in c]
+    if len(ors) > 1:
+        notes.add('Only the first top-level $or is split into per-branch indexes')
+
+    if ors:
+        candidates = [_esr_index(common + _conjuncts(branch), sort, notes) for branch in ors[0]]
+    else:
+        candidates = [_esr_index(common, sort, notes)]
+
+    indexes = []
+    for keys in candidates:
+        if keys and keys not in indexes:
+            indexes.append(keys)
+    return {'indexes': indexes, 'notes': sorted(notes)}
+
+
+def create_index_command(collection_name, keys):
+    """``db.<coll>.createIndex({...})`` text for a suggestion."""
+    return f'db.{collection_name}.createIndex({json.dumps(dict(keys))})'
+
+
+def advise(collection, filter, sort=None, limit=0, explain=True, max_time_ms=QUERY_MAX_TIME_MS):
+    """Explain plan (optional) plus index suggestions for one query.
+
+    Suggestions are only attached when there is no plan to judge by or the
+    plan scanned the collection, sorted in memory, or examined far more
+    documents than it returned.
+    """
+    result = {'plan': None, **suggest_indexes(filter, sort)}
+    if explain:
+        result['plan'] = explain_find(collection, filter, sort, limit, max_time_ms)
+        plan = result['plan']
+        if not (plan['inefficient'] or plan['in_memory_sort']):
+            result['indexes'] = []
+    result['commands'] = [create_index_command(collection.name, keys) for keys in result['indexes']]
+    return result
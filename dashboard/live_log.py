@@ -0,0 +1,303 @@
+"""Live-log storage: the PTY output file plus a sidecar line index.
+
+The index starts with an 8-byte generation token, random per writer, then
+holds a flat array of little-endian uint64 values. Entry ``i`` is the byte
+position just past the ``i``-th newline, i.e. where line ``i + 1`` starts,
+so any line can be located with a single seek and the number of complete
+lines is simply the entry bytes divided by the entry size.
+
+Clients keep the generation next to their byte cursor. A new run rewrites
+the log under a new generation, so a cursor from the previous run is
+recognised even once the new log has grown past it.
+
+PTY output goes through ``BufferedLogWriter`` first, which strips ANSI
+escape sequences (holding back any sequence cut off at a chunk boundary)
+and coalesces small reads so the log is written in large batches.
+"""
+import os
+import re
+import struct
+import time
+
+_INDEX_ENTRY = struct.Struct('<Q')
+_GENERATION_SIZE = 8
+
+# ANSI escape sequences and carriage returns in PTY output. The 8-bit CSI
+# byte (0x9B) is deliberately not matched: in a UTF-8 stream it is a
+# continuation byte of ordinary text.
+_ANSI_ESCAPE = re.compile(
+    rb'\x1B\[[0-?]*[ -/]*[@-~]'            # CSI, e.g. colours / cursor moves
+    rb'|\x1B\][^\x07\x1B]*(?:\x07|\x1B\\)'  # OSC, e.g. window titles
+    rb'|\x1B[ -/]*[0-~]'                 # other two-byte / nF escapes
+    rb'|\x0D'
+)
+# An escape sequence that has started but not yet terminated at end of data.
+_ANSI_INCOMPLETE = re.compile(rb'\x1B(?:\[[0-?]*[ -/]*|[ -/]*)\Z')
+
+# Sequences longer than this are not real escapes — stop holding them back.
+_MAX_PENDING_ESCAPE = 4096
+
+# Flush thresholds for BufferedLogWriter.
+FLUSH_BYTES = 64 * 1024
+FLUSH_INTERVAL = 0.1  # seconds
+
+# Upper bound on the bytes returned by a single read so a client attaching
+# late to a huge log catches up over several polls instead of one giant one.
+MAX_READ_BYTES = 256 * 1024
+
+
+class LiveLogWriter:
+    """Append-only writer that keeps the log file and its line index in step."""
+
+    def __init__(self, log_path, index_path):
+        self._log_f = open(log_path, 'wb')
+        self._index_f = open(index_path, 'wb')
+        self._position = 0
+        token = os.urandom(_GENERATION_SIZE)
+        self.generation = token.hex()
+        self._index_f.write(token)
+        self._index_f.flush()
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self._log_f.write(data)
+
+        entries = []
+        nl = data.find(b'\n')
+        while nl != -1:
+            entries.append(self._position + nl + 1)
+            nl = data.find(b'\n', nl + 1)
+        if entries:
+            self._index_f.write(struct.pack(f'<{len(entries)}Q', *entries))
+
+        self._position += len(data)
+
+    def flush(self):
+        # Log first: an index entry must never point past data readers can see.
+        self._log_f.flush()
+        self._index_f.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._log_f.close()
+            self._index_f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AnsiStripper:
+    """Incremental ANSI stripper that is safe across chunk boundaries.
+
+    A sequence split between two reads (``ESC [ 3`` | ``1 m``) is held back
+    until the rest arrives instead of leaking half of it into the log.
+    """
+
+    def __init__(self):
+        self._pending = b''
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + data
+        cut = _incomplete_escape_start(data)
+        self._pending = data[cut:]
+        return _ANSI_ESCAPE.sub(b'', data[:cut])
+
+    def finish(self) -> bytes:
+        data, self._pending = self._pending, b''
+        return _ANSI_ESCAPE.sub(b'', data)
+
+
+def _incomplete_escape_start(data):
+    """Index where a trailing unterminated escape sequence starts, else len(data)."""
+    osc = data.rfind(b'\x1b]')
+    if osc != -1 and data.find(b'\x07', osc) == -1 and data.find(b'\x1b\\', osc) == -1:
+        cut = osc
+    else:
+        cut = data.rfind(b'\x1b')
+        if cut == -1 or not _ANSI_INCOMPLETE.match(data, cut):
+            return len(data)
+    if len(data) - cut > _MAX_PENDING_ESCAPE:
+        return len(data)
+    return cut
+
+
+class BufferedLogWriter:
+    """Writer stage between the PTY and ``LiveLogWriter``.
+
+    Cleaned output is coalesced in memory and written out once
+    ``max_bytes`` are pending or the oldest pending byte is ``max_delay``
+    seconds old, whichever comes first. The caller drives the time bound
+    by waiting at most ``timeout()`` for more output and then calling
+    ``flush_if_due()``.
+    """
+
+    def __init__(self, writer, max_bytes=FLUSH_BYTES, max_delay=FLUSH_INTERVAL,
+                 clock=time.monotonic):
+        self._writer = writer
+        self._stripper = AnsiStripper()
+        self._max_bytes = max_bytes
+        self._max_delay = max_delay
+        self._clock = clock
+        self._chunks = []
+        self._size = 0
+        self._oldest = None
+        self.flushes = 0
+        self.max_latency = 0.0
+
+    def feed(self, data: bytes):
+        cleaned = self._stripper.feed(data)
+        if not cleaned:
+            return
+        if self._oldest is None:
+            self._oldest = self._clock()
+        self._chunks.append(cleaned)
+        self._size += len(cleaned)
+        if self._size >= self._max_bytes:
+            self.flush()
+
+    def timeout(self):
+        """Seconds until pending output must be flushed, or None when idle."""
+        if self._oldest is None:
+            return None
+        return max(0.0, self._oldest + self._max_delay - self._clock())
+
+    def flush_if_due(self):
+        if self._oldest is not None and self._clock() - self._oldest >= self._max_delay:
+            self.flush()
+
+    def flush(self):
+        if self._oldest is None:
+            return
+        self._writer.write(b''.join(self._chunks))
+        self._writer.flush()
+        self.max_latency = max(self.max_latency, self._clock() - self._oldest)
+        self.flushes += 1
+        self._chunks = []
+        self._size = 0
+        self._oldest = None
+
+    def close(self):
+        tail = self._stripper.finish()
+        if tail:
+            if self._oldest is None:
+                self._oldest = self._clock()
+            self._chunks.append(tail)
+        try:
+            self.flush()
+        finally:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_generation(index_path):
+    """The log's generation token (hex), or None if the index is missing or not written yet."""
+    try:
+        with open(index_path, 'rb') as f:
+            token = f.read(_GENERATION_SIZE)
+    except OSError:
+        return None
+    return token.hex() if len(token) == _GENERATION_SIZE else None
+
+
+def cursor_is_stale(log_path, generation, current_generation, cursor):
+    """True if a client's ``cursor`` into the ``generation`` log belongs to an earlier run.
+
+    Either the generation changed, or (when a generation is unknown) the
+    cursor lies past the end of the current log.
+    """
+    if generation and current_generation and generation != current_generation:
+        return True
+    try:
+        return cursor > os.path.getsize(log_path)
+    except OSError:
+        return cursor > 0
+
+
+def count_lines(index_path):
+    """Number of complete lines recorded in the index, or None if it is missing."""
+    try:
+        return max(0, os.path.getsize(index_path) - _GENERATION_SIZE) // _INDEX_ENTRY.size
+    except OSError:
+        return None
+
+
+def line_to_cursor(log_path, index_path, line):
+    """Byte position where ``line`` (0-based) starts.
+
+    Uses the sidecar index when present (one seek); logs written before the
+    index existed fall back to a newline scan.
+    """
+    if line <= 0:
+        return 0
+
+    total = count_lines(index_path)
+    if total is not None:
+        line = min(line, total)
+        if line == 0:
+            return 0
+        with open(index_path, 'rb') as f:
+            f.seek(_GENERATION_SIZE + (line - 1) * _INDEX_ENTRY.size)
+            return _INDEX_ENTRY.unpack(f.read(_INDEX_ENTRY.size))[0]
+
+    position = 0
+    remaining = line
+    with open(log_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            newlines = chunk.count(b'\n')
+            if newlines < remaining:
+                remaining -= newlines
+                position += len(chunk)
+                continue
+            nl = -1
+            for _ in range(remaining):
+                nl = chunk.find(b'\n', nl + 1)
+            return position + nl + 1
+    return position
+
+
+def read_from_cursor(log_path, cursor, include_partial=False):
+    """Read complete lines starting at byte ``cursor``.
+
+    Returns ``(lines, new_cursor)``. Only newline-terminated lines are
+    returned unless ``include_partial`` is set (used once the process has
+    exited and no more output will follow), so a line is never split
+    across two polls.
+    """
+    with open(log_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if cursor > size:
+            # The log was replaced by a shorter one — start over.
+            cursor = 0
+        if cursor == size:
+            return [], cursor
+
+        f.seek(cursor)
+        data = f.read(min(size - cursor, MAX_READ_BYTES))
+
+    end = data.rfind(b'\n') + 1
+    if end == 0 and len(data) == MAX_READ_BYTES:
+        # A single line longer than the read budget — emit it in pieces.
+        end = len(data)
+    elif include_partial and cursor + len(data) == size:
+        end = len(data)
+
+    if end == 0:
+        return [], cursor
+
+    text = data[:end].decode('utf-8', errors='replace')
+    lines = text.split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines, cursor + end
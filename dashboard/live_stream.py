@@ -0,0 +1,254 @@
+"""Push stream of live-terminal output over Server-Sent Events.
+
+Each scraper being watched gets exactly one ``ScraperFeed`` per event loop.
+The feed tails the live log written by ``run_scraper_task`` and watches the
+process state, then fans every update out to all connected viewers, so the
+filesystem and database load stays flat no matter how many browsers are
+attached.
+
+Viewers that fall behind (or join late) catch up by reading the log file
+directly from their own byte cursor, then continue from the shared feed.
+A viewer whose queue overflows loses its buffered events and is sent a
+single ``resync`` instead, so it re-checks the log generation and status
+as well as the missing output.
+"""
+import asyncio
+import json
+import os
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .live_log import count_lines, cursor_is_stale, line_to_cursor, read_from_cursor, read_generation
+from .tasks import get_live_log_path, get_live_log_index_path
+
+POLL_INTERVAL = 0.25      # seconds between checks for new log output
+STATUS_INTERVAL = 2.0     # seconds between process-state checks
+KEEPALIVE_INTERVAL = 15.0  # idle seconds before a comment frame is sent
+QUEUE_SIZE = 256          # buffered events per viewer before it must re-read
+
+# event loop -> {sub_id: ScraperFeed}
+_feeds = weakref.WeakKeyDictionary()
+
+
+def _fetch_status(sub_id):
+    from .models import ScraperProcess, SubScraper
+
+    # A stream lives far longer than a request, so nothing else recycles this
+    # thread's connection: drop it when broken or past CONN_MAX_AGE, as a
+    # request would.
+    close_old_connections()
+    try:
+        is_running = ScraperProcess.objects.filter(
+            sub_scraper_id=sub_id, is_running=True
+        ).exists()
+        last_status = SubScraper.objects.filter(
+            pk=sub_id
+        ).values_list('last_run_status', flat=True).first()
+    finally:
+        close_old_connections()
+    return {
+        'is_running': is_running,
+        'status': 'running' if is_running else (last_status or 'never_run'),
+    }
+
+
+def _start_cursor(log_path, index_path):
+    """Byte position just past the last complete line in the log."""
+    if not os.path.isfile(log_path):
+        return 0
+    line = count_lines(index_path)
+    if line is None:
+        return os.path.getsize(log_path)
+    return line_to_cursor(log_path, index_path, line)
+
+
+class ScraperFeed:
+    """Single reader for one scraper's live log and status."""
+
+    def __init__(self, sub_id):
+        self.sub_id = sub_id
+        self.log_path = get_live_log_path(sub_id)
+        self.index_path = get_live_log_index_path(sub_id)
+        self.subscribers = set()
+        self.status = None
+        self.cursor = None
+        self.generation = None
+        self._task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+
+    def _broadcast(self, event, payload):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event, payload))
+            except asyncio.QueueFull:
+                # Dropping just this event could lose a reset or a status
+                # change, so replace the backlog with one resync.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(('resync', None))
+
+    async def refresh_status(self):
+        status = await sync_to_async(_fetch_status)(self.sub_id)
+        if status != self.status:
+            self.status = status
+            self._broadcast('status', status)
+        return status
+
+    async def _read_new_output(self):
+        generation = await sync_to_async(read_generation, thread_sensitive=False)(self.index_path)
+        if await sync_to_async(cursor_is_stale, thread_sensitive=False)(
+            self.log_path, self.generation, generation, self.cursor
+        ):
+            # A new run removed and recreated the log.
+            self.cursor = 0
+            self._broadcast('reset', {'generation': generation})
+        self.generation = generation or self.generation
+
+        try:
+            size = await sync_to_async(os.path.getsize, thread_sensitive=False)(self.log_path)
+        except OSError:
+            size = 0
+
+        include_partial = not (self.status or {}).get('is_running', False)
+        while size > self.cursor:
+            start = self.cursor
+            lines, cursor = await sync_to_async(read_from_cursor, thread_sensitive=False)(
+                self.log_path, start, include_partial
+            )
+            if cursor == start:
+                break
+            self.cursor = cursor
+            self._broadcast('lines', {'start': start, 'cursor': cursor, 'lines': lines,
+                                      'generation': self.generation})
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            if self.cursor is None:
+                self.generation = await sync_to_async(read_generation, thread_sensitive=False)(self.index_path)
+                self.cursor = await sync_to_async(_start_cursor, thread_sensitive=False)(
+                    self.log_path, self.index_path
+                )
+            next_status = 0.0
+            while self.subscribers:
+                if loop.time() >= next_status:
+                    await self.refresh_status()
+                    next_status = loop.time() + STATUS_INTERVAL
+                await self._read_new_output()
+                await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            feeds = _feeds.get(loop, {})
+            if feeds.get(self.sub_id) is self and not self.subscribers:
+                del feeds[self.sub_id]
+
+
+def get_feed(sub_id):
+    """Return the shared feed for ``sub_id`` on the running event loop."""
+    feeds = _feeds.setdefault(asyncio.get_running_loop(), {})
+    feed = feeds.get(sub_id)
+    if feed is None:
+        feed = feeds[sub_id] = ScraperFeed(sub_id)
+    return feed
+
+
+def _sse(event, data, event_id=None):
+    frame = f'event: {event}\n'
+    if event_id is not None:
+        frame += f'id: {event_id}\n'
+    return frame + f'data: {json.dumps(data)}\n\n'
+
+
+async def stream_events(sub_id, cursor, line, generation=None):
+    """Async generator of SSE frames for one viewer.
+
+    ``cursor``/``line`` are the byte position and line count the viewer has
+    already rendered from the log of ``generation``. Every ``lines`` frame
+    carries ``cursor:line:generation`` as its event id so a reconnecting
+    EventSource resumes where it left off.
+    """
+    feed = get_feed(sub_id)
+    queue = feed.subscribe()
+    log_path = feed.log_path
+
+    def lines_frame(lines):
+        return _sse(
+            'lines',
+            {'lines': lines, 'total': line, 'cursor': cursor, 'generation': generation},
+            f'{cursor}:{line}:{generation or ""}',
+        )
+
+    async def read_until(target):
+        nonlocal cursor, line
+        include_partial = not (feed.status or {}).get('is_running', False)
+        while target is None or cursor < target:
+            lines, new_cursor = await sync_to_async(read_from_cursor, thread_sensitive=False)(
+                log_path, cursor, include_partial
+            )
+            if new_cursor == cursor:
+                return
+            cursor, line = new_cursor, line + len(lines)
+            yield lines_frame(lines)
+
+    async def catch_up():
+        nonlocal cursor, line, generation
+        current = await sync_to_async(read_generation, thread_sensitive=False)(feed.index_path)
+        if await sync_to_async(cursor_is_stale, thread_sensitive=False)(log_path, generation, current, cursor):
+            # The viewer's position belongs to an earlier run's log.
+            cursor = line = 0
+            yield _sse('reset', {'generation': current})
+        generation = current or generation
+        async for frame in read_until(None):
+            yield frame
+
+    try:
+        last_status = feed.status or await feed.refresh_status()
+        async for frame in catch_up():
+            yield frame
+        yield _sse('status', last_status)
+
+        while True:
+            try:
+                event, payload = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            if event == 'resync':
+                async for frame in catch_up():
+                    yield frame
+                if feed.status != last_status:
+                    last_status = feed.status
+                    yield _sse('status', last_status)
+            elif event == 'reset':
+                cursor = line = 0
+                generation = payload['generation']
+                yield _sse('reset', payload)
+            elif event == 'status':
+                if payload != last_status:
+                    last_status = payload
+                    yield _sse('status', payload)
+            elif event == 'lines':
+                if payload['cursor'] <= cursor:
+                    continue
+                generation = payload['generation'] or generation
+                if payload['start'] == cursor:
+                    cursor, line = payload['cursor'], line + len(payload['lines'])
+                    yield lines_frame(payload['lines'])
+                else:
+                    async for frame in read_until(payload['cursor']):
+                        yield frame
+    finally:
+        feed.unsubscribe(queue)
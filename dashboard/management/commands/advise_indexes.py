@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pymongo.errors import PyMongoError
+
+from crunchbase import queries as crunchbase_queries
+from dashboard.index_advisor import advise
+from dashboard.mongo import get_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain the work-selection filters hard-coded in the Crunchbase "
+        "scrapers and suggest indexes for those that scan too much."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uri', default=os.environ.get('SCRAPER_MONGO_URI', settings.MONGO_URI),
+            help='MongoDB URI (default: SCRAPER_MONGO_URI, then MONGO_URI)',
+        )
+        parser.add_argument(
+            '--db', default=crunchbase_queries.DB_NAME,
+            help=f'Database name (default: {crunchbase_queries.DB_NAME})',
+        )
+        parser.add_argument(
+            '--scraper', choices=['update', 'new'],
+            help='Only the queries of this scraper (default: both)',
+        )
+        parser.add_argument(
+            '--no-explain', action='store_true',
+            help='Print suggestions from the filters alone, without contacting MongoDB',
+        )
+
+    def handle(self, *args, **options):
+        explain = not options['no_explain']
+        db = get_client(options['uri'])[options['db']]
+
+        for query in crunchbase_queries.advisor_queries(timezone.now()):
+            if options['scraper'] and query['scraper'] != options['scraper']:
+                continue
+            collection = db[query['collection']]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"[{query['scraper']}] {query['label']} — {query['collection']}"
+            ))
+            try:
+                result = advise(collection, query['filter'], query['sort'], explain=explain)
+            except PyMongoError as e:
+                self.stdout.write(self.style.ERROR(f'  explain failed: {e}'))
+                continue
+
+            plan = result['plan']
+            if plan:
+                line = (
+                    f"  {'COLLSCAN' if plan['collscan'] else 'index ' + (', '.join(plan['indexes']) or '-')}: "
+                    f"examined {plan['docs_examined']} docs / {plan['keys_examined']} keys, "
+                    f"returned {plan['returned']}, {plan['time_ms']} ms"
+                )
+                self.stdout.write(self.style.WARNING(line) if plan['inefficient'] else line)
+            for command in result['commands']:
+                self.stdout.write(f'  suggest: {command}')
+            for note in result['notes']:
+                self.stdout.write(f'  note: {note}')
+            if plan and not result['commands']:
+                self.stdout.write(self.style.SUCCESS('  plan looks fine'))
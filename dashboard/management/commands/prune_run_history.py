@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard.retention import rollup_and_prune
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll run history older than the retention period up into daily "
+        "aggregates and delete the raw rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.RUN_HISTORY_RETENTION_DAYS,
+            help='Keep raw runs for this many days (default: RUN_HISTORY_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be rolled up without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        result = rollup_and_prune(retention_days=options['days'], dry_run=options['dry_run'])
+        verb = 'Would roll up' if options['dry_run'] else 'Rolled up'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['runs']} run(s) into {result['days']} daily row(s) "
+            f"(runs started before {result['cutoff']:%Y-%m-%d %H:%M %Z})."
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.models import SubScraper
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each sub-scraper's denormalized latest run (pointer, status "
+        "and timestamps) from its run history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sub_ids', nargs='*', type=int,
+            help='Only rebuild these sub-scraper IDs (default: all)',
+        )
+
+    def handle(self, *args, **options):
+        subs = SubScraper.objects.all()
+        if options['sub_ids']:
+            subs = subs.filter(pk__in=options['sub_ids'])
+
+        changed = 0
+        total = 0
+        for sub in subs.iterator():
+            before = (sub.latest_run_id, sub.last_run_status, sub.last_run_started_at, sub.last_run_ended_at)
+            sub.refresh_latest_run()
+            after = (sub.latest_run_id, sub.last_run_status, sub.last_run_started_at, sub.last_run_ended_at)
+            total += 1
+            if before != after:
+                changed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt latest run for {total} sub-scraper(s), {changed} changed.'
+        ))
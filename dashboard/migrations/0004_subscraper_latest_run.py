@@ -0,0 +1,52 @@
+# Generated by Django 5.2.11 on 2026-10-17 01:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_latest_run(apps, schema_editor):
+    SubScraper = apps.get_model('dashboard', 'SubScraper')
+    ScraperRunHistory = apps.get_model('dashboard', 'ScraperRunHistory')
+    for sub in SubScraper.objects.all().iterator():
+        run = ScraperRunHistory.objects.filter(
+            sub_scraper=sub
+        ).order_by('-started_at', '-id').first()
+        if run is None:
+            continue
+        SubScraper.objects.filter(pk=sub.pk).update(
+            latest_run=run,
+            last_run_status=run.status,
+            last_run_started_at=run.started_at,
+            last_run_ended_at=run.ended_at,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_scraperconfig_scraperaccount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscraper',
+            name='last_run_ended_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscraper',
+            name='last_run_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscraper',
+            name='last_run_status',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='subscraper',
+            name='latest_run',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dashboard.scraperrunhistory'),
+        ),
+        migrations.RunPython(backfill_latest_run, migrations.RunPython.noop),
+    ]
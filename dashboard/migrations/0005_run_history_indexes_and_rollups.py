@@ -0,0 +1,55 @@
+# Generated by Django 5.2.11 on 2026-10-17 01:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_subscraper_latest_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScraperRunDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_runs', models.IntegerField(default=0)),
+                ('success_runs', models.IntegerField(default=0)),
+                ('failed_runs', models.IntegerField(default=0)),
+                ('running_runs', models.IntegerField(default=0, help_text='Runs still marked running when pruned')),
+                ('duration_count', models.IntegerField(default=0)),
+                ('duration_sum', models.FloatField(default=0)),
+                ('duration_min', models.FloatField(blank=True, null=True)),
+                ('duration_max', models.FloatField(blank=True, null=True)),
+                ('records_inserted', models.BigIntegerField(default=0)),
+                ('last_success_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='scraperrunhistory',
+            index=models.Index(fields=['sub_scraper', '-started_at'], name='run_sub_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scraperrunhistory',
+            index=models.Index(fields=['sub_scraper', 'status', '-started_at'], name='run_sub_status_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scraperrunhistory',
+            index=models.Index(fields=['started_at'], name='run_started_idx'),
+        ),
+        migrations.AddField(
+            model_name='scraperrundaily',
+            name='sub_scraper',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_runs', to='dashboard.subscraper'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='scraperrundaily',
+            unique_together={('sub_scraper', 'day')},
+        ),
+    ]
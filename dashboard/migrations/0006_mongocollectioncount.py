@@ -0,0 +1,31 @@
+# Generated by Django 5.2.11 on 2026-10-17 01:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_run_history_indexes_and_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MongoCollectionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mongo_uri', models.CharField(max_length=500)),
+                ('db_name', models.CharField(max_length=200)),
+                ('collection_name', models.CharField(max_length=200)),
+                ('count', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('counted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('mongo_uri', 'db_name', 'collection_name')},
+            },
+        ),
+    ]
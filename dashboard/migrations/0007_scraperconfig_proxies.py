@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_mongocollectioncount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scraperconfig',
+            name='proxies',
+            field=models.TextField(blank=True, help_text="One proxy per line (host:port or URL); blank = the scrapers' defaults"),
+        ),
+    ]
@@ -1,8 +1,34 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.conf import settings
 
 
+class MainScraperQuerySet(models.QuerySet):
+    def with_health(self):
+        """Annotate the counts ``health_status`` needs, for every group at once.
+
+        Each count is a correlated subquery over the group's active
+        sub-scrapers, keyed on their cached latest-run status, so the whole
+        list is coloured by a single SELECT.
+        """
+        active = SubScraper.objects.filter(main_scraper=OuterRef('pk'), is_active=True)
+
+        def count(subs):
+            counted = subs.order_by().values('main_scraper').annotate(n=Count('pk')).values('n')
+            return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+        return self.annotate(
+            num_sub_scrapers=count(SubScraper.objects.filter(main_scraper=OuterRef('pk'))),
+            health_active=count(active),
+            health_ran=count(active.exclude(last_run_status='')),
+            health_failed=count(active.filter(last_run_status='failed')),
+            health_running=count(active.filter(last_run_status='running')),
+            health_success=count(active.filter(last_run_status='success')),
+        )
+
+
 class MainScraper(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -21,6 +47,8 @@ class MainScraper(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
+    objects = MainScraperQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
@@ -38,12 +66,12 @@ class MainScraper(models.Model):
         return self.mongo_db_name.strip() or settings.MONGO_DEFAULT_DB
 
     def get_mongo_client(self):
-        """Returns a PyMongo MongoClient for this scraper group's database."""
-        import pymongo
-        return pymongo.MongoClient(
-            self.get_effective_mongo_uri(),
-            serverSelectionTimeoutMS=5000
-        )
+        """Returns the shared, pooled MongoClient for this group's URI.
+
+        The client belongs to ``dashboard.mongo``'s registry — do not close it.
+        """
+        from .mongo import get_client
+        return get_client(self.get_effective_mongo_uri())
 
     def get_mongo_db(self):
         """Returns the PyMongo Database object for this scraper group."""
@@ -52,20 +80,32 @@ class MainScraper(models.Model):
 
     @property
     def sub_scrapers_count(self):
+        if 'num_sub_scrapers' in self.__dict__:
+            return self.num_sub_scrapers
         return self.sub_scrapers.count()
 
     @property
     def health_status(self):
         """Returns green/yellow/red/gray based on last run status of sub scrapers."""
+        if 'health_active' in self.__dict__:
+            # Loaded via with_health(): same rules, applied to the counts
+            if not self.health_active or not self.health_ran:
+                return 'gray'
+            if self.health_failed:
+                return 'red'
+            if self.health_running:
+                return 'green'
+            if self.health_success == self.health_ran:
+                return 'green'
+            return 'yellow'
+
         sub_scrapers = self.sub_scrapers.filter(is_active=True)
         if not sub_scrapers.exists():
             return 'gray'
 
-        statuses = []
-        for sub in sub_scrapers:
-            last_run = sub.run_history.order_by('-started_at').first()
-            if last_run:
-                statuses.append(last_run.status)
+        statuses = [
+            status for status in sub_scrapers.values_list('last_run_status', flat=True) if status
+        ]
 
         if not statuses:
             return 'gray'
@@ -78,6 +118,16 @@ class MainScraper(models.Model):
         return 'yellow'
 
 
+class SubScraperQuerySet(models.QuerySet):
+    def with_status(self):
+        """Join the latest run, process and schedule in the same query.
+
+        ``current_status``, ``last_run`` and ``is_stale`` can then be read
+        for every row without another round trip to the database.
+        """
+        return self.select_related('main_scraper', 'process', 'schedule', 'latest_run')
+
+
 class SubScraper(models.Model):
     main_scraper = models.ForeignKey(MainScraper, on_delete=models.CASCADE, related_name='sub_scrapers')
     name = models.CharField(max_length=200)
@@ -97,6 +147,19 @@ class SubScraper(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # ── Latest run, denormalized ─────────────────────────────────────────
+    # Kept in step by ScraperRunHistory.save(); rebuild with
+    # `manage.py rebuild_latest_runs` if run rows were changed in bulk.
+    latest_run = models.ForeignKey(
+        'ScraperRunHistory', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', editable=False,
+    )
+    last_run_status = models.CharField(max_length=20, blank=True, editable=False)
+    last_run_started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_run_ended_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = SubScraperQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
 
@@ -119,27 +182,40 @@ class SubScraper(models.Model):
         process = getattr(self, 'process', None)
         if process and process.is_running:
             return 'running'
-        last_run = self.run_history.order_by('-started_at').first()
-        if not last_run:
-            return 'never_run'
-        return last_run.status
+        return self.last_run_status or 'never_run'
 
     @property
     def last_run(self):
-        return self.run_history.order_by('-started_at').first()
+        return self.latest_run
 
     @property
     def is_stale(self):
         """True if last run was more than 24 hours ago and has an active schedule."""
-        last_run = self.last_run
-        if not last_run:
+        if not self.last_run_started_at:
             return False
         schedule = getattr(self, 'schedule', None)
         if schedule and schedule.is_enabled:
-            delta = timezone.now() - last_run.started_at
+            delta = timezone.now() - self.last_run_started_at
             return delta.total_seconds() > 86400
         return False
 
+    def refresh_latest_run(self):
+        """Recompute the denormalized latest-run fields from run history."""
+        latest = self.run_history.order_by('-started_at', '-id').first()
+        SubScraper.objects.filter(pk=self.pk).update(**_latest_run_fields(latest))
+        self.refresh_from_db(fields=[
+            'latest_run', 'last_run_status', 'last_run_started_at', 'last_run_ended_at',
+        ])
+
+
+def _latest_run_fields(run):
+    return {
+        'latest_run': run,
+        'last_run_status': run.status if run else '',
+        'last_run_started_at': run.started_at if run else None,
+        'last_run_ended_at': run.ended_at if run else None,
+    }
+
 
 class ScraperSchedule(models.Model):
     sub_scraper = models.OneToOneField(SubScraper, on_delete=models.CASCADE, related_name='schedule')
@@ -174,10 +250,63 @@ class ScraperRunHistory(models.Model):
 
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['sub_scraper', '-started_at'], name='run_sub_started_idx'),
+            models.Index(fields=['sub_scraper', 'status', '-started_at'], name='run_sub_status_started_idx'),
+            models.Index(fields=['started_at'], name='run_started_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sub_scraper.name} - {self.status} @ {self.started_at}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Point the sub-scraper at this run unless a newer one is already
+            # recorded. A single conditional UPDATE, so concurrent writers
+            # cannot move the pointer backwards.
+            SubScraper.objects.filter(pk=self.sub_scraper_id).filter(
+                Q(latest_run__isnull=True)
+                | Q(latest_run=self)
+                | Q(last_run_started_at__lte=self.started_at)
+            ).update(**_latest_run_fields(self))
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            sub = SubScraper.objects.filter(pk=self.sub_scraper_id).first()
+            if sub and sub.latest_run_id is None:
+                sub.refresh_latest_run()
+            return result
+
+
+class ScraperRunDaily(models.Model):
+    """Per-day aggregate of runs that have aged out of ScraperRunHistory.
+
+    Written by ``dashboard.retention.rollup_and_prune``; a day may be
+    rolled up in several passes, so every column is additive (or a
+    min/max) and merges cleanly.
+    """
+    sub_scraper = models.ForeignKey(SubScraper, on_delete=models.CASCADE, related_name='daily_runs')
+    day = models.DateField()
+    total_runs = models.IntegerField(default=0)
+    success_runs = models.IntegerField(default=0)
+    failed_runs = models.IntegerField(default=0)
+    running_runs = models.IntegerField(default=0, help_text="Runs still marked running when pruned")
+    duration_count = models.IntegerField(default=0)
+    duration_sum = models.FloatField(default=0)
+    duration_min = models.FloatField(null=True, blank=True)
+    duration_max = models.FloatField(null=True, blank=True)
+    records_inserted = models.BigIntegerField(default=0)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ['sub_scraper', 'day']
+
+    def __str__(self):
+        return f"{self.sub_scraper.name} @ {self.day}: {self.total_runs} runs"
+
 
 class ScraperProcess(models.Model):
     sub_scraper = models.OneToOneField(SubScraper, on_delete=models.CASCADE, related_name='process')
@@ -246,12 +375,22 @@ class ScraperConfig(models.Model):
         max_length=500, blank=True, help_text="Base path for log output"
     )
 
+    # Proxies
+    proxies = models.TextField(
+        blank=True, help_text="One proxy per line (host:port or URL); blank = the scrapers' defaults"
+    )
+
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Config for {self.main_scraper.name}"
 
+    def get_proxy_list(self):
+        """Configured proxies, one per line; blank lines and # comments are ignored."""
+        lines = (line.split('#', 1)[0].strip() for line in self.proxies.splitlines())
+        return [line for line in lines if line]
+
     def get_distribution(self, active_count):
         """Calculate update/new account split based on config."""
         if self.update_account_count > 0 or self.new_account_count > 0:
@@ -262,3 +401,37 @@ class ScraperConfig(models.Model):
         update = int(active_count * self.update_ratio)
         new = active_count - update
         return {'update': update, 'new': new}
+
+
+class MongoCollectionCount(models.Model):
+    """Exact document count of a Mongo collection, computed in the background.
+
+    ``count_documents({})`` scans the whole collection, so the Mongo panel
+    never runs it inline; it queues ``count_collection_documents_task`` and
+    shows the last stored result.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    mongo_uri = models.CharField(max_length=500)
+    db_name = models.CharField(max_length=200)
+    collection_name = models.CharField(max_length=200)
+    count = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(default=timezone.now)
+    counted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['mongo_uri', 'db_name', 'collection_name']
+
+    def __str__(self):
+        return f"{self.db_name}.{self.collection_name}: {self.count}"
+
+    @property
+    def in_progress(self):
+        return self.status in ('pending', 'running')
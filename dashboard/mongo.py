@@ -0,0 +1,400 @@
+"""Process-wide registry of pooled MongoClients, keyed by connection URI.
+
+A ``MongoClient`` is expensive to create (server discovery, TLS handshake,
+SCRAM auth) but thread-safe and internally pooled, so each process keeps
+one per distinct URI and every model helper borrows it from here.
+
+* Clients are never closed by callers; the registry owns them.
+* A client not checked out for ``IDLE_TIMEOUT`` seconds is closed and
+  dropped the next time the registry is used, so URIs of deleted or
+  re-pointed scraper groups do not keep monitor threads alive forever.
+* Clients must not cross ``fork()`` (Celery prefork workers fork after
+  Django has loaded). The child forgets the parent's clients without
+  touching them and builds its own on first use.
+
+Collection statistics for the Mongo panel also live here: cheap metadata
+(``estimated_document_count`` + ``$collStats``) cached per
+(uri, db, collection), with exact counts done by a background task,
+along with the BSON → JSON conversion and keyset-paged queries the panel
+and ``/api/mongo-query/`` use.
+"""
+import base64
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import bson
+import pymongo
+from bson import Binary, Code, DBRef, Decimal128, MaxKey, MinKey, ObjectId, Regex, Timestamp, json_util
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
+from bson.raw_bson import RawBSONDocument
+from django.core.cache import cache
+from django.utils import timezone
+
+# Seconds a client may go unused before the registry closes it
+IDLE_TIMEOUT = 600
+
+# Passed to every MongoClient the registry creates
+CLIENT_OPTIONS = {
+    'serverSelectionTimeoutMS': 5000,
+    # Release pooled sockets that sit idle, independent of client eviction
+    'maxIdleTimeMS': 300_000,
+}
+
+_lock = threading.Lock()
+_clients = {}  # uri -> [client, last_checkout]
+_pid = os.getpid()
+
+
+def _forget_after_fork():
+    """Drop (without closing) clients inherited from the parent process."""
+    global _lock, _clients, _pid
+    _lock = threading.Lock()
+    _clients = {}
+    _pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_after_fork)
+
+
+def get_client(uri):
+    """Return the shared ``MongoClient`` for ``uri``, creating it if needed."""
+    if os.getpid() != _pid:
+        _forget_after_fork()
+
+    now = time.monotonic()
+    with _lock:
+        _evict_idle(now, keep=uri)
+        entry = _clients.get(uri)
+        if entry is None:
+            entry = _clients[uri] = [pymongo.MongoClient(uri, **CLIENT_OPTIONS), now]
+        entry[1] = now
+        return entry[0]
+
+
+def _evict_idle(now, keep=None):
+    for uri, (client, last_checkout) in list(_clients.items()):
+        if uri != keep and now - last_checkout > IDLE_TIMEOUT:
+            del _clients[uri]
+            client.close()
+
+
+def evict_idle():
+    """Close clients idle for longer than ``IDLE_TIMEOUT``."""
+    with _lock:
+        _evict_idle(time.monotonic())
+
+
+def close_all():
+    """Close every registered client (e.g. on worker shutdown)."""
+    with _lock:
+        clients = [client for client, _ in _clients.values()]
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+# ── BSON → JSON ─────────────────────────────────────────────────────────
+#
+# One table maps each BSON/Python type to its JSON-safe form. It drives two
+# paths that produce identical output:
+#
+# * ``decode_json_safe(raw)`` hands the table to the C BSON decoder as a
+#   TypeRegistry, so raw bytes from the server become JSON-safe values in a
+#   single pass, with no intermediate ObjectId/datetime-bearing dicts and no
+#   Python-level tree walk. Collections opened with ``JSON_SAFE_OPTIONS``
+#   return documents this way.
+# * ``mongo_safe(obj)`` converts values that were already decoded, looking
+#   converters up by exact type instead of chained isinstance checks.
+
+def _decimal_to_float(value):
+    return float(value.to_decimal())
+
+
+def _objectid_to_str(oid):
+    return oid.binary.hex()
+
+
+_TO_JSON = {
+    ObjectId: _objectid_to_str,
+    datetime.datetime: datetime.datetime.isoformat,
+    Decimal128: _decimal_to_float,
+    Binary: bytes.hex,
+    bytes: bytes.hex,
+    Regex: str,
+    Code: str,
+    DBRef: str,
+    Timestamp: str,
+    MinKey: str,
+    MaxKey: str,
+}
+
+
+def _json_safe_decoder(bson_type, convert):
+    # The registry calls transform_bson directly, so bind the converter itself
+    return type(f'{bson_type.__name__}JSONDecoder', (TypeDecoder,), {
+        'bson_type': bson_type,
+        'transform_bson': staticmethod(convert),
+    })()
+
+
+JSON_SAFE_OPTIONS = CodecOptions(
+    type_registry=TypeRegistry([_json_safe_decoder(t, f) for t, f in _TO_JSON.items()])
+)
+RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def decode_json_safe(data):
+    """Decode one raw BSON document straight into JSON-serializable values."""
+    return bson.decode(data, codec_options=JSON_SAFE_OPTIONS)
+
+
+def raw_to_json(data, **dumps_kwargs):
+    """Serialize one raw BSON document to JSON text (same format as ``mongo_safe``)."""
+    return json.dumps(decode_json_safe(data), **dumps_kwargs)
+
+
+def _dict_to_json(obj):
+    return {k: mongo_safe(v) for k, v in obj.items()}
+
+
+def _list_to_json(obj):
+    return [mongo_safe(i) for i in obj]
+
+
+_TO_JSON.update({
+    dict: _dict_to_json,
+    list: _list_to_json,
+    datetime.date: datetime.date.isoformat,
+    uuid.UUID: str,
+    RawBSONDocument: lambda raw: decode_json_safe(raw.raw),
+})
+_PRIMITIVES = frozenset({str, int, float, bool, type(None)})
+
+
+def _converter_for(cls):
+    """Resolve (and memoise) the converter for a subclass, e.g. SON or Int64."""
+    for base in cls.__mro__[1:]:
+        if base in _PRIMITIVES:
+            convert = _identity
+            break
+        if base in _TO_JSON:
+            convert = _TO_JSON[base]
+            break
+    else:
+        # Anything exotic is shown by its repr-ish string form
+        convert = str
+    _TO_JSON[cls] = convert
+    return convert
+
+
+def _identity(value):
+    return value
+
+
+def mongo_safe(obj):
+    """Recursively convert MongoDB/BSON types to JSON-serializable Python types.
+    Handles: ObjectId, datetime, Decimal128, bytes, and any other exotic type.
+    """
+    cls = type(obj)
+    if cls in _PRIMITIVES:
+        return obj
+    convert = _TO_JSON.get(cls) or _converter_for(cls)
+    return convert(obj)
+
+
+# ── Collection statistics ───────────────────────────────────────────────
+
+# Seconds cached collection stats stay fresh
+STATS_TTL = 60
+# Server-side budget for each stats command
+STATS_MAX_TIME_MS = 2000
+
+
+def _stats_cache_key(uri, db_name, collection_name):
+    digest = hashlib.sha1(f'{uri}\0{db_name}\0{collection_name}'.encode()).hexdigest()
+    return f'mongo-stats:{digest}'
+
+
+def _fetch_collection_stats(collection):
+    # Metadata-only: neither call scans documents
+    stats = {
+        'estimated_count': collection.estimated_document_count(maxTimeMS=STATS_MAX_TIME_MS),
+        'size': None,
+        'storage_size': None,
+        'avg_obj_size': None,
+        'index_size': None,
+        'nindexes': None,
+    }
+    try:
+        # One document per shard; sum them up
+        shards = list(collection.aggregate(
+            [{'$collStats': {'storageStats': {}}}], maxTimeMS=STATS_MAX_TIME_MS
+        ))
+    except pymongo.errors.PyMongoError:
+        shards = []
+    if shards:
+        storage = [shard.get('storageStats', {}) for shard in shards]
+        stats['size'] = sum(s.get('size', 0) for s in storage)
+        stats['storage_size'] = sum(s.get('storageSize', 0) for s in storage)
+        stats['index_size'] = sum(s.get('totalIndexSize', 0) for s in storage)
+        stats['nindexes'] = max(s.get('nindexes', 0) for s in storage)
+        count = sum(s.get('count', 0) for s in storage)
+        stats['avg_obj_size'] = stats['size'] / count if count else 0
+    return stats
+
+
+def get_collection_stats(uri, db_name, collection_name, refresh=False):
+    """Estimated count and storage stats for a collection, cached for ``STATS_TTL``."""
+    key = _stats_cache_key(uri, db_name, collection_name)
+    stats = None if refresh else cache.get(key)
+    if stats is None:
+        collection = get_client(uri)[db_name][collection_name]
+        stats = _fetch_collection_stats(collection)
+        stats['fetched_at'] = timezone.now()
+        cache.set(key, stats, STATS_TTL)
+    return stats
+
+
+# ── Paged queries ───────────────────────────────────────────────────────
+
+MAX_PAGE_SIZE = 100
+# Server-side execution budget per page
+QUERY_MAX_TIME_MS = 5000
+# Raw BSON bytes a single page may carry; the page ends early once crossed
+PAGE_BYTE_BUDGET = 1024 * 1024
+# Documents larger than this are replaced by a stub in the results
+MAX_DOC_BYTES = 256 * 1024
+
+
+class QueryError(ValueError):
+    """Invalid query input (bad JSON, unsupported sort, bad cursor)."""
+
+
+def parse_json_arg(text, default, name):
+    """Parse a user-supplied MongoDB Extended JSON object (``{"$oid": ...}`` etc.)."""
+    if not text or not text.strip():
+        return default
+    try:
+        value = json_util.loads(text)
+    except (ValueError, TypeError) as exc:
+        raise QueryError(f"Invalid JSON in {name}: {exc}")
+    if not isinstance(value, dict):
+        raise QueryError(f"{name} must be a JSON object")
+    return value
+
+
+def keyset_sort(sort):
+    """Normalise a sort spec into ``[(field, dir), ('_id', dir)]``.
+
+    Keyset paging needs a total order, so at most one field besides
+    ``_id`` is allowed and ``_id`` is appended as the tie-breaker.
+    """
+    keys = [(field, -1 if direction in (-1, '-1', 'desc') else 1) for field, direction in sort.items()]
+    fields = [field for field, _ in keys if field != '_id']
+    if len(fields) > 1:
+        raise QueryError('Sort by at most one field besides _id')
+    if not keys:
+        return [('_id', -1)]
+    if fields:
+        field_dir = dict(keys)[fields[0]]
+        return [(fields[0], field_dir), ('_id', dict(keys).get('_id', field_dir))]
+    return [('_id', keys[0][1])]
+
+
+def _lookup(doc, dotted):
+    for part in dotted.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def encode_cursor(doc, sort_keys):
+    values = [_lookup(doc, field) for field, _ in sort_keys]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def _after_cursor(token, sort_keys):
+    """Filter selecting documents strictly after ``token`` in sort order."""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, TypeError):
+        raise QueryError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(sort_keys):
+        raise QueryError('Invalid cursor')
+
+    ops = [('$gt' if direction == 1 else '$lt') for _, direction in sort_keys]
+    if len(sort_keys) == 1:
+        return {'_id': {ops[0]: values[0]}}
+    field = sort_keys[0][0]
+    return {'$or': [
+        {field: {ops[0]: values[0]}},
+        {field: values[0], '_id': {ops[1]: values[1]}},
+    ]}
+
+
+def _projection_with_sort_keys(projection, sort_keys):
+    """Make sure the fields the cursor is built from come back."""
+    if not projection:
+        return None
+    projection = dict(projection)
+    inclusive = any(v not in (0, False) for k, v in projection.items() if k != '_id')
+    for field, _ in sort_keys:
+        if inclusive:
+            projection[field] = 1
+        else:
+            projection.pop(field, None)
+    return projection
+
+
+def query_page(collection, filter=None, projection=None, sort=None, cursor=None,
+               page_size=25, max_time_ms=QUERY_MAX_TIME_MS):
+    """Fetch one page of results using ``_id``-anchored keyset paging.
+
+    Returns ``{'documents', 'next_cursor', 'bytes', 'truncated'}``.
+    ``next_cursor`` is an opaque token for the following page (None at the
+    end). Documents are fetched as raw BSON so the page's byte budget is
+    enforced before anything is decoded; documents over ``MAX_DOC_BYTES``
+    are returned as ``{"_id": ..., "_truncated_bytes": n}``.
+    """
+    sort_keys = keyset_sort(sort or {})
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    max_time_ms = max(1, min(int(max_time_ms), QUERY_MAX_TIME_MS))
+
+    query = dict(filter or {})
+    if cursor:
+        after = _after_cursor(cursor, sort_keys)
+        query = {'$and': [query, after]} if query else after
+
+    raw = collection.with_options(codec_options=RAW_OPTIONS)
+    results = raw.find(
+        query, _projection_with_sort_keys(projection, sort_keys),
+        sort=sort_keys, limit=page_size + 1, batch_size=page_size + 1,
+    ).max_time_ms(max_time_ms)
+
+    documents, used, last, more = [], 0, None, False
+    for doc in results:
+        if len(documents) == page_size or (documents and used + len(doc.raw) > PAGE_BYTE_BUDGET):
+            more = True
+            break
+        used += len(doc.raw)
+        last = doc
+        if len(doc.raw) > MAX_DOC_BYTES:
+            documents.append({'_id': mongo_safe(doc['_id']), '_truncated_bytes': len(doc.raw)})
+        else:
+            documents.append(decode_json_safe(doc.raw))
+    results.close()
+
+    return {
+        'documents': documents,
+        # The cursor needs the native BSON values (ObjectId, datetime, ...)
+        'next_cursor': encode_cursor(bson.decode(last.raw), sort_keys) if more else None,
+        'bytes': used,
+        'truncated': any('_truncated_bytes' in d for d in documents),
+    }
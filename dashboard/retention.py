@@ -0,0 +1,116 @@
+"""Run-history retention: roll aged runs up into daily aggregates, then prune.
+
+Raw ``ScraperRunHistory`` rows older than ``RUN_HISTORY_RETENTION_DAYS`` are
+summarised into one ``ScraperRunDaily`` row per sub-scraper and day, and
+then deleted. The cutoff is aligned to local midnight so a day is never
+split between the raw table and its rollup. Each sub-scraper's latest run
+is always kept, however old, because ``SubScraper.latest_run`` points at it.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ScraperRunDaily, ScraperRunHistory, SubScraper
+
+
+def retention_cutoff(retention_days=None, now=None):
+    """Local midnight ``retention_days`` ago; runs started before it age out."""
+    if retention_days is None:
+        retention_days = settings.RUN_HISTORY_RETENTION_DAYS
+    local = timezone.localtime(now or timezone.now())
+    return (local - timedelta(days=retention_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def expired_runs(cutoff):
+    latest_ids = SubScraper.objects.filter(latest_run__isnull=False).values('latest_run')
+    return ScraperRunHistory.objects.filter(started_at__lt=cutoff).exclude(pk__in=latest_ids)
+
+
+def _merge(daily, row):
+    daily.total_runs += row['total']
+    daily.success_runs += row['success']
+    daily.failed_runs += row['failed']
+    daily.running_runs += row['running']
+    daily.duration_count += row['duration_count']
+    daily.duration_sum += row['duration_sum'] or 0
+    daily.records_inserted += row['records'] or 0
+    for field, value, pick in [
+        ('duration_min', row['duration_min'], min),
+        ('duration_max', row['duration_max'], max),
+        ('last_success_at', row['last_success'], max),
+    ]:
+        current = getattr(daily, field)
+        if value is not None:
+            setattr(daily, field, value if current is None else pick(current, value))
+
+
+def rollup_and_prune(retention_days=None, now=None, dry_run=False):
+    """Fold expired runs into ``ScraperRunDaily`` and delete them.
+
+    Returns ``{'cutoff', 'runs', 'days'}``: the cutoff used, the number of
+    raw runs rolled up (and deleted unless ``dry_run``) and the number of
+    daily rows they landed in.
+    """
+    cutoff = retention_cutoff(retention_days, now)
+
+    with transaction.atomic():
+        runs = expired_runs(cutoff)
+        last_id = runs.aggregate(last_id=Max('id'))['last_id']
+        if last_id is None:
+            return {'cutoff': cutoff, 'runs': 0, 'days': 0}
+        # Freeze the batch so runs written meanwhile are neither counted nor deleted
+        runs = runs.filter(id__lte=last_id)
+
+        rows = list(
+            runs.annotate(day=TruncDate('started_at'))
+            .values('sub_scraper_id', 'day')
+            .annotate(
+                total=Count('id'),
+                success=Count('id', filter=Q(status='success')),
+                failed=Count('id', filter=Q(status='failed')),
+                running=Count('id', filter=Q(status='running')),
+                duration_count=Count('duration_seconds'),
+                duration_sum=Sum('duration_seconds'),
+                duration_min=Min('duration_seconds'),
+                duration_max=Max('duration_seconds'),
+                records=Sum('records_inserted'),
+                last_success=Max('started_at', filter=Q(status='success')),
+            )
+            .order_by()
+        )
+        total = sum(row['total'] for row in rows)
+        if dry_run:
+            return {'cutoff': cutoff, 'runs': total, 'days': len(rows)}
+
+        existing = {
+            (daily.sub_scraper_id, daily.day): daily
+            for daily in ScraperRunDaily.objects.select_for_update().filter(
+                sub_scraper_id__in={row['sub_scraper_id'] for row in rows},
+                day__in={row['day'] for row in rows},
+            )
+        }
+        to_create, to_update = [], []
+        for row in rows:
+            key = (row['sub_scraper_id'], row['day'])
+            daily = existing.get(key)
+            if daily is None:
+                daily = ScraperRunDaily(sub_scraper_id=key[0], day=key[1])
+                to_create.append(daily)
+            else:
+                to_update.append(daily)
+            _merge(daily, row)
+
+        ScraperRunDaily.objects.bulk_create(to_create)
+        if to_update:
+            ScraperRunDaily.objects.bulk_update(to_update, [
+                'total_runs', 'success_runs', 'failed_runs', 'running_runs',
+                'duration_count', 'duration_sum', 'duration_min', 'duration_max',
+                'records_inserted', 'last_success_at',
+            ])
+        runs.delete()
+
+    return {'cutoff': cutoff, 'runs': total, 'days': len(rows)}
@@ -0,0 +1,62 @@
+"""Run-history statistics computed in the database.
+
+Every figure comes from aggregates, never from loading run rows into
+Python, so the cost is two queries for ten runs or a hundred thousand:
+one aggregate over the daily rollups and one over the raw runs still in
+retention. The percentiles are part of the second one: a CUME_DIST()
+window ranks the durations and the p-th percentile is the smallest
+duration whose cumulative share reaches p (the nearest-rank definition).
+"""
+from django.conf import settings
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Q, Sum, Value, When, Window
+from django.db.models.functions import CumeDist
+
+
+def run_history_stats(sub):
+    """Summary figures for the run history page of ``sub``.
+
+    Totals, success rate, average duration, records and last success
+    cover the full history (rollups + raw runs). Percentiles need the
+    individual durations, so they describe the raw runs still within
+    ``RUN_HISTORY_RETENTION_DAYS``.
+    """
+    rolled = sub.daily_runs.aggregate(
+        total=Sum('total_runs'),
+        success=Sum('success_runs'),
+        duration_count=Sum('duration_count'),
+        duration_sum=Sum('duration_sum'),
+        records=Sum('records_inserted'),
+        last_success_at=Max('last_success_at'),
+    )
+    # Runs without a duration get their own partition, so they do not shift the ranks
+    ranked = sub.run_history.annotate(duration_rank=Window(
+        CumeDist(),
+        partition_by=Case(When(duration_seconds__isnull=True, then=Value(1)), default=Value(0),
+                          output_field=IntegerField()),
+        order_by=F('duration_seconds').asc(),
+    ))
+    recent = ranked.aggregate(
+        total=Count('id'),
+        success=Count('id', filter=Q(status='success')),
+        duration_count=Count('duration_seconds'),
+        duration_sum=Sum('duration_seconds'),
+        records=Sum('records_inserted'),
+        last_success_at=Max('started_at', filter=Q(status='success')),
+        p50=Min('duration_seconds', filter=Q(duration_rank__gte=0.5)),
+        p95=Min('duration_seconds', filter=Q(duration_rank__gte=0.95)),
+    )
+
+    total_runs = (rolled['total'] or 0) + recent['total']
+    success_runs = (rolled['success'] or 0) + recent['success']
+    duration_count = (rolled['duration_count'] or 0) + recent['duration_count']
+    duration_sum = (rolled['duration_sum'] or 0) + (recent['duration_sum'] or 0)
+    return {
+        'total_runs': total_runs,
+        'success_rate': round((success_runs / total_runs * 100) if total_runs > 0 else 0, 1),
+        'avg_duration': round(duration_sum / duration_count, 2) if duration_count else None,
+        'p50_duration': recent['p50'],
+        'p95_duration': recent['p95'],
+        'percentile_days': settings.RUN_HISTORY_RETENTION_DAYS,
+        'records_total': (rolled['records'] or 0) + (recent['records'] or 0),
+        'last_success_at': recent['last_success_at'] or rolled['last_success_at'],
+    }
@@ -1,7 +1,8 @@
 import os
 import pty
-import re
+import select
 import signal
+import stat
 import subprocess
 import threading
 import time
@@ -10,35 +11,41 @@ import logging
 from celery import shared_task
 from django.utils import timezone
 
-logger = logging.getLogger(__name__)
-
-# Strip ANSI escape sequences and carriage returns from PTY output
-_ANSI_ESCAPE = re.compile(
-    rb'(\x9B|\x1B\[)[0-?]*[ -/]*[@-~]'
-    rb'|\x1B[^[\]]*'
-    rb'|\x0D'
-)
-
-
-def _strip_ansi(data: bytes) -> bytes:
-    return _ANSI_ESCAPE.sub(b'', data)
+from .live_log import BufferedLogWriter, LiveLogWriter
 
+logger = logging.getLogger(__name__)
 
 def get_live_log_path(sub_id: int) -> str:
     return f'/tmp/scraper_live_{sub_id}.log'
 
 
+def get_live_log_index_path(sub_id: int) -> str:
+    return f'/tmp/scraper_live_{sub_id}.idx'
+
+
 def get_stdin_queue_path(sub_id: int) -> str:
     return f'/tmp/scraper_stdin_{sub_id}'
 
 
+def is_stdin_available(sub_id: int) -> bool:
+    """True while a run has its stdin pipe open for browser input."""
+    try:
+        return stat.S_ISFIFO(os.stat(get_stdin_queue_path(sub_id)).st_mode)
+    except OSError:
+        return False
+
+
 @shared_task(bind=True, name='dashboard.tasks.run_scraper_task')
 def run_scraper_task(self, sub_scraper_id, triggered_by='manual'):
     """Execute a scraper script via PTY, streaming stdout/stderr live.
 
-    Output is written line-by-line to /tmp/scraper_live_{id}.log.
-    Stdin input is forwarded from /tmp/scraper_stdin_{id} (a queue file).
+    Output is written line-by-line to /tmp/scraper_live_{id}.log, with a
+    sidecar line index in /tmp/scraper_live_{id}.idx for O(1) line seeks.
+    Stdin input is forwarded from /tmp/scraper_stdin_{id} (a named pipe).
     This allows browser-based interactive input (pdb, input(), etc.).
+
+    One I/O thread select()s on the PTY master and the stdin pipe together
+    and sleeps until either has data, so an idle run costs no wakeups.
     """
     from dashboard.models import SubScraper, ScraperRunHistory, ScraperProcess
 
@@ -68,25 +75,27 @@ def run_scraper_task(self, sub_scraper_id, triggered_by='manual'):
         return {'status': 'failed', 'message': 'No run command configured'}
 
     live_log_path = get_live_log_path(sub_scraper_id)
+    live_log_index_path = get_live_log_index_path(sub_scraper_id)
     stdin_queue_path = get_stdin_queue_path(sub_scraper_id)
 
-    # Clear old files and create fresh stdin queue
-    for path in [live_log_path, stdin_queue_path]:
+    # Clear old files and create a fresh stdin pipe
+    for path in [live_log_path, live_log_index_path, stdin_queue_path]:
         try:
-            if os.path.exists(path):
+            if os.path.lexists(path):
                 os.remove(path)
         except OSError:
             pass
 
-    # Create empty stdin queue file
     try:
-        open(stdin_queue_path, 'w').close()
+        os.mkfifo(stdin_queue_path, 0o660)
     except OSError:
         pass
 
     start_time = time.time()
     master_fd = None
     slave_fd = None
+    stdin_fd = None
+    wake_r = wake_w = None
     process = None
 
     try:
@@ -115,64 +124,77 @@ def run_scraper_task(self, sub_scraper_id, triggered_by='manual'):
             celery_task_id=self.request.id,
         )
 
-        stop_event = threading.Event()
-
-        # ── Thread 1: Read PTY output → live log file ──────────────────
-        def output_reader():
+        # O_RDWR keeps the pipe open with no writer attached, so select()
+        # never sees a spurious EOF between two inputs.
+        try:
+            stdin_fd = os.open(stdin_queue_path, os.O_RDWR | os.O_NONBLOCK)
+        except OSError:
+            stdin_fd = None
+        # Written once the process exits, to wake the I/O loop for a final drain
+        wake_r, wake_w = os.pipe()
+
+        # ── I/O loop: PTY output → live log, stdin pipe → PTY ─────────
+        # Output is ANSI-stripped and coalesced by BufferedLogWriter, which
+        # flushes once 64 KB are pending or the oldest byte is 100 ms old.
+        # select() only times out while output is waiting to be flushed.
+        def pty_io_loop():
+            watched = [master_fd, wake_r]
+            if stdin_fd is not None:
+                watched.append(stdin_fd)
+            draining = False
             try:
-                with open(live_log_path, 'wb') as log_f:
+                writer = LiveLogWriter(live_log_path, live_log_index_path)
+                with BufferedLogWriter(writer) as log_f:
                     while True:
                         try:
-                            data = os.read(master_fd, 4096)
-                            if not data:
+                            ready, _, _ = select.select(
+                                watched, [], [], 0 if draining else log_f.timeout()
+                            )
+                            if master_fd in ready:
+                                data = os.read(master_fd, 65536)
+                                if not data:
+                                    break
+                                log_f.feed(data)
+                            elif draining:
+                                # Process has exited and the PTY buffer is empty
                                 break
-                            cleaned = _strip_ansi(data)
-                            log_f.write(cleaned)
-                            log_f.flush()
+
+                            if stdin_fd in ready:
+                                try:
+                                    data = os.read(stdin_fd, 65536)
+                                except BlockingIOError:
+                                    data = b''
+                                if data:
+                                    os.write(master_fd, data)
+
+                            if wake_r in ready:
+                                draining = True
+                                watched = [master_fd]
+
+                            log_f.flush_if_due()
                         except OSError:
                             # EIO means PTY slave closed (process ended)
                             break
             except Exception as exc:
-                logger.error(f"Output reader error for scraper {sub_scraper_id}: {exc}")
-            finally:
-                stop_event.set()
-
-        # ── Thread 2: stdin queue file → master PTY ────────────────────
-        def stdin_forwarder():
-            stdin_offset = 0
-            while not stop_event.is_set():
-                time.sleep(0.05)
-                try:
-                    with open(stdin_queue_path, 'rb') as f:
-                        f.seek(stdin_offset)
-                        data = f.read()
-                    if data:
-                        try:
-                            os.write(master_fd, data)
-                        except OSError:
-                            break
-                        stdin_offset += len(data)
-                except (OSError, FileNotFoundError):
-                    pass
+                logger.error(f"PTY I/O error for scraper {sub_scraper_id}: {exc}")
 
-        t_output = threading.Thread(target=output_reader, daemon=True)
-        t_stdin = threading.Thread(target=stdin_forwarder, daemon=True)
-        t_output.start()
-        t_stdin.start()
+        t_io = threading.Thread(target=pty_io_loop, daemon=True)
+        t_io.start()
 
         # Wait for process to finish
         process.wait()
-        stop_event.set()
-        t_output.join(timeout=3)
-        t_stdin.join(timeout=1)
+        os.write(wake_w, b'\0')
+        t_io.join(timeout=3)
 
         duration = time.time() - start_time
 
-        try:
-            os.close(master_fd)
-        except OSError:
-            pass
-        master_fd = None
+        for fd in [master_fd, stdin_fd, wake_r, wake_w]:
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        master_fd = stdin_fd = wake_r = wake_w = None
 
         proc_record.is_running = False
         proc_record.save()
@@ -181,17 +203,19 @@ def run_scraper_task(self, sub_scraper_id, triggered_by='manual'):
         run_record.ended_at = timezone.now()
         run_record.duration_seconds = round(duration, 2)
 
-        # Save last portion of log output as notes
+        # Save last portion of log output as notes (read only the tail)
         try:
-            with open(live_log_path, 'r', errors='replace') as f:
-                content = f.read()
+            with open(live_log_path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 8192))
+                content = f.read().decode('utf-8', errors='replace')
             run_record.notes = content[-2000:] if len(content) > 2000 else content
         except Exception:
             pass
 
         run_record.save()
 
-        # Remove stdin queue
+        # Remove stdin pipe
         try:
             os.remove(stdin_queue_path)
         except OSError:
@@ -216,7 +240,7 @@ def run_scraper_task(self, sub_scraper_id, triggered_by='manual'):
                 sub_scraper=sub_scraper, pid=process.pid
             ).update(is_running=False)
 
-        for fd in [master_fd, slave_fd]:
+        for fd in [master_fd, slave_fd, stdin_fd, wake_r, wake_w]:
             if fd is not None:
                 try:
                     os.close(fd)
@@ -230,3 +254,42 @@ def run_scraper_task(self, sub_scraper_id, triggered_by='manual'):
 
         logger.exception(f"Error running scraper {sub_scraper_id}")
         return {'status': 'failed', 'message': str(e)}
+
+
+@shared_task(name='dashboard.tasks.prune_run_history_task')
+def prune_run_history_task():
+    """Daily retention pass: roll up and delete run history past the cutoff."""
+    from dashboard.retention import rollup_and_prune
+
+    result = rollup_and_prune()
+    logger.info(
+        f"Run history retention: rolled up {result['runs']} runs into "
+        f"{result['days']} daily rows (cutoff {result['cutoff']:%Y-%m-%d})"
+    )
+    return {'runs': result['runs'], 'days': result['days']}
+
+
+@shared_task(name='dashboard.tasks.count_collection_documents_task')
+def count_collection_documents_task(count_id):
+    """Run an exact count_documents({}) and store it on MongoCollectionCount."""
+    from dashboard.models import MongoCollectionCount
+    from dashboard.mongo import get_client
+
+    try:
+        record = MongoCollectionCount.objects.get(pk=count_id)
+    except MongoCollectionCount.DoesNotExist:
+        return {'status': 'error', 'message': 'Count request not found'}
+
+    MongoCollectionCount.objects.filter(pk=count_id).update(status='running')
+    try:
+        collection = get_client(record.mongo_uri)[record.db_name][record.collection_name]
+        count = collection.count_documents({})
+    except Exception as exc:
+        logger.error(f"Exact count failed for {record}: {exc}")
+        MongoCollectionCount.objects.filter(pk=count_id).update(status='failed', error=str(exc))
+        return {'status': 'failed', 'message': str(exc)}
+
+    MongoCollectionCount.objects.filter(pk=count_id).update(
+        status='done', count=count, error='', counted_at=timezone.now(),
+    )
+    return {'status': 'done', 'count': count}
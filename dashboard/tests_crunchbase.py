@@ -0,0 +1,671 @@
+"""
+Tests for the crunchbase scraper building blocks that run without
+MongoDB or Crunchbase: collections are in-memory fakes.
+"""
+import copy
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+from cryptography.fernet import Fernet
+from curl_cffi.requests import Cookies
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# The scraper scripts import each other by module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'crunchbase'))
+
+import leases  # noqa: E402
+import proxy_pool  # noqa: E402
+import queries  # noqa: E402
+import rate_scheduler  # noqa: E402
+import session_cache  # noqa: E402
+import worker_pool  # noqa: E402
+import work_queue  # noqa: E402
+import write_buffer  # noqa: E402
+
+MISSING = object()
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def get_path(doc, path):
+    for part in path.split("."):
+        if isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        elif isinstance(doc, dict) and part in doc:
+            doc = doc[part]
+        else:
+            return MISSING
+    return doc
+
+
+def matches(doc, filter):
+    """The subset of MongoDB query semantics the scrapers' filters use."""
+    for key, condition in filter.items():
+        if key == "$and":
+            ok = all(matches(doc, f) for f in condition)
+        elif key == "$or":
+            ok = any(matches(doc, f) for f in condition)
+        else:
+            ok = matches_value(get_path(doc, key), condition)
+        if not ok:
+            return False
+    return True
+
+
+def matches_value(value, condition):
+    present = value is not MISSING
+    value = value if present else None
+    if not (isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition)):
+        return value == condition
+    for op, arg in condition.items():
+        if op == "$exists":
+            ok = present == bool(arg)
+        elif op == "$ne":
+            ok = value != arg
+        elif op == "$in":
+            ok = value in arg
+        elif op == "$nin":
+            ok = value not in arg
+        elif op == "$not":
+            ok = not matches_value(value if present else MISSING, arg)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            compare = {"$gt": value.__gt__, "$gte": value.__ge__, "$lt": value.__lt__, "$lte": value.__le__}
+            ok = value is not None and compare[op](arg) is True
+        elif op == "$regex":
+            flags = re.I if "i" in condition.get("$options", "") else 0
+            ok = isinstance(value, str) and re.search(arg, value, flags) is not None
+        elif op == "$options":
+            continue
+        else:
+            raise NotImplementedError(op)
+        if not ok:
+            return False
+    return True
+
+
+class Cursor(list):
+    def limit(self, n):
+        return Cursor(self[:n]) if n else self
+
+    def max_time_ms(self, ms):
+        return self
+
+
+class FakeCollection:
+    """In-memory collection with the pymongo calls the scraper modules make."""
+
+    def __init__(self):
+        self.docs = {}
+        self.indexes = []
+
+    def insert(self, *docs):
+        for doc in docs:
+            self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def _matching(self, filter, sort=None):
+        docs = [doc for doc in self.docs.values() if matches(doc, filter or {})]
+        for field, direction in reversed(sort or []):
+            docs.sort(key=lambda doc: (get_path(doc, field) is not MISSING, get_path(doc, field)
+                                       if get_path(doc, field) is not MISSING else 0), reverse=direction < 0)
+        return docs
+
+    @staticmethod
+    def _project(doc, projection):
+        if not projection:
+            return copy.deepcopy(doc)
+        return {k: copy.deepcopy(v) for k, v in doc.items() if k == "_id" or projection.get(k)}
+
+    @staticmethod
+    def _apply(doc, update, inserting=False):
+        for field, value in update.get("$set", {}).items():
+            doc[field] = copy.deepcopy(value)
+        for field in update.get("$unset", {}):
+            doc.pop(field, None)
+        for field, value in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + value
+        if inserting:
+            for field, value in update.get("$setOnInsert", {}).items():
+                doc[field] = copy.deepcopy(value)
+
+    def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+
+    def find(self, filter=None, projection=None):
+        return Cursor(self._project(doc, projection) for doc in self._matching(filter))
+
+    def find_one(self, filter=None):
+        docs = self._matching(filter)
+        return copy.deepcopy(docs[0]) if docs else None
+
+    def count_documents(self, filter, limit=0):
+        count = len(self._matching(filter))
+        return min(count, limit) if limit else count
+
+    def find_one_and_update(self, filter, update, sort=None, projection=None, return_document=None):
+        docs = self._matching(filter, sort)
+        if not docs:
+            return None
+        self._apply(docs[0], update)
+        return self._project(docs[0], projection)
+
+    def update_one(self, filter, update, upsert=False):
+        docs = self._matching(filter)
+        if docs:
+            self._apply(docs[0], update)
+            return SimpleNamespace(matched_count=1, upserted_id=None)
+        if upsert:
+            doc = {k: v for k, v in filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+            self._apply(doc, update, inserting=True)
+            self.docs[doc["_id"]] = doc
+            return SimpleNamespace(matched_count=0, upserted_id=doc["_id"])
+        return SimpleNamespace(matched_count=0, upserted_id=None)
+
+    def update_many(self, filter, update):
+        docs = self._matching(filter)
+        for doc in docs:
+            self._apply(doc, update)
+        return SimpleNamespace(matched_count=len(docs))
+
+    def delete_one(self, filter):
+        docs = self._matching(filter)
+        if docs:
+            del self.docs[docs[0]["_id"]]
+        return SimpleNamespace(deleted_count=len(docs[:1]))
+
+    def aggregate(self, pipeline):
+        # $match, then a $group counting documents per field value
+        docs = self._matching(pipeline[0]["$match"])
+        group = pipeline[1]["$group"]
+        (name, _), = [(k, v) for k, v in group.items() if k != "_id"]
+        counts = {}
+        for doc in docs:
+            value = get_path(doc, group["_id"].lstrip("$"))
+            counts[value] = counts.get(value, 0) + 1
+        return [{"_id": value, name: count} for value, count in counts.items()]
+
+    def bulk_write(self, requests, ordered=True):
+        upserted = 0
+        for request in requests:
+            if isinstance(request, UpdateOne):
+                upserted += self.update_one(request._filter, request._doc, upsert=request._upsert).upserted_id is not None
+            else:
+                self.delete_one(request._filter)
+        return SimpleNamespace(upserted_count=upserted)
+
+
+class FakeBulkCollection:
+    """Records bulk_write calls; ops whose document matches ``fail_on`` fail."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.written = []
+        self.updates = []
+
+    def bulk_write(self, requests, ordered=True):
+        errors = []
+        for index, request in enumerate(requests):
+            # InsertOne carries its document, UpdateOne its filter
+            doc = request._doc if isinstance(request, InsertOne) else request._filter
+            if self.fail_on and self.fail_on(doc):
+                errors.append({"index": index, "errmsg": "E11000 duplicate key"})
+            else:
+                self.written.append(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    def update_one(self, filter, update, upsert=False):
+        self.updates.append((filter, update))
+
+
+class FakeDb(dict):
+    def __init__(self, collection_class=FakeCollection):
+        super().__init__()
+        self.collection_class = collection_class
+
+    def __missing__(self, name):
+        self[name] = self.collection_class()
+        return self[name]
+
+
+class WriteBufferTests(TestCase):
+    def setUp(self):
+        self.db = FakeDb(FakeBulkCollection)
+        self.db["orgs"] = FakeBulkCollection(fail_on=lambda doc: doc.get("bad"))
+        self.errors = []
+        self.buffer = write_buffer.WriteBuffer(
+            self.db, on_error=lambda key, error: self.errors.append(key), flush_size=3,
+        )
+
+    def add_item(self, key, bad=False):
+        self.buffer.add("orgs", InsertOne({"key": key, "bad": bad}), key=key, stat=("stats", "saved"))
+        self.buffer.add("queue", UpdateOne({"_id": key}, {"$set": {"done": True}}), key=key)
+
+    def test_failed_insert_skips_later_ops_of_that_key(self):
+        self.add_item(1)
+        self.add_item(2, bad=True)
+        self.buffer.flush()
+        self.assertEqual([doc["_id"] for doc in self.db["queue"].written], [1])
+        self.assertEqual(self.errors, [2])
+        self.assertEqual(self.db["run_stats"].updates, [({"_id": "stats"}, {"$inc": {"saved": 1}})])
+
+    def test_key_ops_keep_their_order_across_collections(self):
+        # The queue collection is used first (key 1), yet key 2's queue op waits for its insert
+        self.buffer.add("queue", UpdateOne({"_id": 1}, {"$set": {"done": True}}), key=1)
+        self.add_item(2, bad=True)
+        self.buffer.flush()
+        self.assertEqual([doc["_id"] for doc in self.db["queue"].written], [1])
+
+    def test_failure_is_remembered_across_automatic_flushes(self):
+        self.add_item(1)
+        self.buffer.add("orgs", InsertOne({"key": 2, "bad": True}), key=2)  # third op: automatic flush
+        self.assertEqual(len(self.buffer), 0)
+        self.buffer.add("queue", UpdateOne({"_id": 2}, {"$set": {"done": True}}), key=2)
+        self.buffer.flush()
+        self.assertEqual([doc["_id"] for doc in self.db["queue"].written], [1])
+        self.assertEqual(self.errors, [2])
+
+        self.assertEqual(set(self.buffer.forget([1, 2])), {2})
+        self.assertEqual(self.buffer.forget([2]), {})
+
+    def test_concurrent_flushes_run_one_at_a_time(self):
+        entered, release = threading.Event(), threading.Event()
+        bulk_write = self.db["orgs"].bulk_write
+
+        def slow_bulk_write(requests, ordered=True):
+            entered.set()
+            release.wait(5)
+            bulk_write(requests, ordered)
+
+        self.db["orgs"].bulk_write = slow_bulk_write
+        self.buffer.add("orgs", InsertOne({"key": 2, "bad": True}), key=2)
+        first = threading.Thread(target=self.buffer.flush)
+        first.start()
+        self.assertTrue(entered.wait(5))
+
+        # Key 2's next write arrives while its failing insert is still in flight
+        self.buffer.add("queue", UpdateOne({"_id": 2}, {"$set": {"done": True}}), key=2)
+        second = threading.Thread(target=self.buffer.flush)
+        second.start()
+        second.join(0.1)
+        self.assertTrue(second.is_alive())
+
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(self.db["queue"].written, [])
+        self.assertEqual(self.errors, [2])
+
+
+class UpdateQueueTests(TestCase):
+    def setUp(self):
+        self.db = FakeDb()
+        self.db[queries.UPDATE_ORGANIZATIONS].insert(
+            {"_id": "blank", "summary": {"details": {"description": ""}}},
+            {"_id": "obfuscated", "summary": {"details": {"description": "Makes things"}}, "updated_at": NOW,
+             "financial": {"funding_round": {"total_funding_amount": "obfuscated obfuscation"}}},
+            {"_id": "fresh", "summary": {"details": {"description": "Makes things"}}, "updated_at": NOW},
+        )
+        self.queue = work_queue.UpdateQueue(self.db, "host:1:update-1")
+        self.queue.ensure_indexes()
+
+    def test_refill_queues_matching_organizations_by_priority(self):
+        self.assertEqual(self.queue.claim(10, now=NOW), ["blank", "obfuscated"])
+        org = self.db[queries.UPDATE_ORGANIZATIONS].find_one({"_id": "blank"})
+        self.assertEqual((org["is_updated"], org["update_queued_at"]), (0, NOW))
+
+    def test_claimed_entries_are_not_handed_out_twice(self):
+        other = work_queue.UpdateQueue(self.db, "host:2:update-2")
+        self.assertEqual(self.queue.claim(1, now=NOW), ["blank"])
+        self.assertEqual(other.claim(10, now=NOW), ["obfuscated"])
+
+    def test_completed_organizations_wait_out_the_cooldown(self):
+        for org_id in self.queue.claim(10, now=NOW):
+            self.queue.complete(org_id)
+        self.assertEqual(self.queue.claim(10, now=NOW + timedelta(hours=1)), [])
+        later = NOW + work_queue.REQUEUE_COOLDOWN + timedelta(minutes=1)
+        self.assertEqual(self.queue.claim(10, now=later), ["blank", "obfuscated"])
+
+    def test_only_one_thread_refills(self):
+        other = work_queue.UpdateQueue(self.db, "host:2:update-2")
+        other.refill_lock.claim({"_id": work_queue.REFILL_LOCK_ID}, now=NOW)
+        self.assertIsNone(self.queue.refill(NOW))
+        self.assertEqual(self.queue.claim(10, now=NOW), [])
+
+
+class LeaseTests(TestCase):
+    def setUp(self):
+        self.collection = FakeCollection()
+        self.collection.insert({"_id": "a", "status": "pending"})
+        self.mine = leases.Leases(self.collection, "host:1:new-1")
+        self.theirs = leases.Leases(self.collection, "host:2:new-2")
+
+    def test_claim_holds_until_expiry(self):
+        doc = self.mine.claim({"status": "pending"}, now=NOW)
+        self.assertEqual(doc[leases.OWNER_FIELD], "host:1:new-1")
+        self.assertEqual(doc[leases.EXPIRES_FIELD], NOW + leases.LEASE_TTL)
+        self.assertIsNone(self.theirs.claim({"status": "pending"}, now=NOW + leases.LEASE_TTL - timedelta(seconds=1)))
+        self.assertIsNotNone(self.theirs.claim({"status": "pending"}, now=NOW + leases.LEASE_TTL))
+
+    def test_renewal_extends_the_lease(self):
+        self.mine.claim({}, now=NOW)
+        self.assertTrue(self.mine.renew("a", now=NOW + timedelta(minutes=8)))
+        self.assertIsNone(self.theirs.claim({}, now=NOW + leases.LEASE_TTL + timedelta(minutes=1)))
+
+    def test_lost_lease_cannot_be_renewed_or_released(self):
+        self.mine.claim({}, now=NOW)
+        self.theirs.claim({}, now=NOW + leases.LEASE_TTL)
+        self.assertFalse(self.mine.renew("a", now=NOW + leases.LEASE_TTL))
+        self.assertFalse(self.mine.release("a", {"status": "completed"}))
+        self.assertEqual(self.collection.find_one({"_id": "a"})["status"], "pending")
+
+        with self.mine.heartbeat(["a"]) as heartbeat:
+            self.assertFalse(heartbeat.confirm("a"))
+
+    def test_release_with_hold_keeps_the_document_unclaimable(self):
+        self.mine.claim({}, now=NOW)
+        self.assertTrue(self.mine.release("a", {"status": "failed"}, hold=timedelta(hours=1), now=NOW))
+        self.assertIsNone(self.theirs.claim({}, now=NOW + timedelta(minutes=59)))
+        self.assertEqual(self.theirs.claim({}, now=NOW + timedelta(hours=1))["status"], "failed")
+
+    def test_release_clears_the_lease(self):
+        self.mine.claim({}, now=NOW)
+        self.assertTrue(self.mine.release("a", {"status": "completed"}))
+        doc = self.collection.find_one({"_id": "a"})
+        self.assertNotIn(leases.OWNER_FIELD, doc)
+        self.assertIsNotNone(self.theirs.claim({}, now=NOW))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@mock.patch.object(rate_scheduler, "JITTER", 0)
+class RateSchedulerTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.rate = rate_scheduler.RateScheduler("a@example.com|proxy", rate=12, burst=2, clock=self.clock)
+
+    def test_burst_then_one_request_per_interval(self):
+        self.assertEqual([self.rate.reserve() for _ in range(4)], [0, 0, 5, 10])
+
+    def test_throttling_halves_the_rate_and_backs_off_exponentially(self):
+        self.rate.record(status=429)
+        self.assertEqual(self.rate.rate, 6)
+        self.assertEqual(self.rate.reserve(), rate_scheduler.BASE_BACKOFF)
+
+        self.rate.record(error="timed out")
+        self.rate.record(status=403)
+        self.assertEqual(self.rate.rate, rate_scheduler.MIN_RATE)
+        self.assertEqual(self.rate.state()["backoff_seconds"], rate_scheduler.BASE_BACKOFF * 4)
+
+    def test_retry_after_extends_the_pause(self):
+        self.rate.record(status=429, retry_after=120)
+        self.assertEqual(self.rate.reserve(), 120)
+        self.clock.now += 120
+        self.assertEqual(self.rate.reserve(), 10)
+
+    def test_server_errors_pause_without_cutting_the_rate(self):
+        self.rate.record(status=503)
+        self.assertEqual(self.rate.rate, 12)
+        self.assertEqual(self.rate.state()["backoff_seconds"], rate_scheduler.BASE_BACKOFF)
+
+    def test_healthy_streak_raises_the_rate(self):
+        self.rate.record(status=429)
+        for _ in range(rate_scheduler.INCREASE_AFTER):
+            self.rate.record(status=200)
+        self.assertEqual(self.rate.rate, 6 + rate_scheduler.INCREASE)
+        self.assertEqual(self.rate.failures, 0)
+
+    def test_retry_after_header(self):
+        response = SimpleNamespace(headers={"Retry-After": "30"})
+        self.assertEqual(rate_scheduler.retry_after_seconds(response), 30)
+        response.headers["Retry-After"] = "Wed, 21 Oct 2026 07:28:00 GMT"
+        self.assertIsNone(rate_scheduler.retry_after_seconds(response))
+
+
+class ProxyPoolTests(TestCase):
+    PROXIES = ["http://p1:1", "http://p2:1"]
+
+    def setUp(self):
+        self.now = NOW
+        patcher = mock.patch.object(proxy_pool, "utcnow", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = FakeDb()
+        self.probe_ok = True
+        self.probed = []
+        self.pool = proxy_pool.ProxyPool(self.db, self.PROXIES, probe=self.probe)
+
+    def probe(self, proxy):
+        self.probed.append(proxy)
+        return self.probe_ok
+
+    def test_consecutive_failures_eject_the_proxy(self):
+        self.assertTrue(self.pool.record("http://p1:1", ok=False))
+        self.assertTrue(self.pool.record("http://p1:1", ok=False))
+        self.assertFalse(self.pool.record("http://p1:1", ok=False, error="timed out"))
+        self.assertEqual(self.pool.stats["http://p1:1"].ejected_until, NOW + proxy_pool.EJECT_FOR)
+        health = self.db[queries.PROXY_HEALTH].find_one({"_id": "http://p1:1"})
+        self.assertEqual(health["last_error"], "timed out")
+        self.assertEqual(self.pool.assign("a@example.com"), "http://p2:1")
+
+    def test_error_rate_ejects_an_intermittently_failing_proxy(self):
+        results = [self.pool.record("http://p1:1", ok=ok) for ok in (False, False, True, False, False)]
+        self.assertEqual(results, [True, True, True, True, False])
+
+    def test_latency_is_averaged(self):
+        self.pool.record("http://p1:1", latency=1.0)
+        self.pool.record("http://p1:1", latency=2.0)
+        self.assertEqual(self.pool.stats["http://p1:1"].latency_ms, 1200)
+
+    def test_probe_readmits_after_the_ejection(self):
+        for _ in range(proxy_pool.EJECT_AFTER_FAILURES):
+            self.pool.record("http://p1:1", ok=False)
+        self.assertFalse(self.pool.usable("http://p1:1"))
+        self.assertEqual(self.probed, [])
+
+        self.now = NOW + proxy_pool.EJECT_FOR
+        self.assertTrue(self.pool.usable("http://p1:1"))
+        self.assertEqual(self.probed, ["http://p1:1"])
+        self.assertIsNone(self.pool.stats["http://p1:1"].ejected_until)
+
+    def test_failed_probe_doubles_the_ejection(self):
+        for _ in range(proxy_pool.EJECT_AFTER_FAILURES):
+            self.pool.record("http://p1:1", ok=False)
+        self.now = NOW + proxy_pool.EJECT_FOR
+        self.probe_ok = False
+        self.assertFalse(self.pool.usable("http://p1:1"))
+        self.assertEqual(self.pool.stats["http://p1:1"].ejected_until, self.now + 2 * proxy_pool.EJECT_FOR)
+
+    def test_assignment_is_sticky_and_spreads_accounts(self):
+        first = self.pool.assign("a@example.com")
+        second = self.pool.assign("b@example.com")
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.pool.assign("a@example.com"), first)
+        self.assertEqual(self.pool.assign("a@example.com", exclude=[first]), second)
+
+    def test_ejections_are_shared_through_mongo(self):
+        for _ in range(proxy_pool.EJECT_AFTER_FAILURES):
+            self.pool.record("http://p1:1", ok=False)
+        other = proxy_pool.ProxyPool(self.db, self.PROXIES, probe=self.probe)
+        other.refresh()
+        self.assertFalse(other.usable("http://p1:1"))
+
+
+def cookie(name, value, expires=None):
+    return SimpleNamespace(name=name, value=value, domain=".crunchbase.com", path="/", secure=True, expires=expires)
+
+
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        self.db = FakeDb()
+        self.logger = mock.Mock()
+        self.cache = session_cache.SessionCache(self.db, key=Fernet.generate_key(), logger=self.logger)
+
+    def test_round_trip_is_encrypted(self):
+        self.cache.save("a@example.com", SimpleNamespace(jar=[cookie("authcookie", "secret")]), now=NOW)
+        doc = self.db[queries.SESSION_CACHE].find_one({"_id": "a@example.com"})
+        self.assertNotIn("secret", doc["token"])
+        self.assertEqual(doc["expires_at"], NOW + session_cache.MAX_AGE)
+        self.assertEqual([e["value"] for e in self.cache.load("a@example.com", now=NOW)], ["secret"])
+
+    def test_entries_expire_after_max_age(self):
+        self.cache.save("a@example.com", SimpleNamespace(jar=[cookie("authcookie", "secret")]), now=NOW)
+        self.assertIsNone(self.cache.load("a@example.com", now=NOW + session_cache.MAX_AGE))
+        self.assertIsNone(self.cache.load("b@example.com", now=NOW))
+
+    def test_expired_cookies_are_dropped(self):
+        jar = [cookie("authcookie", "secret", NOW.timestamp() + 60), cookie("cid", "old", NOW.timestamp() - 60)]
+        self.cache.save("a@example.com", SimpleNamespace(jar=jar), now=NOW)
+        self.assertEqual([e["name"] for e in self.cache.load("a@example.com", now=NOW)], ["authcookie"])
+        self.assertIsNone(self.cache.load("a@example.com", now=NOW + timedelta(minutes=2)))
+
+    def test_expired_login_cookie_is_a_miss(self):
+        jar = [cookie("authcookie", "secret", NOW.timestamp() - 60), cookie("cid", "id", NOW.timestamp() + 3600)]
+        self.cache.save("a@example.com", SimpleNamespace(jar=jar), now=NOW)
+        self.assertIsNone(self.cache.load("a@example.com", now=NOW))
+
+    def test_import_skips_expired_cookies_and_keeps_expiry(self):
+        entries = [
+            {"name": "authcookie", "value": "secret", "domain": ".crunchbase.com", "path": "/", "secure": True,
+             "expires": NOW.timestamp() + 3600},
+            {"name": "cid", "value": "old", "domain": ".crunchbase.com", "path": "/", "secure": True,
+             "expires": NOW.timestamp() - 60},
+        ]
+        cookies = Cookies()
+        session_cache.import_cookies(cookies, entries, now=NOW)
+        self.assertEqual([(c.name, c.expires) for c in cookies.jar], [("authcookie", int(NOW.timestamp()) + 3600)])
+
+    def test_entry_from_another_key_is_a_miss(self):
+        self.cache.save("a@example.com", SimpleNamespace(jar=[cookie("authcookie", "secret")]), now=NOW)
+        other = session_cache.SessionCache(self.db, key=Fernet.generate_key(), logger=self.logger)
+        self.assertIsNone(other.load("a@example.com", now=NOW))
+        self.logger.error.assert_called_once()
+
+    def test_key_file_is_created_once_and_private(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {"SCRAPER_SESSION_KEY": ""}):
+            path = os.path.join(tmp, "key")
+            key = session_cache.load_key(path)
+            self.assertEqual(session_cache.load_key(path), key)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        Fernet(key)
+
+
+class FakeProcess:
+    def __init__(self, target, args, name):
+        self.name = name
+        self.pid = 4242
+        self.exitcode = None
+        self.alive = False
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def exit(self, code=1):
+        self.alive, self.exitcode = False, code
+
+
+class WorkerPoolTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        patcher = mock.patch.object(worker_pool, "time", SimpleNamespace(monotonic=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        assignments = [(["update"], {"email": "a@example.com", "password": "x"}, 1)]
+        self.pool = worker_pool.WorkerPool(assignments, {}, mock.Mock())
+        self.pool.ctx = SimpleNamespace(Process=FakeProcess)
+        self.pool._start(0)
+
+    def die_after(self, seconds):
+        """Let the current worker run for ``seconds``, exit, and return its restart delay."""
+        worker = self.pool.workers[0]
+        self.now += seconds
+        worker["process"].exit()
+        self.pool._check_workers(self.now)
+        delay = worker["delay"]
+        self.now += delay - 1
+        self.pool._check_workers(self.now)
+        self.assertIs(self.pool.workers[0], worker, "restarted before its delay")
+        self.now += 1
+        self.pool._check_workers(self.now)
+        self.assertIsNot(self.pool.workers[0], worker)
+        return delay
+
+    def test_restart_delay_doubles_while_workers_die_young(self):
+        delays = [self.die_after(10) for _ in range(4)]
+        self.assertEqual(delays, [30, 60, 120, 240])
+
+    def test_restart_delay_is_capped(self):
+        for _ in range(10):
+            delay = self.die_after(10)
+        self.assertEqual(delay, worker_pool.MAX_RESTART_DELAY)
+
+    def test_long_running_worker_resets_the_delay(self):
+        self.die_after(10)
+        self.die_after(10)
+        self.assertEqual(self.die_after(worker_pool.MIN_UPTIME), worker_pool.RESTART_DELAY)
+
+    def test_accounts_are_assigned_like_the_process_engine(self):
+        accounts = [{"email": f"{n}@example.com"} for n in "abc"]
+        self.assertEqual(
+            worker_pool.assign_accounts(accounts, 2, 1),
+            [("update", accounts[0], 1), ("update", accounts[1], 2), ("new", accounts[2], 1)],
+        )
+
+
+class FakeStop:
+    """A stop event that records waits and is set after ``waits`` of them."""
+
+    def __init__(self, waits):
+        self.waits = waits
+        self.waited = []
+
+    def is_set(self):
+        return len(self.waited) >= self.waits
+
+    def wait(self, seconds):
+        self.waited.append(seconds)
+
+
+class WorkerMainTests(TestCase):
+    def run_worker(self, batches, waits):
+        scraper = mock.Mock()
+        scraper.resume_session.return_value = True
+        scraper.process_batch.side_effect = batches
+        module = SimpleNamespace(UpdateScrapper=mock.Mock(return_value=scraper))
+        stop, reports = FakeStop(waits), queue.Queue()
+        with mock.patch.object(worker_pool.importlib, "import_module", return_value=module):
+            worker_pool.worker_main(["update"], {"email": "a@example.com", "password": "x"}, 1, {}, stop, reports)
+        return scraper, stop, [reports.get_nowait() for _ in range(reports.qsize())]
+
+    def test_idle_wait_doubles_until_work_arrives(self):
+        batches = [(0, 0), (0, 0), (0, 0), (5, 4), (0, 0)]
+        scraper, stop, reports = self.run_worker(batches, waits=4)
+        idle = worker_pool.IDLE_WAIT
+        self.assertEqual(stop.waited, [idle, idle * 2, idle * 4, idle])
+        self.assertIn(("update", 5, 4), reports)
+        scraper.writes.flush.assert_called_once()
+
+    def test_failed_login_exits_without_claiming(self):
+        scraper = mock.Mock()
+        scraper.resume_session.return_value = False
+        scraper.login.return_value = False
+        module = SimpleNamespace(UpdateScrapper=mock.Mock(return_value=scraper))
+        with mock.patch.object(worker_pool.importlib, "import_module", return_value=module):
+            worker_pool.worker_main(["update"], {"email": "a@example.com", "password": "x"}, 1, {},
+                                    FakeStop(0), queue.Queue())
+        scraper.process_batch.assert_not_called()
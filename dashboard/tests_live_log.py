@@ -0,0 +1,270 @@
+import asyncio
+import os
+import tempfile
+
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from .live_log import (
+    AnsiStripper, BufferedLogWriter, LiveLogWriter, count_lines, line_to_cursor, read_from_cursor,
+    read_generation,
+)
+from .models import MainScraper, SubScraper
+from .tasks import (
+    get_live_log_path, get_live_log_index_path, get_stdin_queue_path, is_stdin_available,
+)
+
+
+class LiveLogIndexTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp.name, 'live.log')
+        self.index_path = os.path.join(self.tmp.name, 'live.idx')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index_tracks_lines_across_chunk_boundaries(self):
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            writer.write(b'alpha\nbra')
+            writer.write(b'vo\ncharlie\n')
+            writer.write(b'delta')
+
+        self.assertEqual(count_lines(self.index_path), 3)
+        self.assertEqual(line_to_cursor(self.log_path, self.index_path, 1), 6)
+        self.assertEqual(line_to_cursor(self.log_path, self.index_path, 2), 12)
+
+        lines, cursor = read_from_cursor(self.log_path, 6)
+        self.assertEqual(lines, ['bravo', 'charlie'])
+        self.assertEqual(cursor, 20)
+
+    def test_partial_line_only_returned_when_requested(self):
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            writer.write(b'one\ntwo')
+
+        self.assertEqual(read_from_cursor(self.log_path, 4), ([], 4))
+        self.assertEqual(read_from_cursor(self.log_path, 4, include_partial=True), (['two'], 7))
+
+    def test_each_writer_starts_a_new_generation(self):
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            first = writer.generation
+        self.assertEqual(read_generation(self.index_path), first)
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            self.assertNotEqual(writer.generation, first)
+        self.assertEqual(count_lines(self.index_path), 0)
+
+    def test_line_lookup_without_index_falls_back_to_scan(self):
+        with open(self.log_path, 'wb') as f:
+            f.write(b'a\nbb\nccc\n')
+        self.assertEqual(line_to_cursor(self.log_path, self.index_path, 2), 5)
+        self.assertEqual(line_to_cursor(self.log_path, self.index_path, 10), 9)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BufferedLogWriterTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp.name, 'live.log')
+        self.writer = LiveLogWriter(self.log_path, os.path.join(self.tmp.name, 'live.idx'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_log(self):
+        with open(self.log_path, 'rb') as f:
+            return f.read()
+
+    def test_escape_split_across_chunks_is_stripped(self):
+        stripper = AnsiStripper()
+        chunks = [b'ok \x1b[3', b'1mred\x1b', b'[0m \x1b]0;ti', b'tle\x07done\r\n']
+        out = b''.join(stripper.feed(c) for c in chunks) + stripper.finish()
+        self.assertEqual(out, b'ok red done\n')
+
+    def test_plain_text_after_escape_is_kept(self):
+        stripper = AnsiStripper()
+        self.assertEqual(stripper.feed(b'\x1b(Bhello\nworld\n'), b'hello\nworld\n')
+
+    def test_flushes_on_size_threshold(self):
+        clock = FakeClock()
+        buffered = BufferedLogWriter(self.writer, max_bytes=10, max_delay=1.0, clock=clock)
+        buffered.feed(b'12345')
+        self.assertEqual(self.read_log(), b'')
+        buffered.feed(b'67890\n')
+        self.assertEqual(self.read_log(), b'1234567890\n')
+        self.assertIsNone(buffered.timeout())
+        buffered.close()
+
+    def test_flushes_on_time_threshold(self):
+        clock = FakeClock()
+        buffered = BufferedLogWriter(self.writer, max_bytes=1024, max_delay=0.1, clock=clock)
+        buffered.feed(b'line\n')
+        clock.now = 0.04
+        self.assertAlmostEqual(buffered.timeout(), 0.06)
+        buffered.flush_if_due()
+        self.assertEqual(self.read_log(), b'')
+
+        clock.now = 0.1
+        buffered.flush_if_due()
+        self.assertEqual(self.read_log(), b'line\n')
+        self.assertEqual(buffered.flushes, 1)
+        buffered.close()
+
+
+class LiveLogApiTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client.login(username='admin', password='password123')
+
+        main = MainScraper.objects.create(name='Group')
+        self.sub = SubScraper.objects.create(main_scraper=main, name='Sub')
+        self.url = reverse('api_live_log', args=[self.sub.pk])
+        self.log_path = get_live_log_path(self.sub.pk)
+        self.index_path = get_live_log_index_path(self.sub.pk)
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            writer.write(b'first\nsecond\nthird\n')
+
+    def tearDown(self):
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_cursor_protocol_returns_only_new_output(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['lines'], ['first', 'second', 'third'])
+        self.assertEqual(data['total'], 3)
+
+        with open(self.log_path, 'ab') as f:
+            f.write(b'fourth\n')
+
+        data = self.client.get(self.url, {'offset': data['total'], 'cursor': data['cursor']}).json()
+        self.assertEqual(data['lines'], ['fourth'])
+        self.assertEqual(data['total'], 4)
+        self.assertFalse(data['reset'])
+
+    def test_line_offset_still_supported(self):
+        data = self.client.get(self.url, {'offset': 2}).json()
+        self.assertEqual(data['lines'], ['third'])
+        self.assertEqual(data['total'], 3)
+
+    def test_send_input_requires_stdin_pipe(self):
+        url = reverse('api_send_input', args=[self.sub.pk])
+        stdin_path = get_stdin_queue_path(self.sub.pk)
+
+        # A leftover regular file from an old run is not an input channel.
+        with open(stdin_path, 'w'):
+            pass
+        try:
+            self.assertFalse(is_stdin_available(self.sub.pk))
+            response = self.client.post(url, {'input': 'y'}, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        finally:
+            os.remove(stdin_path)
+
+    def test_cursor_past_end_signals_reset(self):
+        data = self.client.get(self.url, {'offset': 50, 'cursor': 10_000}).json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['lines'], ['first', 'second', 'third'])
+        self.assertEqual(data['total'], 3)
+
+    def test_new_generation_signals_reset_even_past_the_cursor(self):
+        old = self.client.get(self.url).json()
+        # The next run's log is already longer than the old cursor
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            writer.write(b'new run line one\nnew run line two\n')
+
+        data = self.client.get(self.url, {
+            'offset': old['total'], 'cursor': old['cursor'], 'generation': old['generation'],
+        }).json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['lines'], ['new run line one', 'new run line two'])
+        self.assertEqual(data['generation'], writer.generation)
+
+
+class LiveStreamTests(TestCase):
+    def setUp(self):
+        main = MainScraper.objects.create(name='Group')
+        self.sub = SubScraper.objects.create(main_scraper=main, name='Sub')
+        self.log_path = get_live_log_path(self.sub.pk)
+        self.index_path = get_live_log_index_path(self.sub.pk)
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            writer.write(b'backlog\n')
+
+    def tearDown(self):
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def test_one_feed_fans_out_to_every_viewer(self):
+        from .live_stream import get_feed, stream_events
+
+        viewers = [stream_events(self.sub.pk, 0, 0) for _ in range(3)]
+        for viewer in viewers:
+            frame = await asyncio.wait_for(viewer.__anext__(), 5)
+            self.assertIn('"backlog"', frame)
+            frame = await asyncio.wait_for(viewer.__anext__(), 5)
+            self.assertTrue(frame.startswith('event: status'))
+
+        feed = get_feed(self.sub.pk)
+        self.assertEqual(len(feed.subscribers), 3)
+
+        with open(self.log_path, 'ab') as f:
+            f.write(b'pushed\n')
+
+        for viewer in viewers:
+            frame = await asyncio.wait_for(viewer.__anext__(), 5)
+            self.assertIn('"pushed"', frame)
+            self.assertIn('"total": 2', frame)
+            await viewer.aclose()
+
+        self.assertEqual(len(feed.subscribers), 0)
+
+    async def test_viewer_from_an_earlier_run_is_reset(self):
+        from .live_stream import stream_events
+
+        viewer = stream_events(self.sub.pk, 3, 1, 'not-this-run')
+        frame = await asyncio.wait_for(viewer.__anext__(), 5)
+        self.assertTrue(frame.startswith('event: reset'))
+        frame = await asyncio.wait_for(viewer.__anext__(), 5)
+        self.assertIn('"backlog"', frame)
+        self.assertIn(f'id: 8:1:{read_generation(self.index_path)}', frame)
+        await viewer.aclose()
+
+    async def test_overflowing_viewer_resyncs_to_a_new_run(self):
+        from .live_stream import get_feed, stream_events
+
+        viewer = stream_events(self.sub.pk, 0, 0)
+        await asyncio.wait_for(viewer.__anext__(), 5)  # backlog
+        await asyncio.wait_for(viewer.__anext__(), 5)  # status
+        feed = get_feed(self.sub.pk)
+        (queue,) = feed.subscribers
+
+        # A new run starts while the viewer's queue is full
+        with LiveLogWriter(self.log_path, self.index_path) as writer:
+            writer.write(b'new run\n')
+        while not queue.full():
+            queue.put_nowait(('status', feed.status))
+        # What the feed's own poll does on noticing the new run
+        feed.cursor, feed.generation = 0, read_generation(self.index_path)
+        feed._broadcast('reset', {'generation': feed.generation})
+        self.assertEqual(queue.qsize(), 1)
+
+        frame = await asyncio.wait_for(viewer.__anext__(), 5)
+        self.assertTrue(frame.startswith('event: reset'))
+        frame = await asyncio.wait_for(viewer.__anext__(), 5)
+        self.assertIn('"new run"', frame)
+        await viewer.aclose()
+
+    def test_stream_requires_asgi(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client.login(username='admin', password='password123')
+        response = self.client.get(reverse('api_live_stream', args=[self.sub.pk]))
+        self.assertEqual(response.status_code, 503)
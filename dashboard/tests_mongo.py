@@ -0,0 +1,448 @@
+import json
+import os
+from io import StringIO
+from unittest import mock
+
+import datetime
+import uuid
+
+import bson
+from bson.son import SON
+from pymongo.errors import ExecutionTimeout, PyMongoError
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from . import index_advisor, mongo
+from .models import MainScraper, SubScraper, MongoCollectionCount, ScraperConfig
+from .tasks import count_collection_documents_task
+
+URI_A = 'mongodb://registry-a.invalid:27017/'
+URI_B = 'mongodb://registry-b.invalid:27017/'
+
+
+class MongoRegistryTests(TestCase):
+    def setUp(self):
+        mongo.close_all()
+        self.addCleanup(mongo.close_all)
+
+    def test_same_uri_reuses_client(self):
+        self.assertIs(mongo.get_client(URI_A), mongo.get_client(URI_A))
+        self.assertIsNot(mongo.get_client(URI_A), mongo.get_client(URI_B))
+
+    @override_settings(MONGO_URI=URI_A, MONGO_DEFAULT_DB='scrapers_db')
+    def test_model_helpers_share_the_registry_client(self):
+        main = MainScraper.objects.create(name='Group')
+        sub = SubScraper.objects.create(main_scraper=main, name='Sub', mongo_collection_name='items')
+        other = MainScraper.objects.create(name='Other', mongo_uri=URI_A)
+
+        client = mongo.get_client(URI_A)
+        self.assertIs(main.get_mongo_client(), client)
+        self.assertIs(other.get_mongo_client(), client)
+        self.assertIs(sub.get_mongo_collection().database.client, client)
+
+    def test_idle_clients_are_evicted(self):
+        client = mongo.get_client(URI_A)
+        with mock.patch.object(mongo.time, 'monotonic', return_value=mongo.time.monotonic() + mongo.IDLE_TIMEOUT + 1):
+            fresh = mongo.get_client(URI_B)
+        self.assertNotIn(URI_A, mongo._clients)
+        self.assertIn(URI_B, mongo._clients)
+        self.assertIsNot(mongo.get_client(URI_A), client)
+        self.assertIs(mongo.get_client(URI_B), fresh)
+
+    def test_child_process_does_not_inherit_clients(self):
+        parent_client = mongo.get_client(URI_A)
+        with mock.patch.object(mongo.os, 'getpid', return_value=os.getpid() + 1):
+            child_client = mongo.get_client(URI_A)
+        self.assertIsNot(child_client, parent_client)
+        child_client.close()
+        parent_client.close()
+
+
+class FakeCollection:
+    """Stands in for a pymongo Collection; records which commands ran."""
+
+    def __init__(self, docs=1000):
+        self.docs = docs
+        self.calls = []
+
+    def estimated_document_count(self, **kwargs):
+        self.calls.append('estimated_document_count')
+        return self.docs
+
+    def aggregate(self, pipeline, **kwargs):
+        self.calls.append('collStats')
+        return iter([{'storageStats': {
+            'count': self.docs, 'size': self.docs * 100, 'storageSize': self.docs * 40,
+            'totalIndexSize': 4096, 'nindexes': 2,
+        }}])
+
+    def count_documents(self, filter):
+        self.calls.append('count_documents')
+        return self.docs
+
+    def with_options(self, **kwargs):
+        return self
+
+    def find(self, *args, **kwargs):
+        return self
+
+    def sort(self, *args):
+        return iter([])
+
+
+@override_settings(MONGO_URI=URI_A, MONGO_DEFAULT_DB='scrapers_db')
+class CollectionStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.collection = FakeCollection()
+        client = mock.MagicMock()
+        client.__getitem__.return_value.__getitem__.return_value = self.collection
+        patcher = mock.patch.object(mongo, 'get_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.main = MainScraper.objects.create(name='Group')
+        self.sub = SubScraper.objects.create(main_scraper=self.main, name='Sub', mongo_collection_name='items')
+
+    def test_stats_use_metadata_and_are_cached(self):
+        stats = mongo.get_collection_stats(URI_A, 'scrapers_db', 'items')
+        self.assertEqual(stats['estimated_count'], 1000)
+        self.assertEqual(stats['size'], 100_000)
+        self.assertEqual(stats['avg_obj_size'], 100)
+
+        mongo.get_collection_stats(URI_A, 'scrapers_db', 'items')
+        self.assertEqual(self.collection.calls, ['estimated_document_count', 'collStats'])
+        self.assertNotIn('count_documents', self.collection.calls)
+
+    def test_exact_count_task_stores_result(self):
+        record = MongoCollectionCount.objects.create(
+            mongo_uri=URI_A, db_name='scrapers_db', collection_name='items'
+        )
+        count_collection_documents_task.run(record.pk)
+        record.refresh_from_db()
+        self.assertEqual((record.status, record.count), ('done', 1000))
+        self.assertIsNotNone(record.counted_at)
+
+    def test_panel_queues_one_exact_count_at_a_time(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        client = Client()
+        client.login(username='admin', password='password123')
+        url = reverse('mongo_panel', args=[self.main.pk, self.sub.pk])
+
+        with mock.patch.object(MainScraper, 'get_mongo_db', return_value={'items': self.collection}), \
+                mock.patch('dashboard.views.count_collection_documents_task') as task:
+            response = client.get(url)
+            self.assertContains(response, '~1,000')
+            client.post(url, {'action': 'exact_count'})
+            client.post(url, {'action': 'exact_count'})
+
+        self.assertEqual(task.delay.call_count, 1)
+        self.assertEqual(MongoCollectionCount.objects.get().status, 'pending')
+        self.assertNotIn('count_documents', self.collection.calls)
+
+    def test_panel_without_collection_has_no_query_script(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        client = Client()
+        client.login(username='admin', password='password123')
+        sub = SubScraper.objects.create(main_scraper=self.main, name='Unconfigured')
+
+        response = client.get(reverse('mongo_panel', args=[self.main.pk, sub.pk]))
+        self.assertContains(response, 'No MongoDB collection configured')
+        self.assertNotContains(response, "getElementById('query-form')")
+        self.assertContains(response, '<meta name="csrf-token"')
+
+
+class BsonToJsonTests(TestCase):
+    doc = {
+        '_id': bson.ObjectId('5f0000000000000000000001'),
+        'at': datetime.datetime(2024, 5, 1, 12, 30),
+        'money': bson.Decimal128('12.50'),
+        'blob': bson.Binary(b'\x01\x02'),
+        'big': bson.Int64(2 ** 40),
+        'rx': bson.Regex('^a'),
+        'code': bson.Code('f()'),
+        'nested': {'rounds': [{'id': bson.ObjectId('5f0000000000000000000002'), 'ok': True, 'x': None}]},
+        'ts': bson.Timestamp(1, 2),
+    }
+    expected = {
+        '_id': '5f0000000000000000000001',
+        'at': '2024-05-01T12:30:00',
+        'money': 12.5,
+        'blob': '0102',
+        'big': 2 ** 40,
+        'rx': "Regex('^a', 0)",
+        'code': 'f()',
+        'nested': {'rounds': [{'id': '5f0000000000000000000002', 'ok': True, 'x': None}]},
+        'ts': 'Timestamp(1, 2)',
+    }
+
+    def test_raw_and_decoded_paths_agree(self):
+        raw = bson.encode(self.doc)
+        self.assertEqual(mongo.decode_json_safe(raw), self.expected)
+        self.assertEqual(mongo.mongo_safe(bson.decode(raw)), self.expected)
+        self.assertEqual(mongo.mongo_safe(bson.raw_bson.RawBSONDocument(raw)), self.expected)
+        self.assertEqual(json.loads(mongo.raw_to_json(raw)), self.expected)
+
+    def test_python_only_types_and_subclasses(self):
+        value = uuid.UUID(int=1)
+        self.assertEqual(
+            mongo.mongo_safe({'d': datetime.date(2024, 1, 2), 'u': value, 's': SON([('a', (1, 2))])}),
+            {'d': '2024-01-02', 'u': str(value), 's': {'a': '(1, 2)'}},
+        )
+
+
+def _matches(doc, query):
+    """The subset of query operators the keyset cursor produces."""
+    for key, cond in query.items():
+        if key == '$and':
+            if not all(_matches(doc, q) for q in cond):
+                return False
+        elif key == '$or':
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = doc.get(key)
+            if '$gt' in cond and not value > cond['$gt']:
+                return False
+            if '$lt' in cond and not value < cond['$lt']:
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class FakeRawCursor:
+    def __init__(self, docs, limit):
+        self.docs, self.limit, self.max_time = docs, limit, None
+
+    def max_time_ms(self, ms):
+        self.max_time = ms
+        if ms < 10:
+            raise ExecutionTimeout('operation exceeded time limit')
+        return self
+
+    def __iter__(self):
+        return (bson.raw_bson.RawBSONDocument(bson.encode(d)) for d in self.docs[:self.limit])
+
+    def close(self):
+        pass
+
+
+class FakeQueryCollection:
+    """Evaluates find() in memory and hands back raw BSON like pymongo does."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def with_options(self, **kwargs):
+        return self
+
+    def find(self, query, projection=None, sort=None, limit=0, batch_size=0):
+        self.queries.append(query)
+        docs = [d for d in self.docs if _matches(d, query)]
+        for field, direction in reversed(sort):
+            docs.sort(key=lambda d: d[field], reverse=direction == -1)
+        return FakeRawCursor(docs, limit)
+
+
+class QueryPageTests(TestCase):
+    def setUp(self):
+        self.collection = FakeQueryCollection([
+            {'_id': i, 'group': i % 3, 'body': 'x' * 10} for i in range(1, 51)
+        ])
+
+    def page_through(self, **kwargs):
+        seen, cursor = [], None
+        while True:
+            page = mongo.query_page(self.collection, cursor=cursor, **kwargs)
+            seen += [d['_id'] for d in page['documents']]
+            cursor = page['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_pages_cover_every_document_once(self):
+        self.assertEqual(self.page_through(page_size=7), list(range(50, 0, -1)))
+
+    def test_secondary_sort_uses_id_tiebreak(self):
+        ids = self.page_through(sort={'group': 1}, page_size=4)
+        expected = [d['_id'] for d in sorted(self.collection.docs, key=lambda d: (d['group'], d['_id']))]
+        self.assertEqual(ids, expected)
+
+    def test_page_size_is_capped(self):
+        self.collection.docs *= 3
+        page = mongo.query_page(self.collection, page_size=10_000)
+        self.assertEqual(len(page['documents']), mongo.MAX_PAGE_SIZE)
+
+    def test_byte_budget_ends_page_early_and_large_docs_are_stubbed(self):
+        self.collection.docs = [
+            {'_id': i, 'body': 'x' * (mongo.MAX_DOC_BYTES + 1)} for i in range(10)
+        ]
+        page = mongo.query_page(self.collection, page_size=10)
+        self.assertLess(len(page['documents']), 10)
+        self.assertLessEqual(page['bytes'], mongo.PAGE_BYTE_BUDGET)
+        self.assertTrue(page['truncated'])
+        self.assertEqual(set(page['documents'][0]), {'_id', '_truncated_bytes'})
+        self.assertIsNotNone(page['next_cursor'])
+
+    def test_invalid_input(self):
+        with self.assertRaises(mongo.QueryError):
+            mongo.query_page(self.collection, sort={'a': 1, 'b': 1})
+        with self.assertRaises(mongo.QueryError):
+            mongo.query_page(self.collection, cursor='not-a-cursor')
+        with self.assertRaises(mongo.QueryError):
+            mongo.parse_json_arg('[1, 2]', {}, 'filter')
+        self.assertEqual(mongo.parse_json_arg('{"_id": {"$oid": "5f0000000000000000000000"}}', {}, 'filter'),
+                         {'_id': bson.ObjectId('5f0000000000000000000000')})
+
+
+class MongoQueryApiTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client = Client()
+        self.client.login(username='admin', password='password123')
+        main = MainScraper.objects.create(name='Group')
+        self.sub = SubScraper.objects.create(main_scraper=main, name='Sub', mongo_collection_name='items')
+        self.collection = FakeQueryCollection([{'_id': i} for i in range(30)])
+        patcher = mock.patch.object(SubScraper, 'get_mongo_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('api_mongo_query', args=[self.sub.pk])
+
+    def post(self, **body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_returns_pages_with_cursor(self):
+        first = self.post(filter='{}', page_size=20).json()
+        self.assertEqual(len(first['documents']), 20)
+        second = self.post(filter='{}', page_size=20, cursor=first['next_cursor']).json()
+        self.assertEqual([d['_id'] for d in second['documents']], list(range(9, -1, -1)))
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(self.collection.queries[0], {})
+
+    def test_bad_json_is_a_client_error(self):
+        response = self.post(filter='{not json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid JSON in filter', response.json()['error'])
+
+    def test_server_time_limit(self):
+        with mock.patch.object(mongo, 'QUERY_MAX_TIME_MS', 5):
+            response = self.post(filter='{}')
+        self.assertEqual(response.status_code, 408)
+
+
+COLLSCAN_EXPLAIN = {
+    'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}},
+    'executionStats': {'nReturned': 3, 'totalDocsExamined': 5000, 'totalKeysExamined': 0, 'executionTimeMillis': 42},
+}
+
+
+class IndexAdvisorTests(TestCase):
+    def test_equality_sort_range_order(self):
+        result = index_advisor.suggest_indexes(
+            {'$and': [{'status': 'pending'}, {'created_at': {'$lt': 5}}]}, sort=[('priority', -1)]
+        )
+        self.assertEqual(result['indexes'], [[('status', 1), ('priority', -1), ('created_at', 1)]])
+
+    def test_or_branches_get_their_own_index(self):
+        result = index_advisor.suggest_indexes({'$or': [{'is_read': 0}, {'status': 'pending'}]})
+        self.assertEqual(result['indexes'], [[('is_read', 1)], [('status', 1)]])
+
+    def test_unanchored_regex_is_flagged(self):
+        result = index_advisor.suggest_indexes({'founded_at': {'$regex': '2024'}, 'kind': 'org'})
+        self.assertEqual(result['indexes'], [[('kind', 1), ('founded_at', 1)]])
+        self.assertIn('unanchored', result['notes'][0])
+
+    def test_summarize_plain_and_sharded_plans(self):
+        plan = index_advisor.summarize_explain(COLLSCAN_EXPLAIN)
+        self.assertTrue(plan['collscan'] and plan['in_memory_sort'] and plan['inefficient'])
+        self.assertEqual((plan['docs_examined'], plan['returned'], plan['time_ms']), (5000, 3, 42))
+
+        sharded = index_advisor.summarize_explain({
+            'queryPlanner': {'winningPlan': {'stage': 'SHARD_MERGE', 'shards': [
+                {'shardName': 'a', 'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'status_1'}}},
+            ]}},
+            'executionStats': {'nReturned': 10, 'totalDocsExamined': 10, 'totalKeysExamined': 10},
+        })
+        self.assertEqual(sharded['indexes'], ['status_1'])
+        self.assertFalse(sharded['collscan'] or sharded['inefficient'])
+
+    def test_explain_endpoint(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        client = Client()
+        client.login(username='admin', password='password123')
+        main = MainScraper.objects.create(name='Group')
+        sub = SubScraper.objects.create(main_scraper=main, name='Sub', mongo_collection_name='items')
+        collection = mock.MagicMock()
+        collection.name = 'items'
+        collection.database.command.return_value = COLLSCAN_EXPLAIN
+
+        with mock.patch.object(SubScraper, 'get_mongo_collection', return_value=collection):
+            response = client.post(
+                reverse('api_mongo_explain', args=[sub.pk]),
+                json.dumps({'filter': '{"status": "pending"}', 'sort': '{"created_at": -1}'}),
+                content_type='application/json',
+            )
+        data = response.json()
+        self.assertTrue(data['plan']['collscan'])
+        self.assertEqual(data['commands'], ['db.items.createIndex({"status": 1, "created_at": -1, "_id": -1})'])
+        command = collection.database.command.call_args.args[0]
+        self.assertEqual(command['verbosity'], 'executionStats')
+        self.assertEqual(command['explain']['filter'], {'status': 'pending'})
+
+    def test_command_covers_crunchbase_filters(self):
+        out = StringIO()
+        call_command('advise_indexes', '--no-explain', stdout=out)
+        output = out.getvalue()
+        self.assertIn('[update] blank description — CorrectData', output)
+        self.assertIn('[new] pending — CrunchURLS', output)
+        # The claim's lease condition is part of the advised index, like the scraper's status_lease index
+        self.assertIn('db.CrunchURLS.createIndex({"status": 1, "lease_expires_at": 1})', output)
+
+
+class ProxyHealthApiTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client = Client()
+        self.client.login(username='admin', password='password123')
+        self.main = MainScraper.objects.create(name='Group')
+        now = datetime.datetime.now(datetime.timezone.utc)
+        health = mock.MagicMock()
+        health.find.return_value.sort.return_value = [
+            {'_id': 'http://a:1', 'latency_ms': 420.5, 'error_rate': 0.05, 'requests': 200, 'errors': 3},
+            # pymongo hands datetimes back naive (UTC)
+            {'_id': 'http://b:2', 'ejected_until': (now + datetime.timedelta(minutes=5)).replace(tzinfo=None),
+             'ejections': 1, 'last_error': 'proxy error'},
+        ]
+        assignments = mock.MagicMock()
+        assignments.aggregate.return_value = [{'_id': 'http://a:1', 'accounts': 2}]
+        db = {'ProxyHealth': health, 'ProxyAssignments': assignments}
+        client = mock.MagicMock()
+        client.__getitem__.return_value = db
+        patcher = mock.patch.object(MainScraper, 'get_mongo_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reports_health_and_load(self):
+        ScraperConfig.objects.create(main_scraper=self.main, proxies='a:1\nc:3  # spare\n')
+        proxies = self.client.get(reverse('api_proxy_health', args=[self.main.pk])).json()['proxies']
+        self.assertEqual([(p['proxy'], p['status'], p['accounts']) for p in proxies], [
+            ('http://a:1', 'healthy', 2),
+            ('http://b:2', 'ejected', 0),
+            ('http://c:3', 'unused', 0),
+        ])
+        self.assertEqual(proxies[0]['latency_ms'], 420.5)
+
+    def test_mongo_error(self):
+        MainScraper.get_mongo_client.return_value.__getitem__.side_effect = PyMongoError('down')
+        response = self.client.get(reverse('api_proxy_health', args=[self.main.pk]))
+        self.assertEqual(response.status_code, 500)
+
+    def test_config_saves_proxies_for_the_run(self):
+        self.client.post(reverse('update_config', args=[self.main.pk]), {'proxies': ' a:1\n\nhttp://b:2 \n'})
+        config = ScraperConfig.objects.get(main_scraper=self.main)
+        self.assertEqual(config.get_proxy_list(), ['a:1', 'http://b:2'])
@@ -0,0 +1,181 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .models import (
+    MainScraper, SubScraper, ScraperAccount, ScraperRunHistory, ScraperProcess, ScraperSchedule,
+)
+
+
+class StatusQueryCountTests(TestCase):
+    """Status pages must cost the same number of queries at any scale."""
+
+    def setUp(self):
+        self.client = Client()
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client.login(username='admin', password='password123')
+        self.main = MainScraper.objects.create(name='Group')
+        ScraperAccount.objects.create(main_scraper=self.main, email='a@example.com', password='x')
+
+    def add_sub_scrapers(self, count):
+        start = SubScraper.objects.count()
+        subs = SubScraper.objects.bulk_create([
+            SubScraper(main_scraper=self.main, name=f'Sub {start + i:04d}')
+            for i in range(count)
+        ])
+        now = timezone.now()
+        runs = []
+        for i, sub in enumerate(subs):
+            runs.append(ScraperRunHistory(
+                sub_scraper=sub, status='success', started_at=now - timedelta(days=2),
+                duration_seconds=12.5,
+            ))
+            runs.append(ScraperRunHistory(
+                sub_scraper=sub, status='failed' if i % 2 else 'success',
+                started_at=now - timedelta(hours=1),
+            ))
+        ScraperRunHistory.objects.bulk_create(runs)
+        # bulk_create skips save(), so sync the latest-run pointers by hand
+        call_command('rebuild_latest_runs', *[sub.pk for sub in subs], stdout=StringIO())
+        ScraperSchedule.objects.bulk_create([
+            ScraperSchedule(sub_scraper=sub) for sub in subs[::3]
+        ])
+        ScraperProcess.objects.bulk_create([
+            ScraperProcess(sub_scraper=sub, pid=1000 + i) for i, sub in enumerate(subs[::5])
+        ])
+
+    def count_queries(self, url):
+        # Warm-up request: first visits may create defaults (e.g. ScraperConfig)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.add_sub_scrapers(5)
+        small = self.count_queries(url)
+        self.add_sub_scrapers(495)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_watcher(self):
+        self.assert_constant_queries(reverse('watcher'))
+
+    def test_watcher_api(self):
+        self.assert_constant_queries(reverse('api_watcher_data'))
+
+    def test_main_scraper_detail(self):
+        self.assert_constant_queries(reverse('main_scraper_detail', args=[self.main.pk]))
+
+    def test_control_panel(self):
+        self.assert_constant_queries(reverse('control_panel', args=[self.main.pk]))
+
+    def test_annotated_status_matches_latest_run(self):
+        self.add_sub_scrapers(2)
+        for sub in SubScraper.objects.with_status():
+            latest = sub.run_history.order_by('-started_at').first()
+            self.assertEqual(sub.last_run.pk, latest.pk)
+            self.assertEqual(sub.last_run.started_at, latest.started_at)
+            self.assertEqual(sub.current_status, 'running' if hasattr(sub, 'process') else latest.status)
+
+
+class HealthQueryTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client.login(username='admin', password='password123')
+
+    def add_group(self, *latest_statuses, inactive_failed=False):
+        main = MainScraper.objects.create(name=f'Group {MainScraper.objects.count()}')
+        now = timezone.now()
+        for i, status in enumerate(latest_statuses):
+            sub = SubScraper.objects.create(main_scraper=main, name=f'Sub {i}')
+            if status is None:
+                continue
+            ScraperRunHistory.objects.create(
+                sub_scraper=sub, status='failed', started_at=now - timedelta(days=1)
+            )
+            ScraperRunHistory.objects.create(sub_scraper=sub, status=status, started_at=now)
+        if inactive_failed:
+            sub = SubScraper.objects.create(main_scraper=main, name='Disabled', is_active=False)
+            ScraperRunHistory.objects.create(sub_scraper=sub, status='failed', started_at=now)
+        return main
+
+    def test_annotated_health_matches_property(self):
+        expected = {
+            self.add_group().pk: 'gray',
+            self.add_group(None, None).pk: 'gray',
+            self.add_group('success', 'failed').pk: 'red',
+            self.add_group('success', 'running', None).pk: 'green',
+            self.add_group('success', None, inactive_failed=True).pk: 'green',
+        }
+        for main in MainScraper.objects.with_health():
+            self.assertEqual(main.health_status, expected[main.pk])
+            plain = MainScraper.objects.get(pk=main.pk)
+            self.assertEqual(plain.health_status, expected[main.pk])
+            self.assertEqual(main.sub_scrapers_count, plain.sub_scrapers_count)
+
+    def test_dashboard_queries_do_not_grow_with_groups(self):
+        url = reverse('dashboard')
+        for _ in range(3):
+            self.add_group('success', 'failed')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for _ in range(37):
+            self.add_group('success', 'running', None)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+class LatestRunPointerTests(TestCase):
+    def setUp(self):
+        main = MainScraper.objects.create(name='Group')
+        self.sub = SubScraper.objects.create(main_scraper=main, name='Sub')
+
+    def test_pointer_follows_newest_run(self):
+        now = timezone.now()
+        newest = ScraperRunHistory.objects.create(sub_scraper=self.sub, status='running', started_at=now)
+        ScraperRunHistory.objects.create(
+            sub_scraper=self.sub, status='failed', started_at=now - timedelta(hours=1)
+        )
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.latest_run_id, newest.pk)
+        self.assertEqual(self.sub.current_status, 'running')
+
+        newest.status = 'success'
+        newest.ended_at = now + timedelta(minutes=5)
+        newest.save()
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.last_run_status, 'success')
+        self.assertEqual(self.sub.last_run_ended_at, newest.ended_at)
+
+    def test_deleting_latest_run_falls_back_to_previous(self):
+        now = timezone.now()
+        older = ScraperRunHistory.objects.create(
+            sub_scraper=self.sub, status='failed', started_at=now - timedelta(hours=1)
+        )
+        ScraperRunHistory.objects.create(sub_scraper=self.sub, status='success', started_at=now).delete()
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.latest_run_id, older.pk)
+        self.assertEqual(self.sub.current_status, 'failed')
+
+    def test_rebuild_command_repairs_bulk_changes(self):
+        ScraperRunHistory.objects.bulk_create([
+            ScraperRunHistory(sub_scraper=self.sub, status='failed', started_at=timezone.now()),
+        ])
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.current_status, 'never_run')
+
+        call_command('rebuild_latest_runs', stdout=StringIO())
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.current_status, 'failed')
@@ -0,0 +1,143 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .models import MainScraper, SubScraper, ScraperRunDaily, ScraperRunHistory
+from .retention import retention_cutoff, rollup_and_prune
+from .run_stats import run_history_stats
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.main = MainScraper.objects.create(name='Group')
+        self.sub = SubScraper.objects.create(main_scraper=self.main, name='Sub')
+        self.now = timezone.now()
+
+    def add_run(self, days_ago, status='success', duration=None, records=None):
+        return ScraperRunHistory.objects.create(
+            sub_scraper=self.sub, status=status,
+            started_at=self.now - timedelta(days=days_ago),
+            duration_seconds=duration, records_inserted=records,
+        )
+
+    def test_old_runs_are_rolled_up_and_pruned(self):
+        self.add_run(40, 'success', duration=10, records=5)
+        self.add_run(40, 'failed', duration=30)
+        self.add_run(35, 'success', records=7)
+        recent = self.add_run(1, 'success', duration=20)
+
+        result = rollup_and_prune(retention_days=30, now=self.now)
+        self.assertEqual(result['runs'], 3)
+        self.assertEqual(list(ScraperRunHistory.objects.values_list('pk', flat=True)), [recent.pk])
+
+        dailies = ScraperRunDaily.objects.filter(sub_scraper=self.sub).order_by('day')
+        self.assertEqual([d.total_runs for d in dailies], [2, 1])
+        first = dailies[0]
+        self.assertEqual((first.success_runs, first.failed_runs), (1, 1))
+        self.assertEqual((first.duration_count, first.duration_sum), (2, 40))
+        self.assertEqual((first.duration_min, first.duration_max), (10, 30))
+        self.assertEqual(sum(d.records_inserted for d in dailies), 12)
+
+    def test_second_pass_merges_into_existing_day(self):
+        self.add_run(40, 'success', duration=10)
+        rollup_and_prune(retention_days=30, now=self.now)
+        self.add_run(40, 'failed', duration=50)
+        self.add_run(0, 'success')
+        rollup_and_prune(retention_days=30, now=self.now)
+
+        daily = ScraperRunDaily.objects.get(sub_scraper=self.sub)
+        self.assertEqual((daily.total_runs, daily.failed_runs), (2, 1))
+        self.assertEqual((daily.duration_min, daily.duration_max), (10, 50))
+
+    def test_latest_run_is_never_pruned(self):
+        only = self.add_run(100, 'failed')
+        rollup_and_prune(retention_days=30, now=self.now)
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.latest_run_id, only.pk)
+        self.assertEqual(self.sub.current_status, 'failed')
+
+    def test_cutoff_is_local_midnight(self):
+        cutoff = retention_cutoff(30, now=self.now)
+        self.assertEqual((cutoff.hour, cutoff.minute), (0, 0))
+
+    def test_dry_run_changes_nothing(self):
+        self.add_run(40)
+        self.add_run(0)
+        out = StringIO()
+        call_command('prune_run_history', '--days', '30', '--dry-run', stdout=out)
+        self.assertIn('Would roll up 1 run(s)', out.getvalue())
+        self.assertEqual(ScraperRunHistory.objects.count(), 2)
+        self.assertFalse(ScraperRunDaily.objects.exists())
+
+    def test_history_page_combines_rollups_and_recent_runs(self):
+        self.add_run(40, 'success', duration=10)
+        self.add_run(40, 'failed', duration=30)
+        self.add_run(0, 'success', duration=20)
+        rollup_and_prune(retention_days=30, now=self.now)
+
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        client = Client()
+        client.login(username='admin', password='password123')
+        response = client.get(reverse('run_history', args=[self.main.pk, self.sub.pk]))
+        self.assertContains(response, '3 total runs')
+        self.assertContains(response, '66.7%')
+        self.assertContains(response, '20.0s')
+
+
+class RunStatsTests(TestCase):
+    def setUp(self):
+        main = MainScraper.objects.create(name='Group')
+        self.sub = SubScraper.objects.create(main_scraper=main, name='Sub')
+
+    def add_runs(self, durations, status='success', records=1):
+        now = timezone.now()
+        ScraperRunHistory.objects.bulk_create([
+            ScraperRunHistory(
+                sub_scraper=self.sub, status=status, duration_seconds=d,
+                records_inserted=records, started_at=now - timedelta(minutes=i),
+            )
+            for i, d in enumerate(durations)
+        ])
+
+    def test_percentiles_and_totals(self):
+        self.add_runs(range(1, 101))
+        self.add_runs([None] * 5, status='failed', records=None)
+
+        stats = run_history_stats(self.sub)
+        self.assertEqual(stats['total_runs'], 105)
+        self.assertEqual(stats['success_rate'], 95.2)
+        self.assertEqual(stats['avg_duration'], 50.5)
+        self.assertEqual(stats['p50_duration'], 50)
+        self.assertEqual(stats['p95_duration'], 95)
+        self.assertEqual(stats['records_total'], 100)
+
+    def test_no_runs(self):
+        stats = run_history_stats(self.sub)
+        self.assertEqual(stats['total_runs'], 0)
+        self.assertIsNone(stats['avg_duration'])
+        self.assertIsNone(stats['p95_duration'])
+
+    def test_query_count_is_independent_of_history_size(self):
+        self.add_runs(range(10))
+        with CaptureQueriesContext(connection) as small:
+            run_history_stats(self.sub)
+        self.add_runs(range(5000))
+        with CaptureQueriesContext(connection) as large:
+            run_history_stats(self.sub)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        # One aggregate over the rollups, one over the raw runs (percentiles included)
+        self.assertEqual(len(small.captured_queries), 2)
+
+    def test_percentiles_use_nearest_rank(self):
+        self.add_runs([3, 1, 2, 2])
+        self.add_runs([None], status='failed')
+        stats = run_history_stats(self.sub)
+        self.assertEqual(stats['p50_duration'], 2)
+        self.assertEqual(stats['p95_duration'], 3)
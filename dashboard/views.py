@@ -1,7 +1,6 @@
 import os
 import signal
 import json
-import datetime
 from datetime import timedelta
 
 from django.shortcuts import render, get_object_or_404, redirect
@@ -14,58 +13,28 @@ from django.contrib import messages
 
 from .models import (
     MainScraper, SubScraper, ScraperRunHistory, ScraperProcess, ScraperSchedule,
-    ScraperAccount, ScraperConfig,
+    ScraperAccount, ScraperConfig, MongoCollectionCount,
 )
-from .tasks import run_scraper_task
+from .mongo import JSON_SAFE_OPTIONS, get_collection_stats
+from .tasks import run_scraper_task, count_collection_documents_task
 from .schedule_utils import update_celery_schedule, get_next_runs, cron_to_readable
-
-
-
-def _mongo_safe(obj):
-    """Recursively convert MongoDB/BSON types to JSON-serializable Python types.
-    Handles: ObjectId, datetime, Decimal128, bytes, and any other exotic type.
-    """
-    if isinstance(obj, dict):
-        return {k: _mongo_safe(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_mongo_safe(i) for i in obj]
-    if isinstance(obj, datetime.datetime):
-        return obj.isoformat()
-    if isinstance(obj, datetime.date):
-        return obj.isoformat()
-    if isinstance(obj, bytes):
-        return obj.hex()
-    # Handle bson types without hard-importing bson at module level
-    cls_name = type(obj).__name__
-    if cls_name == 'ObjectId':
-        return str(obj)
-    if cls_name == 'Decimal128':
-        return float(str(obj))
-    if cls_name == 'Regex':
-        return str(obj)
-    # Primitives that are already JSON-safe
-    if isinstance(obj, (str, int, float, bool)) or obj is None:
-        return obj
-    # Fallback for anything else
-    return str(obj)
+from .run_stats import run_history_stats
 
 
 def dashboard(request):
     """Global dashboard - shows all main scrapers as cards."""
-    main_scrapers = MainScraper.objects.prefetch_related('sub_scrapers').all()
+    main_scrapers = MainScraper.objects.with_health()
 
     total_scrapers = SubScraper.objects.filter(is_active=True).count()
     currently_running = ScraperProcess.objects.filter(is_running=True).count()
 
-    # Failed = last run was failed
-    failed_last_run = 0
-    stale_count = 0
-    for sub in SubScraper.objects.filter(is_active=True).prefetch_related('run_history'):
-        last_run = sub.run_history.order_by('-started_at').first()
-        if last_run and last_run.status == 'failed':
-            failed_last_run += 1
-        if sub.is_stale:
-            stale_count += 1
+    # Failed = last run was failed; stale = scheduled but no run for 24h
+    active = SubScraper.objects.filter(is_active=True)
+    failed_last_run = active.filter(last_run_status='failed').count()
+    stale_count = active.filter(
+        schedule__is_enabled=True,
+        last_run_started_at__lt=timezone.now() - timedelta(hours=24),
+    ).count()
 
     context = {
         'main_scrapers': main_scrapers,
@@ -79,7 +48,7 @@ def dashboard(request):
 
 def scrapers_list(request):
     """All main scrapers list."""
-    main_scrapers = MainScraper.objects.prefetch_related('sub_scrapers').all()
+    main_scrapers = MainScraper.objects.with_health()
     return render(request, 'dashboard/scrapers_list.html', {'main_scrapers': main_scrapers})
 
 
@@ -132,11 +101,11 @@ def main_scraper_edit(request, pk):
 def main_scraper_detail(request, pk):
     """Main scraper detail page - lists all sub scrapers."""
     main_scraper = get_object_or_404(MainScraper, pk=pk)
-    sub_scrapers = main_scraper.sub_scrapers.prefetch_related('run_history', 'process', 'schedule').all()
+    sub_scrapers = main_scraper.sub_scrapers.with_status()
 
     sub_data = []
     for sub in sub_scrapers:
-        last_run = sub.run_history.order_by('-started_at').first()
+        last_run = sub.last_run
         process = getattr(sub, 'process', None)
         schedule = getattr(sub, 'schedule', None)
         is_running = process and process.is_running
@@ -191,7 +160,7 @@ def sub_scraper_detail(request, pk, sub_id):
 
     process = getattr(sub, 'process', None)
     is_running = process and process.is_running
-    last_run = sub.run_history.order_by('-started_at').first()
+    last_run = sub.last_run
     schedule = getattr(sub, 'schedule', None)
 
     next_runs = []
@@ -414,22 +383,13 @@ def run_history(request, pk, sub_id):
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
 
-    # Stats
-    total_runs = history_qs.count()
-    success_runs = history_qs.filter(status='success').count()
-    success_rate = round((success_runs / total_runs * 100) if total_runs > 0 else 0, 1)
-    durations = [r.duration_seconds for r in history_qs if r.duration_seconds is not None]
-    avg_duration = round(sum(durations) / len(durations), 2) if durations else None
-    last_success = history_qs.filter(status='success').first()
+    stats = run_history_stats(sub)
 
     return render(request, 'dashboard/run_history.html', {
         'main_scraper': main_scraper,
         'sub': sub,
         'page_obj': page_obj,
-        'total_runs': total_runs,
-        'success_rate': success_rate,
-        'avg_duration': avg_duration,
-        'last_success': last_success,
+        **stats,
     })
 
 
@@ -445,11 +405,9 @@ def mongo_panel(request, pk, sub_id):
         'mongo_uri_display': main_scraper.get_effective_mongo_uri(),
         'mongo_db_display': main_scraper.get_effective_mongo_db(),
         'mongo_error': None,
-        'doc_count': None,
-        'last_docs': [],
-        'query_results': None,
-        'query_error': None,
         'collection_stats': None,
+        'exact_count': None,
+        'last_docs': [],
         'last_inserted': None,
     }
 
@@ -458,64 +416,44 @@ def mongo_panel(request, pk, sub_id):
         return render(request, 'dashboard/mongo_panel.html', context)
 
     try:
-        # Use per-group connection — falls back to .env globals if blank
-        client = main_scraper.get_mongo_client()
-        db = client[main_scraper.get_effective_mongo_db()]
-        collection = db[sub.mongo_collection_name]
-
-        context['doc_count'] = collection.count_documents({})
-        context['last_docs'] = [
-            _mongo_safe(doc)
-            for doc in collection.find({}, limit=5).sort('_id', -1)
-        ]
-
-        try:
-            stats = db.command('collstats', sub.mongo_collection_name)
-            context['collection_stats'] = {
-                'count': stats.get('count', 0),
-                'size': stats.get('size', 0),
-                'avgObjSize': stats.get('avgObjSize', 0),
-            }
-        except Exception:
-            pass
-
-        if request.method == 'POST':
-            action = request.POST.get('action', 'query')
-
-            if action == 'last_inserted':
-                last_doc = collection.find_one({}, sort=[('_id', -1)])
-                if last_doc:
-                    from bson import ObjectId
-                    oid = last_doc['_id']
-                    if isinstance(oid, ObjectId):
-                        context['last_inserted'] = oid.generation_time.strftime('%Y-%m-%d %H:%M:%S UTC')
-                    else:
-                        context['last_inserted'] = str(oid)
+        # Shared per-URI client — falls back to .env globals if blank
+        uri = main_scraper.get_effective_mongo_uri()
+        db_name = main_scraper.get_effective_mongo_db()
+        collection = main_scraper.get_mongo_db()[sub.mongo_collection_name]
+        count_key = {'mongo_uri': uri, 'db_name': db_name, 'collection_name': sub.mongo_collection_name}
+        action = request.POST.get('action') if request.method == 'POST' else None
+
+        # Metadata only (no collection scan), cached for a minute
+        context['collection_stats'] = get_collection_stats(
+            uri, db_name, sub.mongo_collection_name, refresh=action == 'refresh_stats'
+        )
+        # Decoded straight to JSON-safe values by the BSON decoder
+        context['last_docs'] = list(
+            collection.with_options(codec_options=JSON_SAFE_OPTIONS).find({}, limit=5).sort('_id', -1)
+        )
+
+        if action == 'exact_count':
+            record, created = MongoCollectionCount.objects.get_or_create(**count_key)
+            # Don't queue a second scan while one is in flight (unless it looks lost)
+            stuck = timezone.now() - record.requested_at > timedelta(hours=1)
+            if created or not record.in_progress or stuck:
+                record.status = 'pending'
+                record.requested_at = timezone.now()
+                record.save(update_fields=['status', 'requested_at'])
+                count_collection_documents_task.delay(record.pk)
+        context['exact_count'] = MongoCollectionCount.objects.filter(**count_key).first()
+
+        if action == 'last_inserted':
+            last_doc = collection.find_one({}, sort=[('_id', -1)])
+            if last_doc:
+                from bson import ObjectId
+                oid = last_doc['_id']
+                if isinstance(oid, ObjectId):
+                    context['last_inserted'] = oid.generation_time.strftime('%Y-%m-%d %H:%M:%S UTC')
                 else:
-                    context['last_inserted'] = 'No documents found'
-
-            elif action == 'query':
-                raw_filter = request.POST.get('filter_query', '{}').strip()
-                raw_sort = request.POST.get('sort_query', '{"_id": -1}').strip()
-                limit = int(request.POST.get('limit', 10))
-
-                try:
-                    filter_dict = json.loads(raw_filter) if raw_filter else {}
-                    sort_dict = json.loads(raw_sort) if raw_sort else {'_id': -1}
-                    results = [
-                        _mongo_safe(doc)
-                        for doc in collection.find(filter_dict, limit=limit).sort(list(sort_dict.items()))
-                    ]
-                    context['query_results'] = json.dumps(results, indent=2)
-                    context['filter_query'] = raw_filter
-                    context['sort_query'] = raw_sort
-                    context['limit'] = limit
-                except json.JSONDecodeError as e:
-                    context['query_error'] = f"Invalid JSON: {str(e)}"
-                except Exception as e:
-                    context['query_error'] = f"Query error: {str(e)}"
-
-        client.close()
+                    context['last_inserted'] = str(oid)
+            else:
+                context['last_inserted'] = 'No documents found'
 
     except Exception as e:
         context['mongo_error'] = f"MongoDB connection error: {str(e)}"
@@ -541,15 +479,13 @@ def live_terminal(request, pk, sub_id):
 
 def watcher(request):
     """Global process watcher panel."""
-    sub_scrapers = SubScraper.objects.filter(is_active=True).select_related(
-        'main_scraper'
-    ).prefetch_related('run_history', 'process', 'schedule').all()
+    sub_scrapers = SubScraper.objects.filter(is_active=True).with_status()
 
     watcher_data = []
     for sub in sub_scrapers:
         process = getattr(sub, 'process', None)
         is_running = process and process.is_running
-        last_run = sub.run_history.order_by('-started_at').first()
+        last_run = sub.last_run
         schedule = getattr(sub, 'schedule', None)
         next_run = None
         if schedule and schedule.is_enabled:
@@ -673,12 +609,12 @@ def control_panel(request, pk):
     active_count = active_accounts.count()
     distribution = config.get_distribution(active_count)
 
-    sub_scrapers = main_scraper.sub_scrapers.prefetch_related('process', 'run_history').all()
+    sub_scrapers = main_scraper.sub_scrapers.with_status()
     sub_data = []
     for sub in sub_scrapers:
         process = getattr(sub, 'process', None)
         is_running = process and process.is_running
-        last_run = sub.run_history.order_by('-started_at').first()
+        last_run = sub.last_run
         sub_data.append({
             'sub': sub,
             'is_running': is_running,
@@ -699,7 +635,7 @@ def control_panel(request, pk):
 
 @require_POST
 def update_config(request, pk):
-    """Save scraper config (account splits, batch sizes, paths)."""
+    """Save scraper config (account splits, batch sizes, paths, proxies)."""
     main_scraper = get_object_or_404(MainScraper, pk=pk)
     config, _ = ScraperConfig.objects.get_or_create(main_scraper=main_scraper)
 
@@ -713,6 +649,7 @@ def update_config(request, pk):
         config.max_batches_update = int(request.POST.get('max_batches_update', 50))
         config.script_base_path = request.POST.get('script_base_path', '').strip()
         config.log_base_path = request.POST.get('log_base_path', '').strip()
+        config.proxies = request.POST.get('proxies', '').strip()
         config.save()
         messages.success(request, 'Configuration saved.')
     except (ValueError, TypeError) as e:
@@ -763,6 +700,7 @@ def run_with_config(request, pk):
         'mode': mode,
         'log_base_path': config.log_base_path or '/tmp/scraper_logs',
         'mongo_uri': main_scraper.get_effective_mongo_uri(),
+        'proxies': config.get_proxy_list(),
     }
 
     # Write config to temp file
@@ -19,6 +19,7 @@ python manage.py migrate --noinput
 python manage.py collectstatic --noinput
 
 # Restart the running process
+pkill -f "uvicorn scraper_manager.asgi" 2>/dev/null || true
 pkill -f "manage.py runserver" 2>/dev/null || true
 pkill -f "celery" 2>/dev/null || true
 
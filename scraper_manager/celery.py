@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_manager.settings')
 
@@ -7,6 +8,12 @@ app = Celery('scraper_manager')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@worker_process_shutdown.connect
+def close_mongo_clients(**kwargs):
+    from dashboard.mongo import close_all
+    close_all()
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -38,7 +38,11 @@ urlpatterns = [
 
     # Live terminal API endpoints
     path('api/live-log/<int:sub_id>/', api_views.api_live_log, name='api_live_log'),
+    path('api/live-stream/<int:sub_id>/', api_views.api_live_stream, name='api_live_stream'),
     path('api/send-input/<int:sub_id>/', api_views.api_send_input, name='api_send_input'),
+    path('api/mongo-query/<int:sub_id>/', api_views.api_mongo_query, name='api_mongo_query'),
+    path('api/mongo-explain/<int:sub_id>/', api_views.api_mongo_explain, name='api_mongo_explain'),
+    path('api/proxy-health/<int:pk>/', api_views.api_proxy_health, name='api_proxy_health'),
 ]
 
 
@@ -193,9 +193,11 @@ header "Starting services"
 LOG_DIR="$BASE_DIR/logs"
 mkdir -p "$LOG_DIR"
 
-# Django dev server
-info "Starting Django development server..."
-"$PYTHON" "$BASE_DIR/manage.py" runserver 0.0.0.0:1109 \
+# Django, served over ASGI: the live terminal's push stream (SSE) needs it;
+# under runserver (WSGI) the page falls back to polling
+info "Starting Django (uvicorn, ASGI)..."
+"$PYTHON" -m uvicorn scraper_manager.asgi:application \
+    --app-dir "$BASE_DIR" --host 0.0.0.0 --port 1109 \
     > "$LOG_DIR/django.log" 2>&1 &
 DJANGO_PID=$!
 success "Django server    →  PID $DJANGO_PID  |  log: logs/django.log"